@@ -0,0 +1,112 @@
+"""Micro-benchmark: joint-frame encode/decode, tetra.codec vs the per-joint
+Python loops CANProtocol used before it.
+
+Run:  python benchmarks/bench_codec.py
+"""
+import math
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, ".")
+from tetra import codec
+
+NUM_JOINTS = 12
+
+
+# ── Reference: the pre-codec CANProtocol implementation ─────────────────
+def _bytes_to_int(lsb, msb):
+    combined = (msb << 8) | lsb
+    if combined & 0x8000:
+        combined -= 0x10000
+    return combined
+
+
+def legacy_encode_values(values, joint_offset=0):
+    chunk_size = 3
+    num_chunks = math.ceil(len(values) / chunk_size)
+    bodies = []
+    for i in range(num_chunks):
+        idx = i * chunk_size
+        message_values = values[idx:idx + chunk_size]
+
+        joint_mask = 0
+        for j in range(len(message_values)):
+            joint_mask = (joint_mask << 1) | 1
+        joint_mask <<= (idx + joint_offset)
+
+        data = []
+        def add_int16(v):
+            if v < 0:
+                v += 1 << 16
+            data.append(v & 0xFF)
+            data.append((v >> 8) & 0xFF)
+
+        add_int16(joint_mask)
+        for v in message_values:
+            add_int16(int(v))
+        bodies.append(data)
+    return bodies
+
+
+def legacy_encode_masks(num_values, joint_offset=0):
+    chunk_size = 3
+    bodies = []
+    for i in range(math.ceil(num_values / chunk_size)):
+        idx = i * chunk_size + joint_offset
+        last_idx = min(joint_offset + num_values, idx + chunk_size)
+        joint_mask = 0
+        for j in range(idx, last_idx):
+            joint_mask |= 1 << j
+        bodies.append([joint_mask & 0xFF, joint_mask >> 8])
+    return bodies
+
+
+def legacy_decode_values(resps, num_values):
+    chunk_size = 3
+    result = np.zeros(num_values)
+    for i, resp in enumerate(resps):
+        count = min(chunk_size, num_values - i * chunk_size)
+        if len(resp) < 2 + 2 * count:
+            raise Exception('Short joint response')
+        if resp[0] != 0 or resp[1] != 0:
+            raise Exception('error reading joint params')
+        for j in range(count):
+            result[i * chunk_size + j] = _bytes_to_int(resp[2 + 2 * j], resp[3 + 2 * j])
+    return result
+
+
+def main(number=20000):
+    positions = np.linspace(-0.5, 1.5, NUM_JOINTS)
+    wire = codec.positions_to_wire(positions)
+    bodies = codec.encode_values(wire)
+    # A response frame has the same layout as a write request, with a zero
+    # statusMask in place of the joint mask.
+    resps = [b'\x00\x00' + b[2:] for b in bodies]
+    assert [bytes(b) for b in legacy_encode_values(wire)] == bodies
+    assert np.array_equal(legacy_decode_values(resps, NUM_JOINTS), codec.decode_values(resps, NUM_JOINTS))
+
+    cases = [
+        ('encode write (12 joints)',
+         lambda: legacy_encode_values(wire),
+         lambda: codec.encode_values(wire)),
+        ('encode read masks (12 joints)',
+         lambda: legacy_encode_masks(NUM_JOINTS),
+         lambda: codec.encode_masks(NUM_JOINTS)),
+        ('decode read (12 joints)',
+         lambda: legacy_decode_values(resps, NUM_JOINTS),
+         lambda: codec.decode_values(resps, NUM_JOINTS)),
+        ('decode read into float out',
+         lambda: legacy_decode_values(resps, NUM_JOINTS),
+         lambda: codec.decode_values(resps, NUM_JOINTS, out=np.empty(NUM_JOINTS))),
+    ]
+    print(f'{"case":32s} {"legacy µs":>10s} {"codec µs":>10s} {"speedup":>8s}')
+    for name, legacy, new in cases:
+        t_old = min(timeit.repeat(legacy, number=number, repeat=3)) / number * 1e6
+        t_new = min(timeit.repeat(new, number=number, repeat=3)) / number * 1e6
+        print(f'{name:32s} {t_old:10.2f} {t_new:10.2f} {t_old / t_new:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
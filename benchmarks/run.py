@@ -0,0 +1,237 @@
+"""Benchmark suite for the SDK's hot paths, against tetra.sim.
+
+Every case runs in-process on a VirtualHandBus, so results only depend on
+the SDK and the machine. Results are written as JSON, one object per case
+under "results", plus enough about the environment to tell runs apart:
+
+Run:  python benchmarks/run.py [--quick] [--output results.json] [--only control]
+
+Cases:
+  codec    frame encode/decode cost (tetra.codec), µs per call
+  control  get/set_joint_positions wall time, pipelined vs serial (one
+           request in flight), on a 1 Mbit/s bus with 100 µs firmware
+           latency — and on an instant bus, which leaves the SDK's own cost
+  stream   drain_stream throughput with a 1 ms stream period
+  backlog  get_joint_positions with stream frames queued ahead of the
+           response (_recv must ingest them on the way)
+  manus    Manus glove retargeting (Manus.get_joint_positions) per frame
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, ".")
+from tetra import codec
+from tetra.can_protocol import WINDOW_PROBE_AFTER_MAX, CANProtocol
+from tetra.sim import VirtualHandBus
+
+NUM_JOINTS = 12
+HAND_ID = 50
+
+
+def _summary(samples) -> dict:
+    """Per-call wall times (seconds) → µs statistics."""
+    us = sorted(s * 1e6 for s in samples)
+    return {
+        'calls': len(us),
+        'mean_us': statistics.fmean(us),
+        'median_us': statistics.median(us),
+        'p99_us': us[min(len(us) - 1, int(0.99 * len(us)))],
+        'min_us': us[0],
+        'max_us': us[-1],
+    }
+
+
+def _time_calls(fn, calls: int) -> dict:
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _summary(samples)
+
+
+def _per_call_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def _protocol(bus, serial: bool = False) -> CANProtocol:
+    proto = CANProtocol(bus, HAND_ID, num_joints=NUM_JOINTS)
+    if serial:
+        # One request in flight, and never probed deeper.
+        proto._window = 1
+        proto._window_probe_after = WINDOW_PROBE_AFTER_MAX
+    return proto
+
+
+def bench_codec(quick: bool) -> dict:
+    number = 2000 if quick else 20000
+    wire = codec.positions_to_wire(np.linspace(-0.5, 1.5, NUM_JOINTS))
+    bodies = codec.encode_values(wire)
+    resps = [b'\x00\x00' + body[2:] for body in bodies]
+    fd_resps = [b'\x00\x00' + codec.encode_values(wire, chunk_size=codec.FD_CHUNK_SIZE)[0][2:]]
+    out = np.empty(NUM_JOINTS)
+    cases = {
+        'encode_values': lambda: codec.encode_values(wire),
+        'encode_masks': lambda: codec.encode_masks(NUM_JOINTS),
+        'decode_values': lambda: codec.decode_values(resps, NUM_JOINTS),
+        'decode_values_out': lambda: codec.decode_values(resps, NUM_JOINTS, out=out),
+        'decode_values_fd': lambda: codec.decode_values(fd_resps, NUM_JOINTS, chunk_size=codec.FD_CHUNK_SIZE),
+        'positions_to_wire': lambda: codec.positions_to_wire(np.zeros(NUM_JOINTS)),
+    }
+    return {name: {'per_call_us': _per_call_us(fn, number)} for name, fn in cases.items()}
+
+
+def bench_control(quick: bool) -> dict:
+    calls = 100 if quick else 1000
+    targets = np.linspace(0, 1, NUM_JOINTS)
+    results = {}
+    for bus_name, bus_kwargs in (('1mbit', {}), ('instant', {'bitrate': None, 'latency': 0})):
+        for mode in ('pipelined', 'serial'):
+            with VirtualHandBus(**bus_kwargs) as bus:
+                proto = _protocol(bus, serial=mode == 'serial')
+                out = np.empty(NUM_JOINTS)
+                proto.get_joint_positions()   # settle the hi-res probe first
+                results[f'get_joint_positions/{mode}/{bus_name}'] = _time_calls(
+                    lambda: proto.get_joint_positions(out=out), calls)
+                results[f'set_joint_positions/{mode}/{bus_name}'] = _time_calls(
+                    lambda: proto.set_joint_positions(targets), calls)
+                results[f'set_joint_positions_nowait/{mode}/{bus_name}'] = _time_calls(
+                    lambda: proto.set_joint_positions(targets, wait=False), calls)
+                proto.check_acks(wait=True)
+    return results
+
+
+def bench_stream(quick: bool) -> dict:
+    duration = 0.5 if quick else 2.0
+    with VirtualHandBus() as bus:
+        proto = _protocol(bus)
+        proto.set_stream_period_ms(1)
+        drains = []
+        frames = 0
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            time.sleep(0.005)   # a 200 Hz consumer
+            start = time.perf_counter()
+            n = proto.drain_stream()
+            drains.append(time.perf_counter() - start)
+            frames += n
+        proto.set_stream_period_ms(0)
+        busy = sum(drains)
+        return {
+            'period_ms': 1,
+            'seconds': duration,
+            'frames': frames,
+            'snapshots': proto.stream_stats.snapshots,
+            'incomplete': proto.stream_stats.incomplete,
+            'snapshots_per_s': proto.stream_stats.snapshots / duration,
+            'frames_per_cpu_s': frames / busy if busy else None,
+            'drain': _summary(drains),
+        }
+
+
+def bench_backlog(quick: bool) -> dict:
+    rounds = 10 if quick else 50
+    results = {}
+    for backlog_ms in (0, 10, 50):
+        with VirtualHandBus() as bus:
+            proto = _protocol(bus)
+            proto.get_joint_positions()
+            if backlog_ms:
+                proto.set_stream_period_ms(1)
+            samples = []
+            ingested = 0
+            for _ in range(rounds):
+                proto.drain_stream()
+                time.sleep(backlog_ms / 1000)   # frames pile up ahead of the response
+                before = proto.metrics.stream
+                start = time.perf_counter()
+                proto.get_joint_positions()
+                samples.append(time.perf_counter() - start)
+                ingested += proto.metrics.stream - before
+            results[f'{backlog_ms}ms'] = dict(_summary(samples), stream_frames_per_read=ingested / rounds,
+                                              timeouts=proto.metrics.timeouts)
+    return results
+
+
+def bench_manus(quick: bool) -> dict:
+    try:
+        from tetra.manus import Manus
+    except ImportError as e:
+        return {'skipped': str(e)}
+    number = 200 if quick else 2000
+    # The retargeting path only reads what the glove callbacks store, so
+    # it can run on a fixed frame without the Manus SDK library.
+    manus = Manus.__new__(Manus)
+    manus.offsets = np.array([np.pi * 30 / 180, 0, 0, 0, 0, 0, 0, 0, 0, 0])
+    manus.scale = np.array([1.8, 1, 1, 1.5, 1.2, 1.6, 1.2, 1.6, 1.2, 1.6])
+    rng = np.random.default_rng(0)
+    skeleton = rng.normal(size=(25, 3)) * 0.05
+    manus._skeleton_data = [skeleton, skeleton.copy()]
+    manus._pos = [[rng.uniform(0, 1, 10), rng.uniform(0, 1, 10)] for _ in range(2)]
+    manus._pos_idx = 0
+    manus._splay_offsets = [None, None]
+    manus._locked_thumb_rot = [None, None]
+    return {
+        'get_joint_positions': {'per_call_us': _per_call_us(lambda: manus.get_joint_positions('left'), number)},
+        'get_thumb_angle': {'per_call_us': _per_call_us(lambda: manus.get_thumb_angle('left'), number)},
+    }
+
+
+BENCHMARKS = {
+    'codec': bench_codec,
+    'control': bench_control,
+    'stream': bench_stream,
+    'backlog': bench_backlog,
+    'manus': bench_manus,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='fewer iterations (smoke run)')
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS), help='run only these cases')
+    parser.add_argument('--output', '-o', help='write the JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    import can
+    report = {
+        'commit': _git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'python_can': can.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'quick': args.quick,
+        'results': {},
+    }
+    for name in args.only or BENCHMARKS:
+        print(f'running {name}...', file=sys.stderr)
+        report['results'][name] = BENCHMARKS[name](args.quick)
+    text = json.dumps(report, indent=1)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
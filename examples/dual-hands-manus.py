@@ -9,27 +9,28 @@ DT = 1/50
 
 def main():
     with can.Bus() as bus:
-        left_hand = tetra.Hand(bus, side='left')
-        right_hand = tetra.Hand(bus, side='right')
+        shared = tetra.SharedBus(bus)
+        left_hand = tetra.Hand(shared, side='left')
+        right_hand = tetra.Hand(shared, side='right')
+        hands = tetra.HandGroup([left_hand, right_hand])
         with tetra.Manus() as manus:
             try:
                 input('press enter to start teleoperation')
 
-                left_hand.enable()
-                right_hand.enable()
+                hands.enable()
 
                 while True:
                     start = time.monotonic()
 
-                    left_hand.set_joint_positions(manus.get_joint_positions(side='left'))
-                    right_hand.set_joint_positions(manus.get_joint_positions(side='right'))
+                    # Both hands' targets go out in one interleaved burst
+                    hands.set_joint_positions([manus.get_joint_positions(side='left'),
+                                               manus.get_joint_positions(side='right')])
 
                     elapsed = time.monotonic() - start
                     if elapsed < DT:
                         time.sleep(DT - elapsed)
             finally:
-                left_hand.disable()
-                right_hand.disable()
+                hands.disable()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
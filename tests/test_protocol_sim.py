@@ -8,14 +8,32 @@ proven correct without hardware.
 
 Run:  python -m pytest tests/test_protocol_sim.py -v   (or just execute it)
 """
+import asyncio
 import math
+import os
 import sys
+import tempfile
+import threading
+import time
 from collections import deque
 
+import can
 import numpy as np
 
 sys.path.insert(0, ".")
-from tetra.can_protocol import CANProtocol, MessageType, ParamType, COUNTS_TO_RAD
+from tetra import codec
+from tetra.capabilities import CapabilityCache
+from tetra.discovery import discover_hands
+from tetra.can_protocol import PIPELINE_MAX_WINDOW, CANProtocol, MessageType, ParamType, COUNTS_TO_RAD
+from tetra.aio import AsyncCANProtocol, AsyncHand
+from tetra.filters import can_filters
+from tetra.group import HandGroup
+from tetra.hand import Hand
+from tetra.history import StreamHistory
+from tetra.reactor import CANReactor
+from tetra.record import FLAG_TX, Recording, RecordingBus, ReplayBus
+from tetra.shared_bus import SharedBus
+from tetra.telemetry import TelemetryLogger, TelemetrySession
 
 HAND_ID = 50
 HOST_ID = 0xAA
@@ -35,16 +53,27 @@ def parse_arb(arb):
 
 
 class FakeMsg:
-    def __init__(self, arbitration_id, data):
+    def __init__(self, arbitration_id, data, is_fd=False):
+        if is_fd:
+            data = list(data) + [0] * (codec.fd_frame_len(len(data)) - len(data))
         self.arbitration_id = arbitration_id
         self.data = bytes(data)
         self.is_extended_id = True
+        self.is_fd = is_fd
 
 
 class FakeFirmwareBus:
     """Duck-typed can.BusABC emulating the hand firmware's CAN handlers."""
 
-    def __init__(self, hires_supported=True, write_error_mask=0, old_firmware_tx=False):
+    def __init__(self, hires_supported=True, write_error_mask=0, old_firmware_tx=False, hand_id=HAND_ID,
+                 fd=False, fd_joints=12):
+        self.hand_id = hand_id
+        # CAN FD bus: FD requests are answered with FD frames of up to
+        # fd_joints joints (3 = firmware that still packs classic chunks),
+        # and stream snapshots go out as one frame.
+        self.fd = fd
+        self.fd_joints = fd_joints
+        self.protocol = can.CanProtocol.CAN_FD if fd else can.CanProtocol.CAN_20
         self.out = deque()              # frames waiting for the host to recv
         self.encoder_counts = [0] * 12  # latest_pos[] equivalent (signed counts)
         self.written = {}               # param -> {joint_idx: value}
@@ -57,6 +86,7 @@ class FakeFirmwareBus:
         # response beyond 3 already-undelivered ones is lost.
         self.old_firmware_tx = old_firmware_tx
         self.events = []                # ("send"|"recv") order trace
+        self.params = {ParamType.HandType.value: 1, ParamType.Version.value: 7}
 
     def _queue_out(self, msg):
         if self.old_firmware_tx and len(self.out) >= 3:
@@ -73,12 +103,13 @@ class FakeFirmwareBus:
         # (float→int16 truncation toward zero)
         return int(counts * COUNTS_TO_RAD * 1000)
 
-    def _respond_joint_read(self, param, mask):
+    def _respond_joint_read(self, param, mask, is_fd=False):
         payload = [0, 0]  # statusMask = 0
         joints_read = 0
+        cap = self.fd_joints if is_fd else 3
         for j in range(12):
             if mask & (1 << j):
-                if joints_read >= 3:   # firmware caps at 3 joints per classic frame
+                if joints_read >= cap:   # firmware caps at 3 joints per classic frame
                     break
                 c = self.encoder_counts[j]
                 if param == ParamType.EncoderValue.value:
@@ -92,11 +123,18 @@ class FakeFirmwareBus:
                 v &= 0xFFFF
                 payload += [v & 0xFF, (v >> 8) & 0xFF]
                 joints_read += 1
-        arb = make_arb(HAND_ID, HOST_ID, param, MessageType.JointParamResp.value)
-        self._queue_out(FakeMsg(arb, payload))
+        arb = make_arb(self.hand_id, HOST_ID, param, MessageType.JointParamResp.value)
+        self._queue_out(FakeMsg(arb, payload, is_fd))
 
     def emit_stream_snapshot(self):
-        """Queue the 4 MessageStreamPositions frames the firmware would send."""
+        """Queue the 4 MessageStreamPositions frames the firmware would send
+        (one frame on CAN FD)."""
+        if self.fd and self.fd_joints == 12:
+            data = [0xFF, 0x0F]
+            for v in self.encoder_counts:
+                data += [v & 0xFF, (v >> 8) & 0xFF]
+            self.out.append(FakeMsg(make_arb(self.hand_id, HOST_ID, 0, MessageType.StreamPositions.value), data, True))
+            return
         for c in range(4):
             base = c * 3
             mask = 0x7 << base
@@ -104,20 +142,26 @@ class FakeFirmwareBus:
             for j in range(base, base + 3):
                 v = self.encoder_counts[j] & 0xFFFF
                 data += [v & 0xFF, (v >> 8) & 0xFF]
-            arb = make_arb(HAND_ID, HOST_ID, c, MessageType.StreamPositions.value)
+            arb = make_arb(self.hand_id, HOST_ID, c, MessageType.StreamPositions.value)
             self.out.append(FakeMsg(arb, data))
 
     # ── BusABC interface ─────────────────────────────────────────────────
     def send(self, msg):
         self.events.append("send")
         f = parse_arb(msg.arbitration_id)
-        assert f["target"] == HAND_ID and f["source"] == HOST_ID
+        if f["target"] != self.hand_id:
+            return  # addressed to another node on the bus
+        assert f["source"] == HOST_ID
+        is_fd = self.fd and getattr(msg, "is_fd", False)
         data = list(msg.data)
         if f["mtype"] == MessageType.ReadJointParam.value:
             if f["param"] == ParamType.PresentPositionHiRes.value and not self.hires_supported:
                 return  # old firmware: unsupported param -> NO response
             mask = data[0] | (data[1] << 8)
-            self._respond_joint_read(f["param"], mask)
+            if is_fd:
+                self._respond_joint_read(f["param"], mask, is_fd=True)
+            else:
+                self._respond_joint_read(f["param"], mask)
         elif f["mtype"] == MessageType.WriteJointParam.value:
             mask = data[0] | (data[1] << 8)
             vals = data[2:]
@@ -129,17 +173,65 @@ class FakeFirmwareBus:
                     store[j] = raw - 0x10000 if raw & 0x8000 else raw
                     k += 1
             em = self.write_error_mask
-            arb = make_arb(HAND_ID, HOST_ID, f["param"], MessageType.JointParamResp.value)
-            self._queue_out(FakeMsg(arb, [em & 0xFF, (em >> 8) & 0xFF]))
+            arb = make_arb(self.hand_id, HOST_ID, f["param"], MessageType.JointParamResp.value)
+            self._queue_out(FakeMsg(arb, [em & 0xFF, (em >> 8) & 0xFF], is_fd))
         elif f["mtype"] == MessageType.WriteParam.value:
             if f["param"] == ParamType.StreamPeriodMs.value:
                 self.stream_period_ms = data[0] | (data[1] << 8)
-            arb = make_arb(HAND_ID, HOST_ID, f["param"], MessageType.ParamResp.value)
+            self.params[f["param"]] = data[0] | (data[1] << 8)
+            arb = make_arb(self.hand_id, HOST_ID, f["param"], MessageType.ParamResp.value)
             self._queue_out(FakeMsg(arb, [0]))
+        elif f["mtype"] == MessageType.ReadParam.value:
+            v = self.params.get(f["param"], 0)
+            if f["param"] == ParamType.StreamPeriodMs.value:
+                v = self.stream_period_ms
+            arb = make_arb(self.hand_id, HOST_ID, f["param"], MessageType.ParamResp.value)
+            self._queue_out(FakeMsg(arb, [0, v & 0xFF, (v >> 8) & 0xFF]))
+
+    filters = None
+
+    def set_filters(self, filters=None):
+        self.filters = filters or None
 
     def recv(self, timeout=None):
         self.events.append("recv")
-        return self.out.popleft() if self.out else None
+        while self.out:
+            msg = self.out.popleft()
+            # Acceptance filtering, as the kernel would apply it.
+            if self.filters is None or any((f["can_id"] ^ msg.arbitration_id) & f["can_mask"] == 0
+                                           for f in self.filters):
+                return msg
+        return None
+
+
+class ThreadedFirmwareBus(FakeFirmwareBus):
+    """FakeFirmwareBus whose recv blocks up to timeout, like a real bus —
+    needed wherever a receiver thread polls it."""
+
+    channel_info = "fake-firmware"
+
+    def fileno(self):
+        raise NotImplementedError   # can.Notifier falls back to a reader thread
+
+    def recv(self, timeout=None):
+        deadline = time.monotonic() + (timeout or 0)
+        while not self.out and time.monotonic() < deadline:
+            time.sleep(0.0002)
+        return super().recv(timeout)
+
+
+class TwoHandBus(FakeFirmwareBus):
+    """Hands 50 and 51 on one bus: frames reach both firmwares and both
+    answer into the same receive queue."""
+
+    def __init__(self):
+        super().__init__()
+        self.other = FakeFirmwareBus(hand_id=HAND_ID + 1)
+        self.other.out = self.out
+
+    def send(self, msg):
+        super().send(msg)
+        self.other.send(msg)
 
 
 def make_proto(**bus_kwargs):
@@ -165,6 +257,33 @@ def test_read_with_joint_offset():
     assert int(res[0]) == -1234
 
 
+def test_codec_partial_chunks_match_legacy_layout():
+    # 5 values from joint 4: frames of 3 + 2 joints, the short one trimmed,
+    # floats truncated toward zero like int(v).
+    bodies = codec.encode_values(np.array([1.9, -1.9, -32768, 32767, 0.0]), joint_offset=4)
+    assert bodies == [bytes([0x70, 0x00, 1, 0, 0xFF, 0xFF, 0x00, 0x80]),
+                      bytes([0x80, 0x01, 0xFF, 0x7F, 0, 0])]
+    resps = [b"\x00\x00" + b[2:] for b in bodies]
+    assert list(codec.decode_values(resps, 5, joint_offset=4)) == [1, -1, -32768, 32767, 0]
+    # A short frame anywhere takes the validating slow path.
+    try:
+        codec.decode_values([resps[0], resps[1][:4]], 5, joint_offset=4)
+        raise AssertionError("expected Exception")
+    except Exception as e:
+        assert "Short joint response" in str(e), str(e)
+
+
+def test_codec_rejects_non_finite_values():
+    bus, proto = make_proto()
+    for bad in (np.nan, -np.nan):
+        try:
+            proto.set_joint_positions(np.array([bad] + [0.1] * 11))
+            raise AssertionError("expected ValueError")
+        except ValueError:
+            pass
+    assert bus.events == [], "nothing may be sent for a rejected target"
+
+
 def test_hires_positions_lossless():
     bus, proto = make_proto(hires_supported=True)
     bus.encoder_counts = [8191, -8192, 1, -1, 0, 4096, -4096, 7000, -7000, 123, -123, 42]
@@ -176,6 +295,22 @@ def test_hires_positions_lossless():
     assert proto._hires_positions is True
 
 
+def test_reads_into_caller_buffers():
+    bus, proto = make_proto(hires_supported=True)
+    out = np.empty(12)
+    for counts in ([100] * 12, list(range(-6, 6))):
+        bus.encoder_counts = counts
+        assert proto.get_joint_positions(out=out) is out      # probe call too
+        assert np.allclose(out, np.array(counts) * COUNTS_TO_RAD, atol=5.1e-5)
+    bus.emit_stream_snapshot()
+    proto.drain_stream()
+    counts_out = np.empty(12, dtype=np.int32)
+    counts, _ = proto.get_stream_counts(out=counts_out)
+    assert counts is counts_out and [int(v) for v in counts] == bus.encoder_counts
+    rad, _ = proto.get_stream_positions(out=out)
+    assert rad is out and np.allclose(out, np.array(bus.encoder_counts) * COUNTS_TO_RAD)
+
+
 def test_hires_fallback_to_legacy():
     bus, proto = make_proto(hires_supported=False)
     bus.encoder_counts = [1000] * 12
@@ -191,6 +326,64 @@ def test_hires_fallback_to_legacy():
     assert sends == 4, f"expected 4 chunk sends, saw {sends}"
 
 
+def test_read_write_params_pipelined():
+    bus, proto = make_proto()
+    proto.write_params({ParamType.TorqueEnabled: 1, ParamType.StreamPeriodMs: 10,
+                        ParamType.TargetDeadmanMs: 300})
+    assert bus.stream_period_ms == 10 and bus.params[ParamType.TargetDeadmanMs.value] == 300
+    bus.events.clear()
+    params = [ParamType.TorqueEnabled, ParamType.HandType, ParamType.Version, ParamType.StreamPeriodMs]
+    values = proto.read_params(params)
+    assert values == {ParamType.TorqueEnabled: 1, ParamType.HandType: 1, ParamType.Version: 7,
+                      ParamType.StreamPeriodMs: 10}
+    assert bus.events[:4] == ["send"] * 4, "not pipelined"
+    try:
+        proto.write_params({ParamType.CANID: 60})
+        raise AssertionError("expected ValueError")
+    except ValueError:
+        pass
+
+
+def test_read_params_windowed_on_old_firmware():
+    bus, proto = make_proto(old_firmware_tx=True)
+    params = [ParamType.HandType, ParamType.Version, ParamType.TorqueEnabled, ParamType.Time, ParamType.StreamPeriodMs]
+    assert proto.read_params(params)[ParamType.Version] == 7
+    assert proto._window == 3
+    # After the drop bursts go out 3 at a time: never more than 3
+    # responses outstanding, so the 3-deep TX FIFO can't overflow.
+    bus.events.clear()
+    assert proto.read_params(params)[ParamType.HandType] == 1
+    assert bus.events[:4] == ["send"] * 3 + ["recv"]
+
+
+def test_read_joint_param_set_interleaved():
+    bus, proto = make_proto()
+    bus.encoder_counts = [3 * (i + 1) for i in range(12)]
+    bus.written[ParamType.TorqueLimit.value] = {j: 100 + j for j in range(12)}
+    bus.written[ParamType.DerivLpfN.value] = {j: 4 for j in range(12)}
+    params = [ParamType.EncoderValue, ParamType.TorqueLimit, ParamType.DerivLpfN]
+    res = proto.read_joint_param_set(params)
+    assert res.shape == (12,) and res.dtype.names == ("EncoderValue", "TorqueLimit", "DerivLpfN")
+    assert list(res["EncoderValue"]) == bus.encoder_counts
+    assert list(res["TorqueLimit"]) == [100 + j for j in range(12)]
+    assert list(res["DerivLpfN"]) == [4] * 12
+    assert bus.events[:12] == ["send"] * 12, "not one burst"
+    # One failed param chunk fails the set — after every response is in.
+    orig = bus._respond_joint_read
+    def failing(param, mask):
+        if param == ParamType.TorqueLimit.value and mask & 0x8:
+            bus.out.append(FakeMsg(make_arb(HAND_ID, HOST_ID, param, MessageType.JointParamResp.value), [8, 0] + [0] * 6))
+            return
+        orig(param, mask)
+    bus._respond_joint_read = failing
+    try:
+        proto.read_joint_param_set(params)
+        raise AssertionError("expected read error")
+    except Exception as e:
+        assert "reading joint params" in str(e)
+    assert len(bus.out) == 0
+
+
 def test_pipelined_write_roundtrip():
     bus, proto = make_proto()
     targets = np.array([0.1 * i - 0.5 for i in range(12)])
@@ -203,6 +396,31 @@ def test_pipelined_write_roundtrip():
     assert sends == [0, 1, 2, 3], "write chunks were not pipelined"
 
 
+def test_send_path_reuses_message_templates():
+    bus, proto = make_proto()
+    arb, resp = proto._arb_ids[MessageType.WriteJointParam, ParamType.TargetPosition]
+    assert arb == make_arb(HOST_ID, HAND_ID, ParamType.TargetPosition.value, MessageType.WriteJointParam.value)
+    assert resp == make_arb(HAND_ID, HOST_ID, ParamType.TargetPosition.value, MessageType.JointParamResp.value)
+    sent = []
+    orig_send = bus.send
+    def send(msg):
+        sent.append((id(msg), bytes(msg.data), msg.dlc))
+        orig_send(msg)
+    bus.send = send
+    proto.set_joint_positions(np.zeros(12))
+    proto.set_joint_positions(np.full(12, 0.25))
+    # One can.Message object for every frame of both transfers, its payload
+    # rewritten in place each time.
+    assert len({i for i, _, _ in sent}) == 1 and len(sent) == 8
+    # Shorter payloads get their own template instead of resizing this one.
+    msg = proto._tx_msgs[arb][8]
+    buf = msg.data
+    proto.set_single_joint_position(1, 0.1)
+    assert msg.data is buf and len(buf) == 8
+    assert all(len(data) == dlc == 8 for _, data, dlc in sent[:8])
+    assert bus.written[ParamType.TargetPosition.value][11] == 2500
+
+
 def test_write_error_raises_and_drains():
     bus, proto = make_proto(write_error_mask=0x0008)
     try:
@@ -245,6 +463,132 @@ def test_stream_frames_interleaved_with_read():
     assert snap is not None and [int(v) for v in snap[0]] == list(range(12))
 
 
+def test_stream_snapshots_are_coherent():
+    bus, proto = make_proto()
+    bus.encoder_counts = [1] * 12
+    bus.emit_stream_snapshot()
+    proto.drain_stream()
+    # Chunk 2 of the next broadcast is lost: its other chunks must not be
+    # mixed into the published snapshot.
+    bus.encoder_counts = [2] * 12
+    bus.emit_stream_snapshot()
+    del bus.out[2]
+    proto.drain_stream()
+    assert [int(v) for v in proto.get_stream_counts()[0]] == [1] * 12
+    # A chunk out of sequence is counted as torn and dropped.
+    bus.encoder_counts = [3] * 12
+    bus.emit_stream_snapshot()
+    bus.out.rotate(-1)            # chunk 0 arrives last
+    proto.drain_stream()
+    assert [int(v) for v in proto.get_stream_counts()[0]] == [1] * 12
+    bus.encoder_counts = [4] * 12
+    bus.emit_stream_snapshot()
+    proto.drain_stream()
+    assert [int(v) for v in proto.get_stream_counts()[0]] == [4] * 12
+    stats = proto.stream_stats
+    assert (stats.snapshots, stats.incomplete, stats.torn) == (2, 3, 1)
+
+
+def test_stream_uses_kernel_timestamps():
+    bus, proto = make_proto()
+    bus.emit_stream_snapshot()
+    for msg in bus.out:
+        msg.timestamp = time.time() - 0.25     # queued for 250 ms
+    proto.drain_stream()
+    _, age = proto.get_stream_counts()
+    assert 0.24 < age < 0.5
+    # Device-clock stamps (not near the wall clock) fall back to "now".
+    bus.emit_stream_snapshot()
+    for msg in bus.out:
+        msg.timestamp = 1234.5
+    proto.drain_stream()
+    assert proto.get_stream_counts()[1] < 0.1
+
+
+def test_stream_history_ring():
+    hist = StreamHistory(num_joints=2, capacity=4)
+    assert len(hist) == 0 and hist.latest() is None
+    for i in range(6):
+        hist.push(float(i), [i, -i])
+    assert len(hist) == 4 and hist.total == 6 and hist.dropped == 2
+    times, counts = hist.last(3)
+    assert list(times) == [3.0, 4.0, 5.0] and list(counts[:, 1]) == [-3, -4, -5]
+    # Views, not copies — and contiguous across the wrap.
+    assert counts.base is not None and counts.flags.c_contiguous
+    assert list(hist.since(3.5)[0]) == [4.0, 5.0]
+    assert list(hist.view()[0]) == [2.0, 3.0, 4.0, 5.0]
+    assert list(hist.view(1, -1)[0]) == [3.0, 4.0]
+    assert list(hist.last(10)[0]) == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_stream_history_records_snapshots():
+    bus, proto = make_proto()
+    for k in range(3):
+        bus.encoder_counts = [k * 10 + i for i in range(12)]
+        bus.emit_stream_snapshot()
+    proto.drain_stream()
+    times, counts = proto.stream_history.last(10)
+    assert len(times) == 3 and np.all(np.diff(times) >= 0)
+    assert [list(map(int, c)) for c in counts] == [[k * 10 + i for i in range(12)] for k in range(3)]
+
+
+def test_record_and_replay():
+    bus = FakeFirmwareBus()
+    bus.encoder_counts = [100 * i for i in range(12)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'session.tcan')
+        recorder = RecordingBus(bus, path)
+        proto = CANProtocol(recorder, HAND_ID, host_can_id=HOST_ID, num_joints=12)
+        expected = proto.get_joint_positions()
+        bus.emit_stream_snapshot()
+        proto.drain_stream()
+        recorder.close()
+        assert recorder.recorded == 8 + 4 and recorder.dropped == 0
+
+        rec = Recording(path)
+        sent = (rec.records['flags'] & FLAG_TX) != 0
+        assert len(rec) == 12 and sent.sum() == 4
+        assert np.all(np.diff(rec.records['t']) >= 0)
+        assert len(rec.between(0, rec.records['t'][4])) == 4
+        assert [m.arbitration_id for _, tx, m in rec.messages() if tx] == [
+            int(a) for a in rec.records['arb_id'][sent]]
+
+        # Replayed into a fresh protocol: the same reads, the same answers.
+        replay = ReplayBus(rec, speed=None)
+        proto = CANProtocol(replay, HAND_ID, host_can_id=HOST_ID, num_joints=12)
+        assert np.array_equal(proto.get_joint_positions(), expected)
+        assert proto.drain_stream() == 4 and replay.done and replay.mismatches == 0
+        del rec, replay
+
+
+def test_telemetry_logger_session():
+    bus, proto = make_proto()
+    with tempfile.TemporaryDirectory() as tmp:
+        logger = TelemetryLogger(tmp, num_joints=12, block_size=4, blocks=3)
+        proto.telemetry = logger
+        targets = [np.full(12, 0.01 * k) for k in range(10)]
+        for values in targets:
+            proto.set_joint_positions(values)
+        for k in range(3):
+            bus.encoder_counts = [k * 10 + i for i in range(12)]
+            bus.emit_stream_snapshot()
+        proto.drain_stream()
+        logger.close()
+        assert logger.dropped == {'targets': 0, 'positions': 0} and logger.error is None
+
+        session = TelemetrySession(tmp)
+        chunks = list(session['targets'].chunks())
+        assert [len(c['time']) for c in chunks] == [4, 4, 2]
+        assert all(isinstance(c['radians'], np.memmap) for c in chunks)
+        logged = session['targets'].read()
+        assert np.allclose(logged['radians'], targets) and np.all(np.diff(logged['time']) >= 0)
+        t = logged['time']
+        assert len(session['targets'].read(t[3], t[7])['time']) == 4
+        assert [list(map(int, c)) for c in session['positions'].read()['counts']] == [
+            [k * 10 + i for i in range(12)] for k in range(3)]
+        del chunks, logged, session
+
+
 def test_set_stream_period():
     bus, proto = make_proto()
     proto.set_stream_period_ms(10)
@@ -258,28 +602,27 @@ def test_set_stream_period():
 
 def test_pipeline_fallback_on_old_firmware():
     # Firmware < 974ab74 drops the tail of a pipelined response burst (3-deep
-    # fire-and-forget TX FIFO). The SDK must detect the timeout, permanently
-    # fall back to serial round-trips, retry, and still return correct data.
+    # fire-and-forget TX FIFO). The SDK must detect the timeout, shrink the
+    # pipeline window to the 3 responses that got through, retry, and still
+    # return correct data.
     bus, proto = make_proto(old_firmware_tx=True)
     bus.encoder_counts = [11 * (i + 1) for i in range(12)]
     res = proto._read_joint_params(ParamType.EncoderValue)
     assert [int(v) for v in res] == bus.encoder_counts
-    assert proto._pipeline is False, "should have downgraded to serial"
-    # Subsequent operations stay serial: send/recv strictly alternate.
+    assert proto._window == 3, "should have shrunk to the FIFO depth"
+    # Subsequent operations go out 3 at a time, then 1.
     bus.events.clear()
     res2 = proto._read_joint_params(ParamType.EncoderValue)
     assert [int(v) for v in res2] == bus.encoder_counts
-    sends = [i for i, e in enumerate(bus.events) if e == "send"]
-    recvs = [i for i, e in enumerate(bus.events) if e == "recv"]
-    assert all(s < r for s, r in zip(sends, recvs)) and len(sends) == 4
-    assert bus.events[:2] == ["send", "recv"], "not serial after downgrade"
+    assert bus.events[:5] == ["send"] * 3 + ["recv"] * 2
+    assert bus.events.count("send") == 4
 
 
 def test_pipeline_fallback_write_old_firmware():
     bus, proto = make_proto(old_firmware_tx=True)
     targets = np.linspace(-0.5, 0.6, 12)
-    proto.set_joint_positions(targets)   # must succeed via serial retry
-    assert proto._pipeline is False
+    proto.set_joint_positions(targets)   # must succeed via a windowed retry
+    assert proto._window == 3
     wire = np.clip(targets * 10000, -32767, 32767)
     stored = bus.written[ParamType.TargetPosition.value]
     for j in range(12):
@@ -288,6 +631,98 @@ def test_pipeline_fallback_write_old_firmware():
 
 
 
+def test_pipeline_window_probes_with_backoff():
+    bus, proto = make_proto(old_firmware_tx=True)
+    proto._read_joint_params(ParamType.EncoderValue)
+    assert proto._window == 3 and proto._window_probe_after == 32
+    # Every read (the retry above included) fills one 3-deep window; after
+    # 32 in a row the window is probed one deeper, the probe loses a
+    # response, and the next probe waits twice as long.
+    for _ in range(31):
+        proto._read_joint_params(ParamType.EncoderValue)
+    assert proto._window == 4
+    res = proto._read_joint_params(ParamType.EncoderValue)
+    assert [int(v) for v in res] == bus.encoder_counts
+    assert proto._window == 3 and proto._window_probe_after == 64
+    assert proto.metrics.downgrades == 2 and proto.metrics.window == 3
+    # New firmware heals from a one-off loss.
+    bus.old_firmware_tx = False
+    proto._window_probe_after = 1
+    proto._read_joint_params(ParamType.EncoderValue)
+    assert proto._window == 4
+
+
+def test_capability_cache_skips_probes():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = CapabilityCache(os.path.join(tmp, "tetra", "capabilities.json"))
+        bus = FakeFirmwareBus(hires_supported=False, old_firmware_tx=True)
+        proto = CANProtocol(bus, HAND_ID, host_can_id=HOST_ID, capability_cache=cache)
+        proto.can_timeout = 0.01
+        proto.get_joint_positions()
+        proto.set_stream_period_ms(10)
+        assert cache.get(HAND_ID, 7) == {"hires": False, "window": 3, "streaming": True, "fd": False}
+        # A restart against the same firmware probes nothing.
+        proto = CANProtocol(bus, HAND_ID, host_can_id=HOST_ID, capability_cache=cache)
+        proto.can_timeout = 0.01
+        bus.events.clear()
+        proto.get_joint_positions()
+        assert proto.metrics.timeouts == 0 and proto._window == 3
+        assert bus.events[:4] == ["send"] * 3 + ["recv"]
+        # A firmware update invalidates the entry.
+        bus.params[ParamType.Version.value] = 8
+        proto = CANProtocol(bus, HAND_ID, host_can_id=HOST_ID, capability_cache=cache)
+        assert proto._hires_positions is None and proto._window == PIPELINE_MAX_WINDOW
+        assert cache.get(HAND_ID, 7) == {} and "hires" not in cache.get(HAND_ID, 8)
+
+
+def test_adaptive_timeouts():
+    bus, proto = make_proto(old_firmware_tx=True)
+    proto.can_timeout = 0.2
+    _, resp_arb_id = proto._arb_ids[MessageType.ReadJointParam, ParamType.EncoderValue]
+    proto._read_joint_params(ParamType.EncoderValue)
+    # Karn's rule: the burst was retried after a drop, so it isn't measured.
+    assert proto.rtt.estimator(resp_arb_id).srtt is None
+    assert proto.rtt.timeout(resp_arb_id) == 0.2
+    proto._read_joint_params(ParamType.EncoderValue)
+    assert proto.rtt.timeout(resp_arb_id) == proto.rtt.floor
+    # Unplugged: measured transactions wait the floor, and after 3 misses in
+    # a row so does everything else.
+    send, bus.send = bus.send, lambda msg: None
+    start = time.monotonic()
+    for _ in range(3):
+        try:
+            proto._read_joint_params(ParamType.EncoderValue)
+        except TimeoutError:
+            pass
+    try:
+        proto.get_hand_type()
+    except TimeoutError:
+        pass
+    assert time.monotonic() - start < 0.15
+    bus.send = send
+    assert proto.get_hand_type() == 1 and proto.rtt.misses == 0
+
+
+def test_protocol_metrics():
+    bus, proto = make_proto(old_firmware_tx=True)
+    proto._read_joint_params(ParamType.EncoderValue)
+    proto.set_stream_period_ms(5)
+    bus.emit_stream_snapshot()
+    bus.out.append(FakeMsg(make_arb(0x10, HOST_ID, 3, MessageType.ParamResp.value), [0]))
+    proto.drain_stream()
+    snap = proto.metrics.snapshot()
+    # 4 pipelined reads (one lost) + 4 windowed retries + 1 param write.
+    assert snap["tx"] == 9 and snap["rx"] == 3 + 4 + 1
+    assert snap["timeouts"] == 1 and snap["downgrades"] == 1 and snap["window"] == 3
+    assert snap["stream"] == 4 and snap["skipped"] == 1
+    rtt = snap["rtt"]
+    # The failed burst records nothing; each retry window is a round trip.
+    assert rtt["EncoderValue"]["count"] == 2 and rtt["StreamPeriodMs"]["count"] == 1
+    assert 0 <= rtt["StreamPeriodMs"]["p50"] < 0.01 and sum(rtt["StreamPeriodMs"]["buckets"]) == 1
+    proto.metrics.reset()
+    assert proto.metrics.snapshot()["tx"] == 0 and proto.metrics.snapshot()["rtt"] == {}
+
+
 def test_target_deadman_param():
     bus, proto = make_proto()
     # Teach the fake firmware to record param 85 like it does 76.
@@ -334,7 +769,7 @@ def test_short_frames_raise_cleanly():
 
 def test_pipeline_middle_drop_recovers():
     # A response lost from the MIDDLE of a pipelined burst: collection times
-    # out, the SDK downgrades to serial and retries — final data must be
+    # out, the SDK shrinks its window and retries — final data must be
     # correct and no orphan frames may remain.
     bus, proto = make_proto()
     bus.encoder_counts = [7 * (i + 1) for i in range(12)]
@@ -348,11 +783,402 @@ def test_pipeline_middle_drop_recovers():
     bus._respond_joint_read = dropper
     res = proto._read_joint_params(ParamType.EncoderValue)
     assert [int(v) for v in res] == bus.encoder_counts
-    assert proto._pipeline is False, "should have downgraded to serial"
+    # Chunks share a response ID: the 3 frames that arrived count as the
+    # window that got through.
+    assert proto._window == 3
     assert len(bus.out) == 0, "orphan frames left in the socket"
     bus._respond_joint_read = orig
 
 
+def test_unacked_target_writes():
+    bus, proto = make_proto()
+    bus.encoder_counts = [7 * (i + 1) for i in range(12)]
+    proto.set_joint_positions(np.full(12, 0.1), wait=False)
+    # Sent without reading the bus; the 4 acks are still queued.
+    assert bus.events == ["send"] * 4 and len(bus.out) == 4
+    assert proto.ack_stats.pending == 4
+    # A waited read on the same bus accounts the acks ahead of its own
+    # responses instead of mistaking them for (or discarding them as) junk.
+    res = proto._read_joint_params(ParamType.EncoderValue)
+    assert [int(v) for v in res] == bus.encoder_counts
+    assert proto.ack_stats.acked == 4 and proto.ack_stats.pending == 0
+    assert bus.written[ParamType.TargetPosition.value][11] == 1000
+    # The next unacked call settles whatever has arrived without blocking.
+    proto.set_joint_positions(np.zeros(12), wait=False)
+    proto.set_joint_positions(np.zeros(12), wait=False)
+    assert proto.ack_stats.acked == 8 and proto.ack_stats.pending == 4
+    assert proto.check_acks(wait=True).pending == 0
+
+    # An error ack is raised from the NEXT call, not lost.
+    bus.write_error_mask = 0x0004
+    proto.set_joint_positions(np.zeros(12), wait=False)
+    bus.write_error_mask = 0
+    try:
+        proto.set_joint_positions(np.zeros(12), wait=False)
+        raise AssertionError("expected deferred write error")
+    except Exception as e:
+        assert "writing joint params" in str(e)
+    assert proto.ack_stats.errors == 4
+    proto.set_joint_positions(np.zeros(12), wait=False)
+    # Acks that never come (old firmware TX FIFO) are counted as missed.
+    bus.out.clear()
+    time.sleep(proto.can_timeout)
+    assert proto.check_acks().missed == 4
+
+
+def test_unacked_target_writes_with_reactor():
+    bus = ThreadedFirmwareBus(write_error_mask=0x0001)
+    with CANReactor.for_bus(bus):
+        proto = CANProtocol(bus, HAND_ID, host_can_id=HOST_ID)
+        proto.can_timeout = 1.0
+        proto.set_joint_positions(np.full(12, 0.2), wait=False)
+        try:
+            proto.check_acks(wait=True)
+            raise AssertionError("expected deferred write error")
+        except Exception as e:
+            assert "writing joint params" in str(e)
+        assert proto.ack_stats.errors == 4 and proto.ack_stats.pending == 0
+
+
+def test_target_delta_writes():
+    bus, proto = make_proto()
+    proto.set_target_delta(True, full_refresh_ms=50)
+    targets = np.arange(-6, 6) * 0.01 + 0.00005   # mid-way between wire units
+    proto.set_joint_positions(targets)
+    assert bus.events.count("send") == 4
+    # Holding the pose (changes below one wire unit) sends nothing.
+    bus.events.clear()
+    proto.set_joint_positions(targets + 1e-6)
+    assert bus.events == []
+    # Only the frame holding a changed joint goes out.
+    targets[7] += 0.01
+    proto.set_joint_positions(targets)
+    assert bus.events.count("send") == 1
+    assert bus.written[ParamType.TargetPosition.value][7] == int(targets[7] * 10000)
+    # The periodic full refresh keeps the deadman fed while holding.
+    time.sleep(0.05)
+    bus.events.clear()
+    proto.set_joint_positions(targets)
+    assert bus.events.count("send") == 4
+    # A failed write forgets the shadow: the next call resends everything.
+    bus.write_error_mask = 0x0001
+    targets[0] += 0.01
+    try:
+        proto.set_joint_positions(targets)
+        raise AssertionError("expected write error")
+    except Exception as e:
+        assert "writing joint params" in str(e)
+    bus.write_error_mask = 0
+    bus.events.clear()
+    proto.set_joint_positions(targets)
+    assert bus.events.count("send") == 4
+
+
+def test_shared_bus_routes_frames_by_hand():
+    bus = TwoHandBus()
+    bus.encoder_counts = [i + 1 for i in range(12)]
+    bus.other.encoder_counts = [-(i + 1) for i in range(12)]
+    shared = SharedBus(bus)
+    left = CANProtocol(shared, HAND_ID, host_can_id=HOST_ID)
+    right = CANProtocol(shared, HAND_ID + 1, host_can_id=HOST_ID)
+    left.can_timeout = right.can_timeout = 0.01
+    # Interleave the other hand's responses and both hands' stream frames
+    # ahead of left's read: nothing is stolen or lost.
+    arb_id, resp_arb_id = right._arb_ids[MessageType.WriteParam, ParamType.StreamPeriodMs]
+    right._send(arb_id, bytes([5, 0]))
+    bus.other.emit_stream_snapshot()
+    bus.emit_stream_snapshot()
+    res = left._read_joint_params(ParamType.EncoderValue)
+    assert [int(v) for v in res] == bus.encoder_counts
+    assert right._await(resp_arb_id)[0] == 0   # the queued ParamResp
+    assert bus.other.stream_period_ms == 5 and bus.stream_period_ms == 0
+    # Both stream caches are current although only left read the bus.
+    assert [int(v) for v in right.get_stream_counts()[0]] == bus.other.encoder_counts
+    assert [int(v) for v in left.get_stream_counts()[0]] == bus.encoder_counts
+    res = right._read_joint_params(ParamType.EncoderValue)
+    assert [int(v) for v in res] == bus.other.encoder_counts
+    assert shared.skipped == 0 and shared.dropped == 0
+
+
+def test_shared_bus_two_threads():
+    class Bus(ThreadedFirmwareBus, TwoHandBus):
+        pass
+    bus = Bus()
+    bus.encoder_counts = [i + 1 for i in range(12)]
+    bus.other.encoder_counts = [-(i + 1) for i in range(12)]
+    shared = SharedBus(bus)
+    errors = []
+    def run(hand_id, expected):
+        try:
+            proto = CANProtocol(shared, hand_id, host_can_id=HOST_ID)
+            for _ in range(30):
+                res = proto._read_joint_params(ParamType.EncoderValue)
+                assert [int(v) for v in res] == expected
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(HAND_ID, bus.encoder_counts)),
+               threading.Thread(target=run, args=(HAND_ID + 1, bus.other.encoder_counts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors
+
+
+def test_hand_group_interleaved_burst():
+    bus = TwoHandBus()
+    left = Hand(CANProtocol(bus, HAND_ID, host_can_id=HOST_ID))
+    right = Hand(CANProtocol(bus, HAND_ID + 1, host_can_id=HOST_ID))
+    group = HandGroup([left, right])
+    assert left.protocol.bus.shared is right.protocol.bus.shared   # moved onto one SharedBus
+    group.enable()
+    assert bus.params[ParamType.TorqueEnabled.value] == 1
+    assert bus.other.params[ParamType.TorqueEnabled.value] == 1
+    bus.events.clear()
+    a, b = np.linspace(-0.5, 0.5, 12), np.linspace(0.5, -0.5, 12)
+    group.set_joint_positions([a, b])
+    # Both hands' 4 chunks go out before the first ack is collected.
+    assert bus.events[:8] == ["send"] * 8
+    for fw, targets in ((bus, a), (bus.other, b)):
+        stored = fw.written[ParamType.TargetPosition.value]
+        assert [stored[j] for j in range(12)] == [int(v) for v in targets * 10000]
+    assert len(bus.out) == 0
+    assert group.get_stream_positions() is None
+    bus.emit_stream_snapshot()
+    bus.other.emit_stream_snapshot()
+    group.drain_stream()
+    rad, ages = group.get_stream_positions()
+    assert rad.shape == (2, 12) and ages.shape == (2,)
+
+
+def test_discover_hands_in_one_burst():
+    bus = TwoHandBus()
+    bus.other.hand_id = 77
+    bus.params[ParamType.HandType.value] = 0
+    start = time.monotonic()
+    found = discover_hands(bus, host_can_id=HOST_ID)
+    assert [(h.can_id, h.side) for h in found] == [(HAND_ID, "left"), (77, "right")]
+    assert bus.events.count("send") == 252 and time.monotonic() - start < 0.5
+    # Through a SharedBus: frames for attached hands keep being routed.
+    shared = SharedBus(bus)
+    left = CANProtocol(shared, HAND_ID, host_can_id=HOST_ID)
+    bus.emit_stream_snapshot()
+    hand = Hand(shared, side="right")
+    assert hand.protocol.hand_can_id == 77
+    assert left.get_stream_counts() is not None
+    # Through a running reactor.
+    bus = ThreadedFirmwareBus(hand_id=77)
+    with CANReactor.for_bus(bus):
+        assert [h.can_id for h in discover_hands(bus, host_can_id=HOST_ID, can_ids=range(40, 90))] == [77]
+
+
+def test_install_can_filters():
+    bus = TwoHandBus()
+    bus.set_filters([{"can_id": 0x123, "can_mask": 0x7FF, "extended": False}])
+    left = CANProtocol(bus, HAND_ID, host_can_id=HOST_ID, install_filters=True)
+    left.can_timeout = 0.01
+    CANProtocol(bus, HAND_ID + 1, host_can_id=HOST_ID, install_filters=True)
+    # Existing filters are kept; 3 frame types per hand are added once each.
+    assert bus.filters[0]["can_id"] == 0x123 and len(bus.filters) == 7
+    assert can_filters(HOST_ID, [HAND_ID]) == bus.filters[1:4]
+    # Frames for another host and requests between other nodes never reach
+    # userspace; our responses and stream frames do.
+    bus.out.append(FakeMsg(make_arb(HAND_ID, 0x10, 0, MessageType.StreamPositions.value), [0] * 8))
+    bus.out.append(FakeMsg(make_arb(0x10, HAND_ID, 6, MessageType.WriteJointParam.value), [0] * 8))
+    assert bus.recv(0) is None
+    bus.emit_stream_snapshot()
+    res = left._read_joint_params(ParamType.EncoderValue)
+    assert [int(v) for v in res] == bus.encoder_counts
+    assert left.get_stream_counts() is not None
+
+
+def test_can_fd_one_frame_per_transfer():
+    bus = FakeFirmwareBus(fd=True)
+    bus.encoder_counts = [-300 + 50 * i for i in range(12)]
+    proto = CANProtocol(bus, HAND_ID, host_can_id=HOST_ID)
+    res = proto._read_joint_params(ParamType.EncoderValue)
+    assert [int(v) for v in res] == bus.encoder_counts and proto.chunk_size == 12
+    # The capability probe plus the read itself.
+    assert proto.metrics.tx == 2
+    targets = np.array([0.1 * i + 0.00005 for i in range(12)])
+    proto.set_joint_positions(targets)
+    assert proto.metrics.tx == 3
+    assert [bus.written[ParamType.TargetPosition.value][j] for j in range(12)] == [int(t * 10000) for t in targets]
+    bus.emit_stream_snapshot()
+    assert proto.drain_stream() == 1
+    counts, _ = proto.get_stream_counts()
+    assert list(counts) == bus.encoder_counts and proto.stream_stats.snapshots == 1
+    res = proto.read_joint_param_set([ParamType.EncoderValue, ParamType.TargetPosition])
+    assert list(res["EncoderValue"]) == bus.encoder_counts
+    assert proto.metrics.tx == 5
+
+
+def test_can_fd_probe_falls_back_to_classic():
+    # An FD bus whose firmware still packs 3 joints per frame...
+    bus = FakeFirmwareBus(fd=True, fd_joints=3)
+    bus.encoder_counts = list(range(12))
+    proto = CANProtocol(bus, HAND_ID, host_can_id=HOST_ID)
+    res = proto._read_joint_params(ParamType.EncoderValue)
+    assert [int(v) for v in res] == bus.encoder_counts
+    assert proto.chunk_size == 3 and proto.metrics.tx == 1 + 4
+    # ...and a classic bus, which is never probed.
+    bus, proto = make_proto()
+    proto._read_joint_params(ParamType.EncoderValue)
+    assert proto._fd is False and proto.metrics.tx == 4
+
+
+def test_reactor_concurrent_callers():
+    # Several threads sharing one protocol through a reactor each get their
+    # own responses — no stolen frames, no timeouts.
+    bus = ThreadedFirmwareBus()
+    bus.encoder_counts = [5 * (i + 1) for i in range(12)]
+    with CANReactor.for_bus(bus) as reactor:
+        proto = CANProtocol(bus, HAND_ID, host_can_id=HOST_ID)
+        assert proto.reactor is reactor
+        proto.can_timeout = 1.0
+        errors = []
+        def reader():
+            try:
+                for _ in range(25):
+                    res = proto._read_joint_params(ParamType.EncoderValue)
+                    assert [int(v) for v in res] == bus.encoder_counts
+            except Exception as e:
+                errors.append(e)
+        def writer():
+            try:
+                for i in range(25):
+                    proto.set_joint_positions(np.full(12, i / 100))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=f) for f in (reader, reader, writer)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+        assert proto._window == PIPELINE_MAX_WINDOW
+        # Stream frames go straight into the cache; drain_stream is a no-op.
+        bus.emit_stream_snapshot()
+        deadline = time.monotonic() + 1.0
+        while proto.get_stream_counts() is None and time.monotonic() < deadline:
+            time.sleep(0.001)
+        assert [int(v) for v in proto.get_stream_counts()[0]] == bus.encoder_counts
+        assert proto.drain_stream() == 0
+    assert CANReactor.running_for(bus) is None
+
+
+def test_reactor_pipeline_fallback_on_old_firmware():
+    bus = ThreadedFirmwareBus(old_firmware_tx=True)
+    bus.encoder_counts = [3 * (i + 1) for i in range(12)]
+    proto = CANProtocol(bus, HAND_ID, host_can_id=HOST_ID, reactor=True)
+    proto.can_timeout = 0.05
+    try:
+        res = proto._read_joint_params(ParamType.EncoderValue)
+        assert [int(v) for v in res] == bus.encoder_counts
+        assert proto._window == 3
+        assert not any(proto.reactor._waiters.values()), "abandoned waiters left queued"
+    finally:
+        proto.reactor.stop()
+
+
+def test_reactor_interleaved_bursts_old_firmware():
+    # Two threads reading the same param with different joint offsets on
+    # old firmware: drops must never hand one caller the other's joints.
+    bus = ThreadedFirmwareBus(old_firmware_tx=True)
+    bus.encoder_counts = [1000 + i for i in range(12)]
+    proto = CANProtocol(bus, HAND_ID, host_can_id=HOST_ID, reactor=True)
+    proto.can_timeout = 0.05
+    errors = []
+    def reader(num_values, joint_offset):
+        try:
+            for _ in range(10):
+                res = proto._read_joint_params(ParamType.EncoderValue, num_values, joint_offset)
+                assert [int(v) for v in res] == bus.encoder_counts[joint_offset:joint_offset + num_values]
+        except Exception as e:
+            errors.append(e)
+    try:
+        threads = [threading.Thread(target=reader, args=a) for a in ((12, 0), (6, 6))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+    finally:
+        proto.reactor.stop()
+
+
+def test_reactor_stop_and_dispatch_errors():
+    bus = ThreadedFirmwareBus()
+    proto = CANProtocol(bus, HAND_ID, host_can_id=HOST_ID, reactor=True)
+    reactor = proto.reactor
+    # A routing failure drops the frame but keeps the receiver alive.
+    def broken_ingest(msg):
+        raise ValueError("bad frame")
+    proto._maybe_ingest_stream = broken_ingest
+    bus.emit_stream_snapshot()
+    deadline = time.monotonic() + 1.0
+    while reactor.dispatch_errors < 4 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert reactor.dispatch_errors == 4 and reactor.running
+    del proto._maybe_ingest_stream
+    proto.set_stream_period_ms(5)
+    assert bus.stream_period_ms == 5
+    # After stop, new requests fail at once and the protocol goes back to
+    # reading the bus directly.
+    reactor.stop()
+    try:
+        reactor.request(lambda: None, 0)
+        raise AssertionError("expected RuntimeError")
+    except RuntimeError:
+        pass
+    start = time.monotonic()
+    proto.set_stream_period_ms(0)
+    assert proto.reactor is None and time.monotonic() - start < 0.1
+    assert bus.stream_period_ms == 0
+
+
+def test_async_protocol_concurrent_and_stream():
+    bus = ThreadedFirmwareBus()
+    bus.encoder_counts = [9 * (i + 1) for i in range(12)]
+    async def main():
+        async with AsyncHand(bus, can_id=HAND_ID) as hand:
+            proto = hand.protocol
+            proto.host_can_id = HOST_ID
+            proto._build_arb_ids()
+            proto.can_timeout = 0.5
+            targets = np.linspace(-0.3, 0.3, 12)
+            reads = await asyncio.gather(
+                proto._read_joint_params(ParamType.EncoderValue),
+                hand.set_joint_positions(targets),
+                proto._read_joint_params(ParamType.EncoderValue, 6, 6))
+            assert [int(v) for v in reads[0]] == bus.encoder_counts
+            assert [int(v) for v in reads[2]] == bus.encoder_counts[6:]
+            stored = bus.written[ParamType.TargetPosition.value]
+            assert [stored[j] for j in range(12)] == [int(v) for v in targets * 10000]
+            pos = await hand.get_joint_positions()
+            assert np.allclose(pos, np.array(bus.encoder_counts) * COUNTS_TO_RAD, atol=1e-4)
+            await proto.set_stream_period_ms(5)
+            assert bus.stream_period_ms == 5
+            stream = hand.stream()
+            bus.emit_stream_snapshot()
+            rad, age = await asyncio.wait_for(stream.__anext__(), 1.0)
+            assert np.allclose(rad, np.array(bus.encoder_counts) * COUNTS_TO_RAD)
+            await stream.aclose()
+    asyncio.run(main())
+
+
+def test_async_pipeline_fallback_on_old_firmware():
+    bus = ThreadedFirmwareBus(old_firmware_tx=True)
+    bus.encoder_counts = [4 * (i + 1) for i in range(12)]
+    async def main():
+        async with AsyncCANProtocol(bus, HAND_ID, host_can_id=HOST_ID) as proto:
+            proto.can_timeout = 0.05
+            res = await proto._read_joint_params(ParamType.EncoderValue)
+            assert [int(v) for v in res] == bus.encoder_counts
+            assert proto._window == 3
+    asyncio.run(main())
+
+
 if __name__ == "__main__":
     fns = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
     for fn in fns:
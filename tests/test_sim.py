@@ -0,0 +1,137 @@
+"""The SDK against tetra.sim.VirtualHandBus, through the public Hand API."""
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, ".")
+from tetra.can_protocol import ParamType
+from tetra.hand import Hand
+from tetra.sim import VirtualHandBus
+from tetra.trajectory import Trajectory, TrajectoryRunner
+
+
+def test_hand_discovers_and_moves():
+    with VirtualHandBus(hand_can_id=51, side='right', time_constant=0.02) as bus:
+        hand = Hand(bus)
+        assert hand.protocol.hand_can_id == 51 and hand.get_side() == 'right'
+        hand.enable()
+        assert hand.enabled()
+        hand.set_joint_positions([0.5] * 12)
+        time.sleep(0.15)
+        assert np.allclose(hand.get_joint_positions(), 0.5, atol=5e-3)
+        hand.disable()
+        held = bus.positions
+        hand.set_joint_positions([0.0] * 12)
+        time.sleep(0.05)
+        assert np.allclose(bus.positions, held)     # no torque: joints don't move
+
+
+def test_legacy_firmware_params():
+    with VirtualHandBus(hires=False, streaming=False, positions=[0.25] * 12) as bus:
+        hand = Hand(bus, can_id=50)
+        hand.protocol.can_timeout = 0.02
+        assert np.allclose(hand.get_joint_positions(), 0.25, atol=1.1e-3)
+        assert hand.protocol._hires_positions is False
+        with pytest.raises(TimeoutError):
+            hand.protocol.set_stream_period_ms(5)
+        hand.set_torque_limit(0.5)
+        assert hand.get_torque_limit() == 0.5
+
+
+def test_stream_broadcasts():
+    with VirtualHandBus(positions=np.linspace(-1, 1, 12)) as bus:
+        proto = Hand(bus, can_id=50).protocol
+        proto.set_stream_period_ms(5)
+        time.sleep(0.05)
+        assert proto.drain_stream() >= 4 * 5
+        positions, age = proto.get_stream_positions()
+        assert np.allclose(positions, np.linspace(-1, 1, 12), atol=4e-4)
+        assert age < 0.01
+
+
+def test_target_deadman_trips():
+    with VirtualHandBus() as bus:
+        hand = Hand(bus, can_id=50)
+        hand.enable()
+        hand.protocol.set_target_deadman_ms(20)
+        hand.set_joint_positions([1.0] * 12)
+        time.sleep(0.06)
+        assert bus.limp
+        assert hand.protocol._read_param(ParamType.DeadmanTripCount) >= 1
+        stopped = bus.positions
+        time.sleep(0.02)
+        assert np.allclose(bus.positions, stopped)
+        hand.set_joint_positions([1.0] * 12)        # a target write revives it
+        assert not bus.limp
+
+
+def test_old_firmware_tx_fifo_drops():
+    with VirtualHandBus(tx_depth=3, positions=[0.1] * 12) as bus:
+        proto = Hand(bus, can_id=50).protocol
+        assert np.allclose(proto.get_joint_positions(), 0.1, atol=1e-4)
+        assert bus.dropped > 0 and proto._window == 3
+        dropped = bus.dropped
+        proto.get_joint_positions()
+        assert bus.dropped == dropped
+
+
+def test_bus_timing_and_fd():
+    # A 12-joint read at 125 kbit/s: 4 requests of 83 bits (2-byte mask)
+    # and 4 responses of 131 bits (8 bytes), one after the other.
+    with VirtualHandBus(bitrate=125_000, latency=0) as bus:
+        proto = Hand(bus, can_id=50).protocol
+        start = time.monotonic()
+        proto.get_joint_positions()
+        assert time.monotonic() - start >= 4 * (83 + 131) / 125_000
+    with VirtualHandBus(fd=True) as bus:
+        hand = Hand(bus, can_id=50)
+        hand.set_joint_positions([0.3] * 12)
+        assert hand.protocol.chunk_size == 12
+        assert np.allclose(bus.targets, 0.3)
+
+
+def test_trajectory_interpolation_and_velocity_limits():
+    waypoints = np.array([[0.0] * 12, [1.0] * 12, [0.2] * 12])
+    for method in ('cubic', 'quintic'):
+        traj = Trajectory.from_waypoints(waypoints, max_velocity=2.0, method=method)
+        assert np.allclose(traj.sample(traj.times), waypoints)
+        t = np.linspace(0, traj.duration, 2001)
+        assert np.abs(traj.velocity(t)).max() <= 2.0 + 1e-6
+        q = traj.sample(t)
+        assert q.min() >= 0.0 and q.max() <= 1.0            # no overshoot
+        assert np.allclose(traj.velocity([0.0, traj.duration]), 0.0)
+    # A sampled trajectory too fast for the limit gets stretched.
+    times = np.linspace(0, 1, 51)
+    traj = Trajectory(times, np.outer(np.sin(times), np.ones(12)), max_velocity=0.5)
+    assert traj.duration > 1.5
+    assert np.abs(traj.velocity(np.linspace(0, traj.duration, 2001))).max() <= 0.5 + 1e-6
+
+
+def test_trajectory_runner_start_preempt_stop():
+    with VirtualHandBus(time_constant=0.01) as bus:
+        hand = Hand(bus, can_id=50)
+        hand.enable()
+        with TrajectoryRunner(hand, rate_hz=200) as runner:
+            # Joint 2 is clamped to its joint_configs maximum (π/2).
+            traj = Trajectory.from_waypoints([[0.5] * 12, [2.0] * 12], durations=0.1, start=np.zeros(12))
+            runner.start(traj)
+            with pytest.raises(RuntimeError):
+                runner.start(traj)
+            assert runner.wait(2.0)
+            assert runner.stats.ticks >= 40 and runner.stats.max_late < 0.05
+            assert np.isclose(runner.commanded[1], np.pi / 2) and np.isclose(runner.commanded[0], 2.0)
+
+            runner.start(Trajectory.from_waypoints([[0.0] * 12], durations=5.0, start=runner.commanded))
+            time.sleep(0.05)
+            runner.preempt(Trajectory.from_waypoints([[0.3] * 12], durations=0.05, start=runner.commanded))
+            assert runner.wait(2.0)
+            time.sleep(0.01)                                # the last frames reach the hand
+            assert np.allclose(runner.commanded, 0.3) and np.allclose(bus.targets, 0.3, atol=1e-3)
+
+            runner.start(Trajectory.from_waypoints([[1.0] * 12], durations=5.0, start=runner.commanded))
+            time.sleep(0.05)
+            runner.stop()
+            assert runner.wait(1.0) and not runner.running
+            assert runner.commanded[0] < 0.5
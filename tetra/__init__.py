@@ -1,6 +1,12 @@
+from .aio import AsyncHand
+from .discovery import discover_hands
 from .gello import Gello
+from .group import HandGroup
 from .hand import Hand
 from .manus import Manus
+from .shared_bus import SharedBus
+from .trajectory import Trajectory, TrajectoryRunner
 from .ui import serve
 
-__all__ = ['Gello', 'Hand', 'Manus', 'serve']
+__all__ = ['AsyncHand', 'Gello', 'Hand', 'HandGroup', 'Manus', 'SharedBus', 'Trajectory', 'TrajectoryRunner',
+           'discover_hands', 'serve']
@@ -0,0 +1,516 @@
+"""asyncio counterparts of CANProtocol and Hand.
+
+Every wire method of AsyncCANProtocol / AsyncHand is a coroutine, so one
+event loop can drive several hands concurrently without blocking on CAN
+round trips:
+
+    async with AsyncHand(bus, can_id=50) as left, AsyncHand(bus, can_id=51) as right:
+        await asyncio.gather(left.enable(), right.enable())
+        await asyncio.gather(left.set_joint_positions(a), right.set_joint_positions(b))
+        async for positions, age in left.stream():
+            ...
+
+Frames are received through python-can's Notifier feeding one
+AsyncBufferedReader per bus. A dispatcher task reads that buffer and
+routes each frame exactly like tetra.reactor does for threads: responses
+complete the oldest pending request future for their arbitration ID,
+StreamPositions frames go into the owning protocol's stream cache. The
+pipelining, write-then-validate and old-firmware serial fallback rules are
+the same as CANProtocol's (see CANProtocol._transfer_chunks).
+"""
+import asyncio
+import collections
+import contextlib
+import time
+
+import can
+import numpy as np
+
+from . import codec
+from .can_protocol import AckStats, CANProtocol, MessageType, ParamType
+from .hand import DeviceNotFoundError, Hand, num_joints
+from .reactor import CANReactor
+
+# (id(bus), loop) -> _AsyncDispatcher; python-can allows one Notifier per bus.
+_dispatchers = {}
+
+
+class _AsyncDispatcher:
+    def __init__(self, bus: can.BusABC, loop: asyncio.AbstractEventLoop):
+        self.bus = bus
+        self.loop = loop
+        self.skipped = 0
+        self._waiters = {}                 # resp arb ID -> deque of Futures
+        self._protocols = set()
+        self._reader = can.AsyncBufferedReader()
+        self._notifier = can.Notifier(bus, [self._reader], loop=loop)
+        self._task = loop.create_task(self._run())
+
+    @classmethod
+    def attach(cls, protocol: 'AsyncCANProtocol') -> '_AsyncDispatcher':
+        loop = asyncio.get_running_loop()
+        key = (id(protocol.bus), loop)
+        dispatcher = _dispatchers.get(key)
+        if dispatcher is None:
+            dispatcher = _dispatchers[key] = cls(protocol.bus, loop)
+        dispatcher._protocols.add(protocol)
+        return dispatcher
+
+    def detach(self, protocol: 'AsyncCANProtocol'):
+        self._protocols.discard(protocol)
+        if not self._protocols:
+            del _dispatchers[id(self.bus), self.loop]
+            self._notifier.stop()
+            self._task.cancel()
+            for queue in self._waiters.values():
+                for fut in queue:
+                    if not fut.done():
+                        fut.set_exception(RuntimeError('CAN dispatcher closed'))
+            self._waiters = {}
+
+    def request(self, send, resp_arb_id: int) -> asyncio.Future:
+        # Single-threaded: registering then sending can't interleave with
+        # another coroutine's request, so waiter order is send order.
+        fut = self.loop.create_future()
+        fut.arb_id = resp_arb_id
+        queue = self._waiters.setdefault(resp_arb_id, collections.deque())
+        queue.append(fut)
+        try:
+            send()
+        except BaseException:
+            queue.pop()
+            raise
+        return fut
+
+    def cancel(self, fut: asyncio.Future):
+        queue = self._waiters.get(fut.arb_id)
+        if queue is not None and fut in queue:
+            queue.remove(fut)
+
+    async def wait(self, fut: asyncio.Future, timeout: float):
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except asyncio.TimeoutError:
+            self.cancel(fut)
+            if fut.done():
+                return fut.result()
+            raise TimeoutError('No CAN response received')
+
+    async def _run(self):
+        async for msg in self._reader:
+            queue = self._waiters.get(msg.arbitration_id)
+            if queue:
+                fut = queue.popleft()
+                if not fut.done():
+                    fut.set_result(msg.data)
+                continue
+            try:
+                if any(p._maybe_ingest_stream(msg) for p in list(self._protocols)):
+                    continue
+            except Exception:
+                pass
+            self.skipped += 1
+
+
+class AsyncCANProtocol(CANProtocol):
+    """CANProtocol whose wire methods are coroutines. Arbitration-ID tables,
+    codec use and the stream cache are shared with CANProtocol; only the
+    transport differs. Use as an async context manager, or call close()."""
+
+    def __init__(self, bus: can.BusABC, hand_can_id: int = 50, host_can_id: int = 0xaa, priority: int = 3,
+                 num_joints: int = 12, stream_history: int = 4096, install_filters: bool = False,
+                 fd: bool | None = None):
+        if CANReactor.running_for(bus) is not None:
+            raise ValueError('bus is owned by a threaded CANReactor')
+        super().__init__(bus, hand_can_id, host_can_id, priority, num_joints, reactor=False,
+                         stream_history=stream_history, install_filters=install_filters, fd=fd)
+        self._dispatcher = None
+        self._async_burst_locks = {}
+        self._stream_event = None
+
+    async def __aenter__(self):
+        self._attach()
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.detach(self)
+            self._dispatcher = None
+
+    def _attach(self) -> _AsyncDispatcher:
+        if self._dispatcher is None:
+            self._dispatcher = _AsyncDispatcher.attach(self)
+            self._stream_event = asyncio.Event()
+        return self._dispatcher
+
+    # ── transport ────────────────────────────────────────────────────────
+    def _request(self, arb_id, body, resp_arb_id):
+        return self._attach().request(lambda: self._send(arb_id, body), resp_arb_id)
+
+    async def _await(self, waiter, outstanding: int = 1):
+        try:
+            data = await self._dispatcher.wait(waiter, self.rtt.timeout(waiter.arb_id, outstanding))
+        except TimeoutError:
+            self.metrics.timeouts += 1
+            self.rtt.missed(waiter.arb_id)
+            raise
+        self.metrics.rx += 1
+        self.rtt.answered()
+        return data
+
+    def _abandon(self, waiters):
+        for waiter in waiters:
+            self._dispatcher.cancel(waiter)
+
+    async def _ensure_transport(self):
+        """See CANProtocol._ensure_transport."""
+        if self._fd is not None:
+            return
+        self._set_fd(True)
+        try:
+            self._set_fd(self._fd_probe_ok(await self._await(self._request(*self._fd_probe_request()))))
+        except TimeoutError:
+            self._set_fd(False)
+        except BaseException:
+            self._set_fd(None)
+            raise
+        self._save_capabilities()
+
+    async def _transfer_chunks(self, arb_id, resp_arb_id, bodies):
+        """See CANProtocol._transfer_chunks; bursts on one response ID are
+        serialized across coroutines for the same reason."""
+        return await self._exchange_pipelined([(arb_id, body, resp_arb_id) for body in bodies])
+
+    async def _exchange_pipelined(self, requests):
+        async with contextlib.AsyncExitStack() as stack:
+            for resp_arb_id in sorted({r for _, _, r in requests}):
+                lock = self._async_burst_locks.get(resp_arb_id)
+                if lock is None:
+                    lock = self._async_burst_locks[resp_arb_id] = asyncio.Lock()
+                await stack.enter_async_context(lock)
+            first = True
+            while True:
+                window = self._window
+                try:
+                    return await self._exchange(requests, window, sample=first)
+                except TimeoutError:
+                    if self._window >= window:
+                        raise
+                first = False
+
+    async def _exchange(self, requests, window: int, sample: bool = True):
+        resps = []
+        for start in range(0, len(requests), window):
+            batch = requests[start:start + window]
+            sent_at = time.monotonic()
+            waiters = [self._request(arb_id, body, resp_arb_id) for arb_id, body, resp_arb_id in batch]
+            got = []
+            try:
+                for waiter in waiters:
+                    got.append(await self._await(waiter, len(waiters) - len(got)))
+            except TimeoutError:
+                self._abandon(waiters[len(got) + 1:])
+                if len(batch) > 1 and got:
+                    self._window_drop(len(batch), len(got))
+                raise
+            self._window_ok(len(batch))
+            resps += got
+            for resp_arb_id in {r for _, _, r in batch}:
+                self._record_rtt(resp_arb_id, sent_at, len(batch), sample)
+        return resps
+
+    async def _read_param(self, param_type: ParamType) -> int:
+        arb_id, resp_arb_id = self._arb_ids[MessageType.ReadParam, param_type]
+        start = time.monotonic()
+        data = await self._await(self._request(arb_id, b'', resp_arb_id))
+        self._record_rtt(resp_arb_id, start)
+        if len(data) < 3:
+            raise Exception(f'Short param response ({len(data)} bytes)')
+        if data[0] != 0:
+            raise Exception('Error reading param')
+        return self._bytes_to_int(data[1], data[2])
+
+    async def read_params(self, param_types) -> dict:
+        """See CANProtocol.read_params."""
+        param_types = list(param_types)
+        resps = await self._exchange_pipelined(self._read_params_requests(param_types))
+        return self._parse_read_params(param_types, resps)
+
+    async def write_params(self, values: dict):
+        """See CANProtocol.write_params."""
+        resps = await self._exchange_pipelined(self._write_params_requests(values))
+        self._check_write_params(values, resps)
+
+    async def _write_param(self, param_type: ParamType, value: int, resp_hand_can_id: int = None):
+        arb_id, resp_arb_id = self._arb_ids[MessageType.WriteParam, param_type]
+        if resp_hand_can_id is not None:
+            resp_arb_id = self._param_arb_id(MessageType.ParamResp, param_type, self.host_can_id, resp_hand_can_id)
+        start = time.monotonic()
+        data = await self._await(self._request(arb_id, (value & 0xFF, value >> 8), resp_arb_id))
+        self._record_rtt(resp_arb_id, start)
+        if len(data) < 1:
+            raise Exception('Short param-write response (0 bytes)')
+        if data[0] != 0:
+            raise Exception(f'Error writing param {data[0]}')
+
+    async def _read_joint_params(self, param_type: ParamType, num_values: int = -1, joint_offset: int = 0,
+                                 out=None) -> np.ndarray:
+        arb_id, resp_arb_id = self._arb_ids[MessageType.ReadJointParam, param_type]
+        if num_values == -1:
+            num_values = self.num_joints
+        await self._ensure_transport()
+        bodies = codec.encode_masks(num_values, joint_offset, self.chunk_size)
+        resps = await self._transfer_chunks(arb_id, resp_arb_id, bodies)
+        return codec.decode_values(resps, num_values, joint_offset, self.chunk_size,
+                                   out=np.empty(num_values) if out is None else out)
+
+    async def read_joint_param_set(self, param_types, num_values: int = -1, joint_offset: int = 0) -> np.ndarray:
+        """See CANProtocol.read_joint_param_set."""
+        param_types = list(param_types)
+        if num_values == -1:
+            num_values = self.num_joints
+        await self._ensure_transport()
+        resps = await self._exchange_pipelined(self._joint_param_set_requests(param_types, num_values, joint_offset))
+        return self._decode_joint_param_set(param_types, resps, num_values, joint_offset)
+
+    async def _write_joint_params(self, param_type: ParamType, values: np.ndarray, joint_offset: int = 0):
+        arb_id, resp_arb_id = self._arb_ids[MessageType.WriteJointParam, param_type]
+        await self._ensure_transport()
+        bodies = codec.encode_values(values, joint_offset, self.chunk_size)
+        codec.check_write_acks(await self._transfer_chunks(arb_id, resp_arb_id, bodies))
+
+    def _on_stream_snapshot(self):
+        if self._stream_event is not None:
+            self._stream_event.set()
+
+    def drain_stream(self) -> int:
+        """No-op: the dispatcher ingests stream frames as they arrive."""
+        return 0
+
+    async def _answers(self) -> bool:
+        try:
+            await self._read_param(ParamType.Version)
+            return True
+        except TimeoutError:
+            return False
+
+    # ── public API (coroutine versions of CANProtocol's) ─────────────────
+    async def read_param(self, param_type: ParamType) -> int:
+        return await self._read_param(param_type)
+
+    async def write_param(self, param_type: ParamType, value: int):
+        await self._write_param(param_type, value)
+
+    async def enable(self):
+        await self._write_param(ParamType.TorqueEnabled, 1)
+
+    async def disable(self):
+        await self._write_param(ParamType.TorqueEnabled, 0)
+
+    async def enabled(self):
+        return await self._read_param(ParamType.TorqueEnabled) != 0
+
+    async def get_hand_type(self):
+        return await self._read_param(ParamType.HandType)
+
+    async def update_hand_type(self, side='left'):
+        if side not in ('left', 'right'):
+            raise ValueError('side must be either "left" or "right"')
+        await self._write_param(ParamType.HandType, 1 if side == 'right' else 0)
+
+    async def update_can_id(self, new_can_id):
+        await self._write_param(ParamType.CANID, new_can_id, resp_hand_can_id=new_can_id)
+        self.hand_can_id = new_can_id
+        self._build_arb_ids()
+        self._save_capabilities()
+
+    async def get_start_time(self):
+        return await self._read_param(ParamType.Time)
+
+    async def get_joint_positions(self, out=None):
+        # Same hi-res probe and out handling as CANProtocol.get_joint_positions.
+        if self._hires_positions is None:
+            try:
+                res = await self._read_joint_params(ParamType.PresentPositionHiRes, out=out)
+                self._hires_positions = True
+                self._save_capabilities()
+                return codec.wire_to_positions(res, codec.HIRES_SCALE, out=res)
+            except TimeoutError:
+                self._hires_positions = False
+                res = await self._read_joint_params(ParamType.PresentPosition, out=out)
+                self._save_capabilities()
+                return codec.wire_to_positions(res, codec.LEGACY_SCALE, out=res)
+        param_type, scale = self._position_param()
+        res = await self._read_joint_params(param_type, out=out)
+        return codec.wire_to_positions(res, scale, out=res)
+
+    async def set_stream_period_ms(self, period_ms: int):
+        if period_ms < 0 or period_ms > 1000:
+            raise ValueError('period_ms must be between 0 and 1000')
+        if self._streaming is False:
+            raise TimeoutError('No CAN response received (firmware without streaming)')
+        try:
+            await self._write_param(ParamType.StreamPeriodMs, int(period_ms))
+        except TimeoutError:
+            if await self._answers():
+                self._stream_support(False)
+            raise
+        self._stream_support(True)
+        if period_ms == 0:
+            self._reset_stream()
+
+    async def set_target_deadman_ms(self, deadman_ms: int):
+        if deadman_ms < 0 or deadman_ms > 10000:
+            raise ValueError('deadman_ms must be between 0 and 10000')
+        await self._write_param(ParamType.TargetDeadmanMs, int(deadman_ms))
+
+    async def stream(self):
+        """Async iterator over streamed snapshots as (radians, age). Yields
+        the latest complete snapshot each time a new frame completes one;
+        a slow consumer skips snapshots rather than queueing them."""
+        self._attach()
+        while True:
+            await self._stream_event.wait()
+            self._stream_event.clear()
+            snap = self.get_stream_positions()
+            if snap is not None:
+                yield snap
+
+    async def set_joint_positions(self, values, wait: bool = True):
+        """See CANProtocol.set_joint_positions; wait=False returns as soon
+        as the frames are queued for sending."""
+        self._settle_acks()
+        self._raise_ack_error()
+        await self._ensure_transport()
+        arb_id, resp_arb_id = self._arb_ids[MessageType.WriteJointParam, ParamType.TargetPosition]
+        bodies, shadow = self._target_frames(codec.positions_to_wire(values))
+        if self.telemetry is not None:
+            self.telemetry.log_target(time.monotonic(), values)
+        if not bodies:
+            return
+        if not wait:
+            self._send_unacked(arb_id, resp_arb_id, bodies)
+            self._target_shadow = shadow
+            return
+        try:
+            codec.check_write_acks(await self._transfer_chunks(arb_id, resp_arb_id, bodies))
+        except Exception:
+            self._target_shadow = None
+            raise
+        self._target_shadow = shadow
+
+    async def check_acks(self, wait: bool = False) -> AckStats:
+        """See CANProtocol.check_acks."""
+        self._settle_acks()
+        while wait and self._unacked:
+            _, deadline, waiter = self._unacked[0]
+            await asyncio.wait([waiter], timeout=max(0.0, deadline - time.monotonic()))
+            self._settle_acks()
+        self._raise_ack_error()
+        return self.ack_stats
+
+    async def set_single_joint_position(self, joint_id: int, value: float):
+        int_value = int(max(-codec.WIRE_MAX, min(codec.WIRE_MAX, value * codec.HIRES_SCALE)))
+        self._target_shadow = None
+        await self._write_joint_params(ParamType.TargetPosition, np.array([int_value]), joint_offset=joint_id-1)
+
+    async def get_torque_limit(self) -> float:
+        res = await self._read_joint_params(ParamType.TorqueLimit, 1)
+        return float(res[0]) / 1000
+
+    async def set_torque_limit(self, torque_limit):
+        await self._write_joint_params(ParamType.TorqueLimit, np.repeat(int(torque_limit * 1000), self.num_joints))
+
+    async def set_joint_proportional(self, joint_id, value):
+        await self._write_joint_params(ParamType.Proportional, np.array([value]), joint_id-1)
+
+
+class AsyncHand(Hand):
+    """Hand whose methods are coroutines. Needs an explicit can_id — use
+    AsyncHand.connect() to find a hand by side instead."""
+
+    def __init__(self, can_bus, can_id: int = 50):
+        if not isinstance(can_bus, AsyncCANProtocol):
+            can_bus = AsyncCANProtocol(can_bus, can_id, num_joints=num_joints)
+        super().__init__(can_bus)
+
+    @classmethod
+    async def connect(cls, can_bus: can.BusABC, can_id: int = None, side=None) -> 'AsyncHand':
+        """Bind to can_id, or to the first hand of the given side among the
+        default IDs (probed concurrently)."""
+        if can_id is not None:
+            return cls(can_bus, can_id)
+        candidates = [AsyncCANProtocol(can_bus, i) for i in (50, 51)]
+        try:
+            for p in candidates:
+                p.can_timeout = 0.1
+            types = await asyncio.gather(*(p.get_hand_type() for p in candidates), return_exceptions=True)
+        finally:
+            for p in candidates:
+                p.close()
+        for p, hand_type in zip(candidates, types):
+            if isinstance(hand_type, int) and (side is None or bool(hand_type & 1) == (side == 'right')):
+                return cls(can_bus, p.hand_can_id)
+        raise DeviceNotFoundError(f'No {side} hands found on the CAN bus' if side else 'No hand found on the CAN bus')
+
+    async def __aenter__(self):
+        await self.protocol.__aenter__()
+        return self
+
+    async def __aexit__(self, *args):
+        self.protocol.close()
+
+    def close(self):
+        self.protocol.close()
+
+    async def enable(self):
+        '''Enable the joint motors'''
+        await self.protocol.enable()
+
+    async def disable(self):
+        '''Disable the joint motors'''
+        await self.protocol.disable()
+
+    async def enabled(self):
+        '''Whether the joint motors are enabled'''
+        return await self.protocol.enabled()
+
+    async def get_side(self):
+        '''Returns 'left' or 'right' depending on whether it's a left or right hand'''
+        return 'right' if await self.protocol.get_hand_type() & 1 else 'left'
+
+    async def get_torque_limit(self):
+        '''Get the max power used by the joint motors, between 0 and 1'''
+        return await self.protocol.get_torque_limit()
+
+    async def set_torque_limit(self, torque_limit):
+        '''Set the max power of the joint motors, between 0 and 1'''
+        await self.protocol.set_torque_limit(torque_limit)
+
+    async def get_joint_positions(self, out=None):
+        '''Get the current positions of all the joints (into out, if given)'''
+        return await self.protocol.get_joint_positions(out)
+
+    async def set_joint_positions(self, positions, wait=True):
+        '''Set the target positions of all joints (wait=False: don't wait for acks)'''
+        await self.protocol.set_joint_positions(positions, wait=wait)
+
+    async def set_single_joint_position(self, joint_id, pos):
+        '''Set the target position of a single joint'''
+        await self.protocol.set_single_joint_position(joint_id, pos)
+
+    async def set_grasp_position(self, grasp_name: str, pos: float):
+        '''Put the hand into a particular grasp, with the part of the grasp between 0 and 1'''
+        await self.set_joint_positions(self.get_grasp_position(grasp_name, pos))
+
+    async def read_param(self, param_type: ParamType) -> int:
+        '''Read a hand-level parameter'''
+        return await self.protocol.read_param(param_type)
+
+    def stream(self):
+        '''Async iterator over streamed (positions, age) snapshots; enable
+        streaming first with protocol.set_stream_period_ms'''
+        return self.protocol.stream()
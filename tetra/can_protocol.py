@@ -1,10 +1,23 @@
+import collections
+import concurrent.futures
 import enum
 import math
+import threading
 import time
+from dataclasses import dataclass
 
 import can
 import numpy as np
 
+from . import codec
+from .capabilities import CapabilityCache
+from .filters import install_can_filters
+from .history import StreamHistory
+from .metrics import ProtocolMetrics
+from .reactor import CANReactor
+from .rtt import AdaptiveTimeout
+from .shared_bus import SharedBus, SharedBusEndpoint
+
 class MessageType(enum.Enum):
     ReadParam = 1
     WriteParam = 2
@@ -57,8 +70,50 @@ COUNTS_TO_RAD = 2.0 * math.pi / 16384.0
 
 single_byte_params = set([ParamType.CANID, ParamType.TorqueEnabled, ParamType.Temp])
 
+# Pipeline window (requests outstanding at once, see _transfer_chunks):
+# the starting and largest depth, and how many full windows in a row must
+# succeed before it is probed one deeper (doubled after every failed probe,
+# up to the max).
+PIPELINE_MAX_WINDOW = 32
+WINDOW_PROBE_AFTER = 16
+WINDOW_PROBE_AFTER_MAX = 4096
+
+# Request message type -> the message type the firmware answers it with.
+response_types = {
+    MessageType.ReadParam: MessageType.ParamResp,
+    MessageType.WriteParam: MessageType.ParamResp,
+    MessageType.ReadJointParam: MessageType.JointParamResp,
+    MessageType.WriteJointParam: MessageType.JointParamResp,
+}
+
+@dataclass
+class AckStats:
+    """Accounting for unacknowledged target writes (set_joint_positions
+    with wait=False): frames sent, acks received OK, acks carrying an
+    error status, and acks that never arrived within can_timeout."""
+    sent: int = 0
+    acked: int = 0
+    errors: int = 0
+    missed: int = 0
+
+    @property
+    def pending(self) -> int:
+        return self.sent - self.acked - self.errors - self.missed
+
+@dataclass
+class StreamStats:
+    """Stream snapshot accounting: snapshots published, snapshots dropped
+    because a chunk never arrived (incomplete), and chunks that arrived out
+    of sequence (torn — the snapshot they belonged to is discarded)."""
+    snapshots: int = 0
+    incomplete: int = 0
+    torn: int = 0
+
 class CANProtocol:
-    def __init__(self, bus: can.BusABC, hand_can_id: int = 50, host_can_id: int = 0xaa, priority: int = 3, num_joints: int = 12):
+    def __init__(self, bus: can.BusABC | SharedBus, hand_can_id: int = 50, host_can_id: int = 0xaa, priority: int = 3, num_joints: int = 12,
+                 reactor: CANReactor | bool | None = None, stream_history: int = 4096,
+                 install_filters: bool = False, fd: bool | None = None,
+                 capability_cache: CapabilityCache | bool | None = None):
         self.bus = bus
         if hand_can_id <= 0 or hand_can_id > 253:
             raise ValueError('hand_can_id must be between 1 and 253')
@@ -73,29 +128,119 @@ class CANProtocol:
         self.priority = priority
 
         self.num_joints = num_joints
-        self.can_timeout = 0.5
+        # Response timeouts adapt to the measured RTT of each transaction
+        # type (see tetra.rtt); can_timeout is their ceiling.
+        self.rtt = AdaptiveTimeout(ceiling=0.5)
+        self.metrics = ProtocolMetrics()
+
+        # Arbitration IDs only depend on (message type, param type) once the
+        # hand/host IDs and priority are fixed, so they're computed once here
+        # (and again in update_can_id) instead of twice per transaction.
+        self._build_arb_ids()
 
         # Streaming telemetry cache (see set_stream_period_ms /
         # drain_stream / get_stream_counts). Frames are ingested both by
         # drain_stream and opportunistically by _recv when they interleave
-        # with request/response traffic.
+        # with request/response traffic. Chunks are assembled in _snap_*
+        # and only published to _stream_* once a snapshot is complete, so
+        # readers never see joints from two different broadcasts.
         self._stream_counts = np.zeros(num_joints)
-        self._stream_have = np.zeros(num_joints, dtype=bool)
         self._stream_time = None
+        self._snap_counts = np.zeros(num_joints)
+        self._snap_joints = 0        # bitmask of joints received
+        self._snap_last = -1         # highest chunk index received
+        self._snap_time = None
+        self.stream_stats = StreamStats()
+        # A reactor's receiver thread ingests while callers read.
+        self._stream_lock = threading.Lock()
+        # Every completed snapshot, for consumers that poll slower than the
+        # stream (0 disables).
+        self.stream_history = StreamHistory(num_joints, stream_history) if stream_history else None
+        # Optional session log of targets and streamed snapshots (a
+        # tetra.telemetry.TelemetryLogger).
+        self.telemetry = None
 
         # Whether the firmware supports ParamType.PresentPositionHiRes.
         # None = unknown (probe on first get_joint_positions); the probe
         # costs one can_timeout on firmware that predates the param.
         self._hires_positions = None
 
-        # Pipelined chunk transfers (all requests sent before collecting
-        # responses). Firmware older than 974ab74 transmits responses
-        # fire-and-forget into a 3-deep TX FIFO and silently DROPS the tail
-        # of a burst — the first pipelined timeout therefore falls back to
-        # serial round-trips permanently for this connection (see
-        # _transfer_chunks). True by default: new firmware waits for a free
-        # TX slot and never drops.
-        self._pipeline = True
+        # Pipelined chunk transfers: up to _window requests are sent before
+        # collecting their responses. Firmware older than 974ab74 transmits
+        # responses fire-and-forget into a 3-deep TX FIFO and silently DROPS
+        # the tail of a burst, so a window that loses responses shrinks to
+        # what got through, and is probed deeper again with backoff (see
+        # _transfer_chunks). New firmware waits for a free TX slot and never
+        # drops, so the window stays at PIPELINE_MAX_WINDOW.
+        self._window = PIPELINE_MAX_WINDOW
+        self._window_streak = 0
+        self._window_probe_after = WINDOW_PROBE_AFTER
+        self.metrics.window = self._window
+
+        # CAN FD joint frames: mask + all 12 joints in one (padded) frame
+        # instead of 4 classic frames of 3. None = probe on the first joint
+        # transfer if the bus is in CAN FD mode (see _ensure_transport);
+        # resolved to False right away on a classic bus.
+        self._fd = fd
+
+        # Whether the firmware streams positions (None = not known yet;
+        # learned by set_stream_period_ms).
+        self._streaming = None
+
+        # Opt-in on-disk cache of the probed capabilities above, per hand
+        # CAN ID and firmware Version (see tetra.capabilities). Loaded at the
+        # end of __init__; _cap_version stays None if the hand didn't answer.
+        self.capability_cache = CapabilityCache() if capability_cache is True else capability_cache or None
+        self._cap_version = None
+
+        # Unacknowledged target writes (set_joint_positions(wait=False)):
+        # (resp arb ID, deadline, reactor waiter or None) per frame sent, in
+        # send order. Acks are settled opportunistically — by the next
+        # unacked write, by _recv while it waits for something else, or by
+        # check_acks() — and an error ack is raised from the NEXT call
+        # instead of blocking this one.
+        self._unacked = collections.deque()
+        self.ack_stats = AckStats()
+        self._ack_error = None
+
+        # Delta target writes (set_target_delta): the int16 TargetPosition
+        # wire values the hand holds as far as we know, or None when unknown
+        # (never written, or a write/ack failed). Only frames whose values
+        # differ are sent, plus a full write every _target_refresh_s so the
+        # TargetDeadmanMs deadman stays fed while a pose is held.
+        self._target_delta = False
+        self._target_refresh_s = 0.1
+        self._target_shadow = None
+        self._target_full_at = 0.0
+
+        # Optional background receiver (see tetra.reactor): with one, any
+        # number of threads can run transactions on this bus concurrently.
+        # None = join the bus's reactor if one is already running (reading
+        # the bus directly next to it would steal its frames), True = start
+        # one if needed, False = always read the bus directly. Hooked up
+        # last: the receiver may ingest stream frames right away. The same
+        # goes for a SharedBus, which routes this hand's frames to us.
+        if isinstance(bus, SharedBus):
+            if reactor:
+                raise ValueError('a SharedBus and a reactor both own the bus receive side; use one')
+            self.bus = bus = bus.attach(hand_can_id, self)
+        # Opt-in kernel/interface filtering (see tetra.filters): only frames
+        # from our hand to us reach userspace. Merged with the bus's filter
+        # set, so every hand on the bus must opt in.
+        self.install_filters = install_filters
+        if install_filters:
+            install_can_filters(bus, host_can_id, [hand_can_id])
+        if self._fd is None and getattr(bus, 'protocol', None) != can.CanProtocol.CAN_FD:
+            self._fd = False
+        if reactor is True:
+            reactor = CANReactor.for_bus(bus)
+        elif reactor is None:
+            reactor = CANReactor.running_for(bus)
+        self.reactor = reactor or None
+        if self.reactor is not None:
+            self.reactor.register(self)
+        if self.capability_cache is not None:
+            self.load_capabilities()
 
     def enable(self):
         self._write_param(ParamType.TorqueEnabled, 1)
@@ -116,13 +261,59 @@ class CANProtocol:
         self._write_param(ParamType.HandType, new_type)
 
     def update_can_id(self, new_can_id):
-        self._write_param(ParamType.CANID, new_can_id, resp_hand_can_id=new_can_id)
+        endpoint = self.bus
+        if self.install_filters:
+            install_can_filters(self.bus, self.host_can_id, [new_can_id])
+        if isinstance(endpoint, SharedBusEndpoint):
+            # The response already comes from the new ID.
+            self.bus = endpoint.shared.attach(new_can_id, self)
+        try:
+            self._write_param(ParamType.CANID, new_can_id, resp_hand_can_id=new_can_id)
+        except Exception:
+            self.bus = endpoint
+            raise
         self.hand_can_id = new_can_id
+        self._build_arb_ids()
+        self._save_capabilities()
+
+    def load_capabilities(self):
+        """Read the firmware Version and take whatever capability_cache
+        knows about this hand at that version, instead of probing for it.
+        A hand that doesn't answer leaves everything to be probed."""
+        try:
+            self._cap_version = self._read_param(ParamType.Version)
+        except TimeoutError:
+            return
+        capabilities = self.capability_cache.get(self.hand_can_id, self._cap_version)
+        if capabilities:
+            self._apply_capabilities(capabilities)
+        else:
+            self._save_capabilities()   # drops an entry for other firmware
+
+    def _capabilities(self) -> dict:
+        return {'hires': self._hires_positions, 'window': self._window, 'streaming': self._streaming, 'fd': self._fd}
+
+    def _apply_capabilities(self, capabilities: dict):
+        if self._hires_positions is None and 'hires' in capabilities:
+            self._hires_positions = bool(capabilities['hires'])
+        if 'window' in capabilities:
+            self._window = max(1, min(int(capabilities['window']), PIPELINE_MAX_WINDOW))
+            self.metrics.window = self._window
+        if 'streaming' in capabilities:
+            self._streaming = bool(capabilities['streaming'])
+        if self._fd is None and 'fd' in capabilities:
+            self._set_fd(bool(capabilities['fd']))
+
+    def _save_capabilities(self):
+        if self.capability_cache is not None and self._cap_version is not None:
+            self.capability_cache.put(self.hand_can_id, self._cap_version, self._capabilities())
 
     def get_start_time(self):
         return self._read_param(ParamType.Time)
 
-    def get_joint_positions(self):
+    def get_joint_positions(self, out=None):
+        """Present joint positions (radians). With out (a float array of
+        num_joints) they are written into it and no array is allocated."""
         # Prefer the hi-res param (100 µrad wire units — lossless vs the
         # 14-bit encoder). The legacy PresentPosition wire format is mrad
         # (0.057°/LSB), coarser than the sensor itself. Firmware without the
@@ -130,19 +321,28 @@ class CANProtocol:
         # remembers the answer (the failed probe costs one can_timeout).
         if self._hires_positions is None:
             try:
-                res = self._read_joint_params(ParamType.PresentPositionHiRes) / 10000
+                res = self._read_joint_params(ParamType.PresentPositionHiRes, out=out)
                 self._hires_positions = True
-                return res
+                self._save_capabilities()
+                return codec.wire_to_positions(res, codec.HIRES_SCALE, out=res)
             except TimeoutError:
                 self._hires_positions = False
+                res = self._read_joint_params(ParamType.PresentPosition, out=out)
+                self._save_capabilities()   # the hand answers: hi-res is really missing
+                return codec.wire_to_positions(res, codec.LEGACY_SCALE, out=res)
+        param_type, scale = self._position_param()
+        res = self._read_joint_params(param_type, out=out)
+        return codec.wire_to_positions(res, scale, out=res)
+
+    def _position_param(self):
         if self._hires_positions:
-            return self._read_joint_params(ParamType.PresentPositionHiRes) / 10000
-        return self._read_joint_params(ParamType.PresentPosition) / 1000
+            return ParamType.PresentPositionHiRes, codec.HIRES_SCALE
+        return ParamType.PresentPosition, codec.LEGACY_SCALE
 
     # ── Streaming telemetry ──────────────────────────────────────────────
     # With set_stream_period_ms(N), the firmware broadcasts a 12-joint
-    # position snapshot every N ms (4 frames of 3 joints, raw encoder
-    # counts) without being asked. Consume with drain_stream() +
+    # position snapshot every N ms (4 frames of 3 joints, or one CAN FD
+    # frame; raw encoder counts) without being asked. Consume with drain_stream() +
     # get_stream_counts()/get_stream_positions() — zero round-trips.
 
     def set_stream_period_ms(self, period_ms: int):
@@ -151,10 +351,37 @@ class CANProtocol:
         Raises TimeoutError on firmware without streaming support."""
         if period_ms < 0 or period_ms > 1000:
             raise ValueError('period_ms must be between 0 and 1000')
-        self._write_param(ParamType.StreamPeriodMs, int(period_ms))
+        if self._streaming is False:
+            raise TimeoutError('No CAN response received (firmware without streaming)')
+        try:
+            self._write_param(ParamType.StreamPeriodMs, int(period_ms))
+        except TimeoutError:
+            if self._answers():
+                self._stream_support(False)
+            raise
+        self._stream_support(True)
         if period_ms == 0:
+            self._reset_stream()
+
+    def _answers(self) -> bool:
+        """Whether the hand answers at all — after a timeout, tells a
+        missing param apart from a missing hand."""
+        try:
+            self._read_param(ParamType.Version)
+            return True
+        except TimeoutError:
+            return False
+
+    def _stream_support(self, supported: bool):
+        if self._streaming is None:
+            self._streaming = supported
+            self._save_capabilities()
+
+    def _reset_stream(self):
+        with self._stream_lock:
             self._stream_time = None
-            self._stream_have[:] = False
+            self._snap_joints = 0
+            self._snap_last = -1
 
     def set_target_deadman_ms(self, deadman_ms: int):
         """Session safety net: with torque enabled, if this process stops
@@ -169,7 +396,12 @@ class CANProtocol:
     def drain_stream(self) -> int:
         """Consume pending broadcast frames without blocking; returns how
         many stream frames were ingested. Non-stream frames found here are
-        discarded (they can only be stale responses nobody is waiting for)."""
+        discarded (they can only be stale responses nobody is waiting for).
+        With a reactor, stream frames are ingested as they arrive and this
+        is a no-op; on a SharedBus they are ingested while being routed and
+        not counted here."""
+        if self.reactor is not None:
+            return 0
         n = 0
         for _ in range(256):
             msg = self.bus.recv(0)
@@ -177,24 +409,32 @@ class CANProtocol:
                 break
             if self._maybe_ingest_stream(msg):
                 n += 1
+            else:
+                self.metrics.skipped += 1
         return n
 
-    def get_stream_counts(self):
-        """Latest streamed snapshot as (raw signed encoder counts ndarray,
-        age in seconds), or None until every joint has been received at
-        least once."""
-        if self._stream_time is None or not self._stream_have.all():
-            return None
-        return self._stream_counts.copy(), time.monotonic() - self._stream_time
+    def get_stream_counts(self, out=None):
+        """Latest complete streamed snapshot as (raw signed encoder counts
+        ndarray, age in seconds), or None until one has been received. The
+        age is measured from the kernel receive timestamp of the snapshot's
+        first frame when the interface provides one. With out (an array of
+        num_joints) the counts are copied into it instead of a new array."""
+        with self._stream_lock:
+            if self._stream_time is None:
+                return None
+            if out is None:
+                out = self._stream_counts.copy()
+            else:
+                out[:] = self._stream_counts
+            return out, time.monotonic() - self._stream_time
 
-    def get_stream_positions(self):
+    def get_stream_positions(self, out=None):
         """Latest streamed snapshot as (radians ndarray, age in seconds),
-        or None — see get_stream_counts."""
-        snap = self.get_stream_counts()
-        if snap is None:
-            return None
-        counts, age = snap
-        return counts * COUNTS_TO_RAD, age
+        or None — see get_stream_counts (out works the same way)."""
+        with self._stream_lock:
+            if self._stream_time is None:
+                return None
+            return np.multiply(self._stream_counts, COUNTS_TO_RAD, out=out), time.monotonic() - self._stream_time
 
     def _maybe_ingest_stream(self, msg) -> bool:
         """If msg is a MessageStreamPositions frame from our hand to us,
@@ -209,27 +449,147 @@ class CANProtocol:
         data = msg.data
         if len(data) < 2:
             return False
-        mask = data[0] | (data[1] << 8)
-        pos = 2
-        for j in range(self.num_joints):
-            if mask & (1 << j):
-                if pos + 1 >= len(data):
-                    break
-                self._stream_counts[j] = self._bytes_to_int(data[pos], data[pos + 1])
-                self._stream_have[j] = True
-                pos += 2
-        self._stream_time = time.monotonic()
+        self.metrics.stream += 1
+        chunk = (arb >> 16) & 0x7F
+        joints, values = codec.decode_masked(data, self.num_joints)
+        covered = 0
+        for joint in joints.tolist():
+            covered |= 1 << joint
+        stamp = self._frame_time(msg)
+        published = False
+        with self._stream_lock:
+            if chunk <= self._snap_last:
+                # A new broadcast started (chunk 0) or a frame is out of
+                # sequence: whatever was assembled can't be completed. (A
+                # chunk lost mid-snapshot leaves a gap in _snap_joints; that
+                # snapshot is counted here when the next one starts.)
+                if self._snap_joints:
+                    self.stream_stats.incomplete += 1
+                if chunk != 0:
+                    self.stream_stats.torn += 1
+                self._snap_joints = 0
+                self._snap_last = -1
+                if chunk != 0:
+                    return True
+            if not self._snap_joints:
+                self._snap_time = stamp
+            self._snap_counts[joints] = values
+            self._snap_joints |= covered
+            self._snap_last = chunk
+            # Complete once every joint is in — 4 chunks on classic CAN,
+            # a single frame on CAN FD.
+            if self._snap_joints == (1 << self.num_joints) - 1:
+                self._stream_counts[:] = self._snap_counts
+                self._stream_time = self._snap_time
+                self._snap_joints = 0
+                self._snap_last = -1
+                self.stream_stats.snapshots += 1
+                if self.stream_history is not None:
+                    self.stream_history.push(self._stream_time, self._stream_counts)
+                if self.telemetry is not None:
+                    self.telemetry.log_positions(self._stream_time, self._stream_counts)
+                published = True
+        if published:
+            self._on_stream_snapshot()
         return True
 
+    def _on_stream_snapshot(self):
+        """Called (without locks held) after each published snapshot."""
+
+    @staticmethod
+    def _frame_time(msg) -> float:
+        """Receive time of msg on the time.monotonic() clock. python-can's
+        msg.timestamp is the kernel receive time on SocketCAN (time.time()
+        clock) and much closer to the sample than "now" when frames queue
+        up; interfaces that stamp with a device clock (or not at all) are
+        recognised by not being close to the wall clock and get "now"."""
+        now = time.monotonic()
+        timestamp = getattr(msg, 'timestamp', 0.0)
+        if timestamp:
+            offset = time.time() - timestamp
+            if 0 <= offset < 10:
+                return now - offset
+        return now
+
     # TargetPosition wire scale: 100µrad units (×10000), ~0.0057°/LSB — finer
     # than the 14-bit encoder. MUST match the firmware (hand.c ParamTargetPosition
     # ÷10000) and the debugger's _TARGET_POS_SCALE. int16 range caps at ±3.27 rad
     # (±187°), which covers any joint, so values are clipped to be safe.
-    def set_joint_positions(self, values):
-        self._write_joint_params(ParamType.TargetPosition, np.clip(values * 10000, -32767, 32767))
+    def set_joint_positions(self, values, wait: bool = True):
+        """Write joint targets (radians). wait=False sends the frames and
+        returns without waiting for acks — for 200-1000 Hz control loops
+        where a round trip per call would dominate the period. Acks are
+        then counted in ack_stats, and a failed write raises from the next
+        set_joint_positions/check_acks call instead."""
+        self._settle_acks()
+        self._raise_ack_error()
+        self._ensure_transport()
+        arb_id, resp_arb_id = self._arb_ids[MessageType.WriteJointParam, ParamType.TargetPosition]
+        bodies, shadow = self._target_frames(codec.positions_to_wire(values))
+        if self.telemetry is not None:
+            self.telemetry.log_target(time.monotonic(), values)
+        if not bodies:
+            return
+        if not wait:
+            self._send_unacked(arb_id, resp_arb_id, bodies)
+            self._target_shadow = shadow
+            return
+        try:
+            codec.check_write_acks(self._transfer_chunks(arb_id, resp_arb_id, bodies))
+        except Exception:
+            self._target_shadow = None
+            raise
+        self._target_shadow = shadow
+
+    def set_target_delta(self, enabled: bool = True, full_refresh_ms: int = 100):
+        """Only send the TargetPosition frames whose quantized values changed
+        since the last write, and all of them every full_refresh_ms — keep
+        that well under the TargetDeadmanMs period, or a held pose lets the
+        deadman fire. Any failed or unacknowledged write forces the next
+        call to send every frame."""
+        if full_refresh_ms <= 0:
+            raise ValueError('full_refresh_ms must be positive')
+        self._target_delta = enabled
+        self._target_refresh_s = full_refresh_ms / 1000
+        self._target_shadow = None
+
+    def _target_frames(self, wire):
+        """TargetPosition payloads to send for wire, and the shadow to keep
+        once they are acknowledged (None when delta writes are off)."""
+        if not self._target_delta:
+            return codec.encode_values(wire, chunk_size=self.chunk_size), None
+        values = codec.quantize(wire)
+        bodies = codec.encode_values(values, chunk_size=self.chunk_size)
+        now = time.monotonic()
+        shadow = self._target_shadow
+        if shadow is None or len(shadow) != len(values) or now - self._target_full_at >= self._target_refresh_s:
+            self._target_full_at = now
+            return bodies, values
+        changed = codec.changed_chunks(values, shadow, chunk_size=self.chunk_size)
+        return [body for body, send in zip(bodies, changed) if send], values
+
+    def check_acks(self, wait: bool = False) -> AckStats:
+        """Settle acks for unacknowledged writes that have arrived (or, with
+        wait=True, until every outstanding one has arrived or timed out)
+        and raise a deferred write error if one came back. Returns
+        ack_stats."""
+        self._settle_acks()
+        while wait and self._unacked:
+            resp_arb_id, deadline, waiter = self._unacked[0]
+            remaining = deadline - time.monotonic()
+            if waiter is not None:
+                concurrent.futures.wait([waiter], max(0.0, remaining))
+            elif remaining > 0:
+                msg = self.bus.recv(remaining)
+                if msg is not None:
+                    self._route_unsolicited(msg)
+            self._settle_acks()
+        self._raise_ack_error()
+        return self.ack_stats
 
     def set_single_joint_position(self, joint_id: int, value: float):
-        int_value = int(max(-32767, min(32767, value * 10000)))
+        int_value = int(max(-codec.WIRE_MAX, min(codec.WIRE_MAX, value * codec.HIRES_SCALE)))
+        self._target_shadow = None
         self._write_joint_params(ParamType.TargetPosition, np.array([int_value]), joint_offset=joint_id-1)
 
     def get_torque_limit(self) -> float:
@@ -261,6 +621,231 @@ class CANProtocol:
         first_byte = ((message_type.value & 0b1110) >> 1) | (self.priority << 3)
         return source_can_id | (target_can_id << 8) | (second_byte << 16) | (first_byte << 24)
 
+    def _build_arb_ids(self):
+        """(request, response) arbitration IDs per (request MessageType,
+        ParamType), plus reusable can.Message templates per request ID.
+
+        This saves computing two IDs and constructing a can.Message per
+        frame; the payload itself is still encoded per call (tetra.codec).
+        Templates are kept per payload length — interfaces size the frame
+        from len(msg.data), so one buffer can't serve every length without
+        being resized. python-can interfaces copy the frame out during
+        send(), so reuse is safe as long as sends on this protocol aren't
+        issued from several threads at once (the reactor serializes them).
+        Call again if hand_can_id, host_can_id or priority are changed by
+        hand."""
+        self._arb_ids = {}
+        self._tx_msgs = {}
+        self._burst_locks = {}   # resp arb ID -> lock (see _transfer_chunks)
+        for message_type, resp_type in response_types.items():
+            for param_type in ParamType:
+                arb_id = self._param_arb_id(message_type, param_type, self.hand_can_id, self.host_can_id)
+                resp_arb_id = self._param_arb_id(resp_type, param_type, self.host_can_id, self.hand_can_id)
+                self._arb_ids[message_type, param_type] = (arb_id, resp_arb_id)
+                self._tx_msgs[arb_id] = [None] * 65   # by frame length, filled on first use
+                self._burst_locks.setdefault(resp_arb_id, threading.Lock())
+
+    def _send(self, arb_id, body):
+        templates = self._tx_msgs.get(arb_id)
+        if templates is None:
+            templates = self._tx_msgs[arb_id] = [None] * 65
+        n = len(body)
+        # FD frames only come in some lengths; pad with zeros (the firmware
+        # reads as many values as the mask names).
+        size = codec.fd_frame_len(n) if self._fd else n
+        msg = templates[size]
+        if msg is None:
+            msg = templates[size] = can.Message(arbitration_id=arb_id, data=bytearray(size), is_extended_id=True,
+                                                is_fd=bool(self._fd), bitrate_switch=bool(self._fd))
+        msg.data[:n] = body   # same length: overwritten in place, never resized
+        if size != n:
+            msg.data[n:] = bytes(size - n)
+        self.bus.send(msg)
+        self.metrics.tx += 1
+
+    def _request(self, arb_id, body, resp_arb_id):
+        """Send one request frame; returns a waiter for _await. Without a
+        reactor the waiter is just the response ID _recv scans for."""
+        if self.reactor is not None and not self.reactor.running:
+            # Our reactor was stopped: read the bus directly again rather
+            # than queueing waiters nobody will ever complete.
+            self.reactor = None
+        if self.reactor is None:
+            self._send(arb_id, body)
+            return resp_arb_id
+        return self.reactor.request(lambda: self._send(arb_id, body), resp_arb_id)
+
+    @property
+    def can_timeout(self) -> float:
+        """Longest wait for a response: the ceiling of the adaptive
+        timeouts (rtt), and the wait for a transaction type not measured
+        yet."""
+        return self.rtt.ceiling
+
+    @can_timeout.setter
+    def can_timeout(self, seconds: float):
+        self.rtt.ceiling = seconds
+
+    def _await(self, waiter, outstanding: int = 1):
+        if self.reactor is None:
+            return self._recv(waiter)
+        try:
+            data = self.reactor.wait(waiter, self.rtt.timeout(waiter.arb_id, outstanding))
+        except TimeoutError:
+            self.metrics.timeouts += 1
+            self.rtt.missed(waiter.arb_id)
+            raise
+        self.metrics.rx += 1
+        self.rtt.answered()
+        return data
+
+    @property
+    def chunk_size(self) -> int:
+        """Joints per joint frame on this connection: 12 on CAN FD, else 3."""
+        return codec.FD_CHUNK_SIZE if self._fd else codec.CLASSIC_CHUNK_SIZE
+
+    def _ensure_transport(self):
+        """Settle classic vs CAN FD frames before the first joint transfer.
+        On a bus in CAN FD mode the hand is asked for every joint in one FD
+        frame; firmware that answers with all of them speaks the FD layout,
+        anything else (a classic 3-joint answer, or none within
+        can_timeout) means classic frames."""
+        if self._fd is not None:
+            return
+        self._set_fd(True)   # the probe itself must go out as an FD frame
+        try:
+            self._set_fd(self._fd_probe_ok(self._await(self._request(*self._fd_probe_request()))))
+        except TimeoutError:
+            self._set_fd(False)
+        except BaseException:
+            self._set_fd(None)
+            raise
+        self._save_capabilities()
+
+    def _fd_probe_request(self):
+        arb_id, resp_arb_id = self._arb_ids[MessageType.ReadJointParam, ParamType.EncoderValue]
+        return arb_id, codec.encode_masks(self.num_joints, 0, codec.FD_CHUNK_SIZE)[0], resp_arb_id
+
+    def _fd_probe_ok(self, data) -> bool:
+        count = min(self.num_joints, codec.FD_CHUNK_SIZE)
+        return len(data) >= 2 + 2 * count and data[0] == 0 and data[1] == 0
+
+    def _set_fd(self, fd):
+        self._fd = fd
+        self._tx_msgs = {}   # templates carry is_fd
+
+    def _window_drop(self, sent: int, received: int):
+        """A window of sent requests lost its responses after the first
+        received: shrink to what got through (see _transfer_chunks)."""
+        self._window = max(1, min(received, sent - 1, self._window))
+        self._window_streak = 0
+        self._window_probe_after = min(2 * self._window_probe_after, WINDOW_PROBE_AFTER_MAX)
+        self.metrics.downgrades += 1
+        self.metrics.window = self._window
+        self._save_capabilities()
+
+    def _window_ok(self, sent: int):
+        """A window of sent requests was answered in full."""
+        if sent < self._window or self._window >= PIPELINE_MAX_WINDOW:
+            return
+        self._window_streak += 1
+        if self._window_streak >= self._window_probe_after:
+            self._window += 1
+            self._window_streak = 0
+            self.metrics.window = self._window
+            self._save_capabilities()
+
+    def _record_rtt(self, resp_arb_id, start, outstanding: int = 1, sample: bool = True):
+        """Account a transaction of outstanding requests sent at start and
+        now fully answered; sample=False keeps it out of the timeout
+        estimate (Karn's rule: retried transactions are ambiguous)."""
+        elapsed = time.monotonic() - start
+        self.metrics.record_rtt((resp_arb_id >> 16) & 0x7F, elapsed)
+        if sample:
+            self.rtt.sample(resp_arb_id, elapsed, outstanding)
+
+    def _abandon(self, waiters):
+        """Withdraw waiters that will never be awaited (after a failed
+        burst) so they can't consume responses meant for later requests."""
+        if self.reactor is not None:
+            for waiter in waiters:
+                self.reactor.cancel(waiter)
+
+    def _send_unacked(self, arb_id, resp_arb_id, bodies):
+        deadline = time.monotonic() + self.rtt.timeout(resp_arb_id, len(bodies) + len(self._unacked))
+        for body in bodies:
+            waiter = self._request(arb_id, body, resp_arb_id)
+            if waiter == resp_arb_id:
+                waiter = None    # no reactor: _recv/_settle_acks match it
+            self._unacked.append((resp_arb_id, deadline, waiter))
+            self.ack_stats.sent += 1
+
+    def _account_ack(self, data):
+        self.metrics.rx += 1
+        self.rtt.answered()
+        if len(data) < 2 or data[0] != 0 or data[1] != 0:
+            self._target_shadow = None
+        if len(data) < 2:
+            self.ack_stats.errors += 1
+            self._ack_error = self._ack_error or Exception(f'Short write response ({len(data)} bytes)')
+        elif data[0] != 0 or data[1] != 0:
+            self.ack_stats.errors += 1
+            self._ack_error = self._ack_error or Exception('Error writing joint params')
+        else:
+            self.ack_stats.acked += 1
+
+    def _take_ack(self, msg) -> bool:
+        """If msg is the ack the oldest unacknowledged write is owed, account
+        it and return True. Acks arrive in send order, like every response."""
+        if self._unacked and self._unacked[0][2] is None and msg.arbitration_id == self._unacked[0][0]:
+            self._unacked.popleft()
+            self._account_ack(msg.data)
+            return True
+        return False
+
+    def _route_unsolicited(self, msg):
+        if not self._take_ack(msg):
+            self._maybe_ingest_stream(msg)
+
+    def _settle_acks(self):
+        """Account every ack that has already arrived and expire the ones
+        overdue, without blocking."""
+        if not self._unacked:
+            return
+        if self._unacked[0][2] is None and self.reactor is None:
+            for _ in range(256):
+                if not self._unacked:
+                    break
+                msg = self.bus.recv(0)
+                if msg is None:
+                    break
+                self._route_unsolicited(msg)
+        now = time.monotonic()
+        while self._unacked:
+            resp_arb_id, deadline, waiter = self._unacked[0]
+            if waiter is not None and waiter.done():
+                self._unacked.popleft()
+                if waiter.cancelled() or waiter.exception() is not None:
+                    self._target_shadow = None
+                    self.ack_stats.missed += 1
+                else:
+                    self._account_ack(waiter.result())
+            elif now >= deadline:
+                self.metrics.timeouts += 1
+                self.rtt.missed(resp_arb_id)
+                self._unacked.popleft()
+                if waiter is not None:
+                    self._abandon([waiter])
+                self._target_shadow = None
+                self.ack_stats.missed += 1
+            else:
+                break
+
+    def _raise_ack_error(self):
+        error, self._ack_error = self._ack_error, None
+        if error is not None:
+            raise error
+
     def _bytes_to_int(self, lsb, msb):
         # 2 byte numbers are transmitted in 2's complement, 1 byte values are always positive
         combined = (msb << 8) | lsb
@@ -269,10 +854,10 @@ class CANProtocol:
         return combined
 
     def _read_param(self, param_type: ParamType) -> int:
-        arb_id = self._param_arb_id(MessageType.ReadParam, param_type, self.hand_can_id, self.host_can_id)
-        self.bus.send(can.Message(arbitration_id=arb_id, data=[]))
-        resp_arb_id = self._param_arb_id(MessageType.ParamResp, param_type, self.host_can_id, self.hand_can_id)
-        data = self._recv(resp_arb_id)
+        arb_id, resp_arb_id = self._arb_ids[MessageType.ReadParam, param_type]
+        start = time.monotonic()
+        data = self._await(self._request(arb_id, b'', resp_arb_id))
+        self._record_rtt(resp_arb_id, start)
         if len(data) < 3:
             raise Exception(f'Short param response ({len(data)} bytes)')
         status = data[0]
@@ -283,14 +868,70 @@ class CANProtocol:
 
         return self._bytes_to_int(raw_value[0], raw_value[1])
 
+    def read_params(self, param_types) -> dict:
+        """Read several hand-level params in one pipelined burst; returns
+        {param_type: value}. Each param answers on its own arbitration ID,
+        so responses are matched by ID rather than by position. Every
+        response is collected before any error is raised."""
+        param_types = list(param_types)
+        resps = self._exchange_pipelined(self._read_params_requests(param_types))
+        return self._parse_read_params(param_types, resps)
+
+    def _read_params_requests(self, param_types):
+        requests = []
+        for param_type in param_types:
+            arb_id, resp_arb_id = self._arb_ids[MessageType.ReadParam, param_type]
+            requests.append((arb_id, b'', resp_arb_id))
+        return requests
+
+    def _parse_read_params(self, param_types, resps):
+        error = None
+        values = {}
+        for param_type, data in zip(param_types, resps):
+            if len(data) < 3:
+                error = error or Exception(f'Short param response ({len(data)} bytes)')
+            elif data[0] != 0:
+                error = error or Exception(f'Error reading param {param_type.name}')
+            else:
+                values[param_type] = self._bytes_to_int(data[1], data[2])
+        if error is not None:
+            raise error
+        return values
+
+    def write_params(self, values: dict):
+        """Write several hand-level params in one pipelined burst (see
+        read_params). CANID can't be part of a burst — the responses after
+        it would come from another ID; use update_can_id."""
+        resps = self._exchange_pipelined(self._write_params_requests(values))
+        self._check_write_params(values, resps)
+
+    def _write_params_requests(self, values: dict):
+        requests = []
+        for param_type, value in values.items():
+            if param_type == ParamType.CANID:
+                raise ValueError('CANID must be written on its own (update_can_id)')
+            self._value_to_bytes(param_type, value)   # range check
+            arb_id, resp_arb_id = self._arb_ids[MessageType.WriteParam, param_type]
+            requests.append((arb_id, (value & 0xFF, (value >> 8) & 0xFF), resp_arb_id))
+        return requests
+
+    def _check_write_params(self, values: dict, resps):
+        error = None
+        for param_type, data in zip(values, resps):
+            if len(data) < 1:
+                error = error or Exception('Short param-write response (0 bytes)')
+            elif data[0] != 0:
+                error = error or Exception(f'Error writing param {param_type.name}: {data[0]}')
+        if error is not None:
+            raise error
+
     def _write_param(self, param_type: ParamType, value: int, resp_hand_can_id: int = None):
-        arb_id = self._param_arb_id(MessageType.WriteParam, param_type, self.hand_can_id, self.host_can_id)
-        data = [value & 0xFF, value >> 8]
-        self.bus.send(can.Message(arbitration_id=arb_id, data=data))
-        if resp_hand_can_id is None:
-            resp_hand_can_id = self.hand_can_id
-        resp_arb_id = self._param_arb_id(MessageType.ParamResp, param_type, self.host_can_id, resp_hand_can_id)
-        data = self._recv(resp_arb_id)
+        arb_id, resp_arb_id = self._arb_ids[MessageType.WriteParam, param_type]
+        if resp_hand_can_id is not None:
+            resp_arb_id = self._param_arb_id(MessageType.ParamResp, param_type, self.host_can_id, resp_hand_can_id)
+        start = time.monotonic()
+        data = self._await(self._request(arb_id, (value & 0xFF, value >> 8), resp_arb_id))
+        self._record_rtt(resp_arb_id, start)
         if len(data) < 1:
             raise Exception('Short param-write response (0 bytes)')
         status = data[0]
@@ -306,105 +947,140 @@ class CANProtocol:
         the k-th request even though all responses share one arbitration
         ID. Roughly halves the wall time of a multi-chunk transfer.
 
-        Firmware older than 974ab74 transmits responses fire-and-forget
-        into its 3-deep TX FIFO and silently drops the tail of a burst, so
-        the first pipelined timeout permanently downgrades this connection
-        to serial round-trips and retries. The retry is safe: every joint
-        read/write in this protocol is an idempotent value-set, so chunks
-        the firmware already processed are simply re-applied.
+        At most _window requests are outstanding at once. Firmware older
+        than 974ab74 transmits responses fire-and-forget into its 3-deep TX
+        FIFO and silently drops the tail of a burst: a window that loses
+        responses shrinks to the number that got through and the transfer
+        is retried. The retry is safe: every joint read/write in this
+        protocol is an idempotent value-set, so chunks the firmware already
+        processed are simply re-applied. After WINDOW_PROBE_AFTER full
+        windows in a row the window grows by one again; each failed probe
+        doubles that wait, so old firmware settles at 3 and is reprobed
+        ever more rarely, while a one-off loss on new firmware heals.
+
+        With a reactor, concurrent bursts on the SAME response ID are
+        serialized: a response dropped from the middle of two interleaved
+        bursts (old firmware) would shift the other caller's response into
+        our waiter and silently return another request's joints. Bursts on
+        different IDs still overlap freely — a drop there only times out.
         """
-        if self._pipeline and len(bodies) > 1:
+        return self._exchange_pipelined([(arb_id, body, resp_arb_id) for body in bodies])
+
+    def _exchange_pipelined(self, requests):
+        """Send (arb_id, body, resp_arb_id) requests and return the response
+        payloads in request order, at most _window at a time (see
+        _transfer_chunks). With a reactor, bursts sharing a response ID are
+        serialized."""
+        if self.reactor is None:
+            return self._exchange_unlocked(requests)
+        locks = [self._burst_locks[resp_arb_id] for resp_arb_id in sorted({r for _, _, r in requests})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            return self._exchange_unlocked(requests)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _exchange_unlocked(self, requests):
+        first = True
+        while True:
+            window = self._window
             try:
-                for body in bodies:
-                    self.bus.send(can.Message(arbitration_id=arb_id, data=body))
-                return [self._recv(resp_arb_id) for _ in bodies]
+                return self._exchange(requests, window, sample=first)
             except TimeoutError:
-                self._pipeline = False
+                if self._window >= window:
+                    raise    # a lone request timed out: no window to shrink
+            first = False
+
+    def _exchange(self, requests, window: int, sample: bool = True):
+        """Send requests window at a time, collecting each window's
+        responses before sending the next; TimeoutError if any is lost (a
+        window of several that loses responses is shrunk first). Each window
+        is one round trip in metrics.rtt for each of its params, and a
+        timeout sample unless sample=False."""
         resps = []
-        for body in bodies:
-            self.bus.send(can.Message(arbitration_id=arb_id, data=body))
-            resps.append(self._recv(resp_arb_id))
+        for start in range(0, len(requests), window):
+            batch = requests[start:start + window]
+            sent_at = time.monotonic()
+            waiters = [self._request(arb_id, body, resp_arb_id) for arb_id, body, resp_arb_id in batch]
+            got = [None] * len(batch)
+            try:
+                if self.reactor is None:
+                    self._collect(waiters, out=got)
+                else:
+                    for i, waiter in enumerate(waiters):
+                        got[i] = self._await(waiter, len(waiters) - i)
+            except TimeoutError:
+                received = sum(resp is not None for resp in got)
+                self._abandon(waiters[received + 1:])
+                # A dropped tail shows how deep the window can go; no answer
+                # at all (param unsupported, hand gone) says nothing.
+                if len(batch) > 1 and received:
+                    self._window_drop(len(batch), received)
+                raise
+            self._window_ok(len(batch))
+            resps += got
+            for resp_arb_id in {r for _, _, r in batch}:
+                self._record_rtt(resp_arb_id, sent_at, len(batch), sample)
         return resps
 
-    def _read_joint_params(self, param_type: ParamType, num_values: int = -1, joint_offset: int = 0) -> np.ndarray:
-        arb_id = self._param_arb_id(MessageType.ReadJointParam, param_type, self.hand_can_id, self.host_can_id)
-        resp_arb_id = self._param_arb_id(MessageType.JointParamResp, param_type, self.host_can_id, self.hand_can_id)
+    def _read_joint_params(self, param_type: ParamType, num_values: int = -1, joint_offset: int = 0,
+                           out=None) -> np.ndarray:
+        arb_id, resp_arb_id = self._arb_ids[MessageType.ReadJointParam, param_type]
 
         if num_values == -1:
             num_values = self.num_joints
-        result = np.zeros(num_values)
-
-        chunk_size = 3  # classic CAN: 2-byte mask + 3×int16 = 8-byte frame
-        num_chunks = math.ceil(num_values / chunk_size)
-        bodies = []
-        chunk_counts = []
-        for i in range(num_chunks):
-            idx = i * chunk_size + joint_offset
-            last_idx = min(joint_offset + num_values, idx + chunk_size)
-            joint_mask = 0
-            for j in range(idx, last_idx):
-                joint_mask |= 1 << j
-            chunk_counts.append(last_idx - idx)
-            bodies.append([joint_mask & 0xFF, joint_mask >> 8])
+        self._ensure_transport()
+        bodies = codec.encode_masks(num_values, joint_offset, self.chunk_size)
 
         # Validate AFTER collecting every response, so a failed chunk can't
         # leave orphan responses in the socket buffer to be mis-matched by
         # the next operation on the same param.
+        resps = self._transfer_chunks(arb_id, resp_arb_id, bodies)
+        return codec.decode_values(resps, num_values, joint_offset, self.chunk_size,
+                                   out=np.empty(num_values) if out is None else out)
+
+    def read_joint_param_set(self, param_types, num_values: int = -1, joint_offset: int = 0) -> np.ndarray:
+        """Read several per-joint params in ONE interleaved burst (every
+        chunk of every param) instead of one pipeline per param. Returns a
+        structured int16 array of num_values joints with one field per
+        param name, e.g. res['TorqueLimit'][3]. As with _read_joint_params,
+        every response of the burst is collected before any error is
+        raised."""
+        param_types = list(param_types)
+        if num_values == -1:
+            num_values = self.num_joints
+        self._ensure_transport()
+        resps = self._exchange_pipelined(self._joint_param_set_requests(param_types, num_values, joint_offset))
+        return self._decode_joint_param_set(param_types, resps, num_values, joint_offset)
+
+    def _joint_param_set_requests(self, param_types, num_values, joint_offset):
+        ids = [self._arb_ids[MessageType.ReadJointParam, param_type] for param_type in param_types]
+        return [(arb_id, body, resp_arb_id)
+                for body in codec.encode_masks(num_values, joint_offset, self.chunk_size)
+                for arb_id, resp_arb_id in ids]
+
+    def _decode_joint_param_set(self, param_types, resps, num_values, joint_offset):
+        out = np.zeros(num_values, dtype=[(param_type.name, '<i2') for param_type in param_types])
         error = None
-        for i, resp in enumerate(self._transfer_chunks(arb_id, resp_arb_id, bodies)):
-            if len(resp) < 2 + 2 * chunk_counts[i]:
-                # Truncated frame (CAN error / misbehaving node): a raw
-                # IndexError here would mask the real problem.
-                error = error or Exception(
-                    f'Short joint response ({len(resp)} bytes for {chunk_counts[i]} joints)')
-                continue
-            if resp[0] != 0 or resp[1] != 0:
-                error = error or Exception('error reading joint params')
-                continue
-            for j in range(chunk_counts[i]):
-                result[i * chunk_size + j] = self._bytes_to_int(resp[2 + 2 * j], resp[3 + 2 * j])
+        for i, param_type in enumerate(param_types):
+            try:
+                # Chunk-major burst: this param's responses are every len-th.
+                codec.decode_values(resps[i::len(param_types)], num_values, joint_offset, self.chunk_size,
+                                    out=out[param_type.name])
+            except Exception as e:
+                error = error or e
         if error is not None:
             raise error
-        return result
+        return out
 
     def _write_joint_params(self, param_type: ParamType, values: np.ndarray, joint_offset: int = 0):
-        arb_id = self._param_arb_id(MessageType.WriteJointParam, param_type, self.hand_can_id, self.host_can_id)
-        resp_arb_id = self._param_arb_id(MessageType.JointParamResp, param_type, self.host_can_id, self.hand_can_id)
-
-        chunk_size = 3  # classic CAN: 2-byte mask + 3×int16 = 8-byte frame
-        num_chunks = math.ceil(len(values) / chunk_size)
-        bodies = []
-        for i in range(num_chunks):
-            idx = i * chunk_size
-            message_values = values[idx:idx+chunk_size]
-
-            joint_mask = 0
-            for j in range(len(message_values)):
-                joint_mask = (joint_mask << 1) | 1
-            joint_mask <<= (idx + joint_offset)
-
-            data = []
-            def add_int16(v):
-                if v < 0:
-                    v += 1 << 16
-                data.append(v & 0xFF)
-                data.append((v >> 8) & 0xFF)
-
-            add_int16(joint_mask)
-            for v in message_values:
-                add_int16(int(v))
-            bodies.append(data)
-
+        arb_id, resp_arb_id = self._arb_ids[MessageType.WriteJointParam, param_type]
+        self._ensure_transport()
+        bodies = codec.encode_values(values, joint_offset, self.chunk_size)
         # Validate AFTER collecting every response (see _read_joint_params).
-        error = None
-        for resp_data in self._transfer_chunks(arb_id, resp_arb_id, bodies):
-            if len(resp_data) < 2:
-                error = error or Exception(f'Short write response ({len(resp_data)} bytes)')
-                continue
-            if resp_data[0] != 0 or resp_data[1] != 0:
-                error = error or Exception('Error writing joint params')
-        if error is not None:
-            raise error
+        codec.check_write_acks(self._transfer_chunks(arb_id, resp_arb_id, bodies))
 
     def _value_to_bytes(self, param_type: ParamType, value: int):
         single_byte = param_type in single_byte_params
@@ -420,6 +1096,54 @@ class CANProtocol:
                 raise ValueError('2 byte value out of range')
             return list(value.to_bytes(2, byteorder='little', signed=True))
 
+    def _collect(self, resp_arb_ids, out=None):
+        """Responses for requests already sent, one per entry of
+        resp_arb_ids, in request order. Responses on one ID arrive in send
+        order; across IDs they are matched by ID, so frames of the burst
+        are never skipped as foreign. Same budgets as _recv, with the
+        deadline restarted by every response. Responses are stored into out
+        (a list of len(resp_arb_ids)) as they arrive, so after a
+        TimeoutError it shows which ones did."""
+        resps = out if out is not None else [None] * len(resp_arb_ids)
+        if len(resp_arb_ids) == 1:
+            resps[0] = self._recv(resp_arb_ids[0])
+            return resps
+        slots = {}
+        for i, resp_arb_id in enumerate(resp_arb_ids):
+            slots.setdefault(resp_arb_id, collections.deque()).append(i)
+        missing = len(resps)
+        # The wait scales with the responses still outstanding.
+        deadline = time.monotonic() + max(self.rtt.timeout(r, missing) for r in slots)
+        skipped = 0
+        while missing:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            resp = self.bus.recv(remaining)
+            if resp is None:
+                break
+            if self._take_ack(resp):
+                continue
+            queue = slots.get(resp.arbitration_id)
+            if queue:
+                resps[queue.popleft()] = resp.data
+                missing -= 1
+                self.metrics.rx += 1
+                self.rtt.answered()
+                deadline = time.monotonic() + max(self.rtt.timeout(r, missing) for r in slots)
+                continue
+            if self._maybe_ingest_stream(resp):
+                continue
+            skipped += 1
+            self.metrics.skipped += 1
+            if skipped >= 64:
+                break
+        if missing:
+            self.metrics.timeouts += missing
+            self.rtt.missed(next(r for r, queue in slots.items() if queue))
+            raise TimeoutError('No CAN response received')
+        return resps
+
     def _recv(self, expected_arb_id):
         # Wall-clock deadline + a budget of NON-stream frames. Stream
         # telemetry must NOT consume budget: at a 10 ms stream period, any
@@ -429,7 +1153,7 @@ class CANProtocol:
         # exhausted itself on that backlog and raised TimeoutError with the
         # response still sitting in the kernel queue. Stream frames are
         # ingested into the cache (not lost) and skipped for free.
-        deadline = time.monotonic() + self.can_timeout
+        deadline = time.monotonic() + self.rtt.timeout(expected_arb_id)
         skipped = 0
         while True:
             remaining = deadline - time.monotonic()
@@ -438,14 +1162,23 @@ class CANProtocol:
             resp = self.bus.recv(remaining)
             if resp is None:
                 break
+            # Acks owed to earlier unacknowledged writes come first — they
+            # may share our arbitration ID and must not be taken as ours.
+            if self._take_ack(resp):
+                continue
             if resp.arbitration_id == expected_arb_id:
+                self.metrics.rx += 1
+                self.rtt.answered()
                 return resp.data
             if self._maybe_ingest_stream(resp):
                 continue
             # Anything else: stale response / another node's traffic — skip,
             # but bound how much foreign traffic we'll chew through.
             skipped += 1
+            self.metrics.skipped += 1
             if skipped >= 64:
                 break
 
+        self.metrics.timeouts += 1
+        self.rtt.missed(expected_arb_id)
         raise TimeoutError('No CAN response received')
@@ -0,0 +1,80 @@
+"""On-disk cache of what each hand's firmware supports.
+
+Some capabilities are only learned by probing: firmware without
+PresentPositionHiRes or StreamPeriodMs simply doesn't answer (one
+can_timeout each), and firmware with a shallow TX FIFO only shows it by
+dropping responses (see CANProtocol._transfer_chunks). A CapabilityCache
+remembers what was learned per hand CAN ID and firmware Version, so the
+next process start skips straight to the answer:
+
+    hand = tetra.Hand(bus, can_id=50, capability_cache=True)
+
+The cache is a small JSON file under $XDG_CACHE_HOME/tetra (~/.cache/tetra
+by default). An entry whose Version doesn't match the hand's is ignored and
+replaced, so a firmware update invalidates it. Entries only hold what is
+known; a capability never probed is simply absent.
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+
+# Capability names stored per hand (see CANProtocol._capabilities).
+CAPABILITIES = ('hires', 'window', 'streaming', 'fd')
+
+_FORMAT = 1
+
+
+def default_cache_path() -> Path:
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return Path(base) / 'tetra' / 'capabilities.json'
+
+
+class CapabilityCache:
+    def __init__(self, path: str | os.PathLike | None = None):
+        self.path = Path(path) if path is not None else default_cache_path()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('format') != _FORMAT or not isinstance(data.get('hands'), dict):
+            return {}
+        return data['hands']
+
+    def get(self, can_id: int, version: int) -> dict:
+        """Known capabilities of the hand at can_id running firmware
+        version ({} if none are)."""
+        entry = self._load().get(str(can_id))
+        if not isinstance(entry, dict) or entry.get('version') != version:
+            return {}
+        return {name: entry[name] for name in CAPABILITIES if name in entry}
+
+    def put(self, can_id: int, version: int, capabilities: dict):
+        """Record capabilities for can_id at version, replacing an entry
+        for another version. Unreadable or unwritable cache files are
+        ignored — the cache only ever saves probing time."""
+        hands = self._load()
+        entry = {'version': version}
+        entry.update((name, value) for name, value in capabilities.items()
+                     if name in CAPABILITIES and value is not None)
+        if hands.get(str(can_id)) == entry:
+            return
+        hands[str(can_id)] = entry
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Write-then-rename: concurrent readers never see a partial file.
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix='.capabilities-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'format': _FORMAT, 'hands': hands}, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def clear(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
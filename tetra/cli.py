@@ -2,8 +2,10 @@ import argparse
 
 import can
 
-from .hand import Hand
+from .discovery import discover_hands
+from .hand import DeviceNotFoundError, Hand
 from .manus import setup_manus, calibrate_gloves
+from .shared_bus import SharedBus
 from .ui import serve
 
 
@@ -24,9 +26,12 @@ def main():
 def run(args):
     if args.command == 'ui':
         with can.Bus() as bus:
-            left_hand = Hand(bus, can_id=50)
-            right_hand = Hand(bus, can_id=51)
-            serve(args.port, [left_hand, right_hand]) # TODO: make hands dynamics
+            shared = SharedBus(bus)
+            # Left hands first, then by CAN ID.
+            found = sorted(discover_hands(shared), key=lambda hand: (hand.side != 'left', hand.can_id))
+            if not found:
+                raise DeviceNotFoundError('No hand found on the CAN bus')
+            serve(args.port, [Hand(shared, can_id=hand.can_id) for hand in found])
     elif args.command == 'manus':
         if args.mode == "setup":
             setup_manus()
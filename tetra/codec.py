@@ -0,0 +1,200 @@
+"""Vectorized encode/decode of joint-parameter CAN frames.
+
+Every joint frame (ReadJointParam / WriteJointParam requests, JointParamResp
+responses and StreamPositions broadcasts) carries a little-endian 16-bit
+word followed by up to chunk_size little-endian int16 values:
+
+    requests:   joint mask | value × popcount(mask)   (reads: mask only)
+    responses:  statusMask | value × joints in the request's mask
+    stream:     joint mask | value × popcount(mask)
+
+A transfer of N values is split into ceil(N / chunk_size) frames; the last
+one is short when N isn't a multiple of chunk_size. The helpers here build
+or parse all frames of a transfer at once with NumPy instead of per-joint
+bit-twiddling, and cache the (constant) mask layout per transfer shape.
+chunk_size is a property of the transport: 3 on classic CAN, 12 on CAN FD,
+where frames are zero-padded to a valid FD length (decoding ignores the
+padding).
+"""
+from functools import lru_cache
+
+import numpy as np
+
+# Classic CAN: 2-byte mask + 3×int16 = 8-byte frame.
+CLASSIC_CHUNK_SIZE = 3
+# CAN FD: one frame carries a whole 12-joint hand (2 + 24 = 26 bytes,
+# padded to the 32-byte FD frame size).
+FD_CHUNK_SIZE = 12
+
+# Payload sizes a CAN FD frame can have (DLC 0-15).
+FD_FRAME_LENS = (0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64)
+
+# Position wire scales. TargetPosition and PresentPositionHiRes are in
+# 100 µrad units (×10000); the legacy PresentPosition is mrad (×1000).
+# int16 caps either at ±32767 wire units, so encoded values are clipped.
+HIRES_SCALE = 10000
+LEGACY_SCALE = 1000
+WIRE_MAX = 32767
+
+_WORD = np.dtype('<u2')
+_INT16 = np.dtype('<i2')
+
+
+class _Layout:
+    """Frame geometry of one transfer shape. The frames of a transfer are
+    laid end to end as 16-bit words — [mask, v, v, v, mask, v, ...] with the
+    short last frame trimmed — which is both how requests are encoded and
+    how well-formed responses concatenate."""
+
+    def __init__(self, num_values: int, joint_offset: int, chunk_size: int):
+        num_chunks = -(-num_values // chunk_size)
+        starts = np.arange(num_chunks) * chunk_size
+        self.counts = np.minimum(chunk_size, num_values - starts)
+        self.masks = (((1 << self.counts) - 1) << (starts + joint_offset)).astype(_WORD)
+        words = 1 + self.counts
+        word_starts = np.concatenate(([0], np.cumsum(words)[:-1]))
+        # Word index of every frame's leading mask/status and of every value.
+        self.head_idx = word_starts
+        self.value_idx = np.concatenate([s + 1 + np.arange(c) for s, c in zip(word_starts, self.counts)])
+        self.template = np.zeros(int(words.sum()), dtype=_WORD)
+        self.template[self.head_idx] = self.masks
+        self.byte_bounds = [(2 * int(s), 2 * int(s + w)) for s, w in zip(word_starts, words)]
+        self.frame_lens = [e - s for s, e in self.byte_bounds]
+        self.value_starts = starts
+        for arr in (self.counts, self.masks, self.head_idx, self.value_idx, self.template, starts):
+            arr.flags.writeable = False
+
+
+@lru_cache(maxsize=64)
+def _layout(num_values: int, joint_offset: int, chunk_size: int) -> _Layout:
+    return _Layout(num_values, joint_offset, chunk_size)
+
+
+def chunk_layout(num_values: int, joint_offset: int = 0, chunk_size: int = CLASSIC_CHUNK_SIZE):
+    """Joint masks and value counts of each frame of a transfer, as two
+    read-only arrays (masks: uint16, counts: int)."""
+    layout = _layout(num_values, joint_offset, chunk_size)
+    return layout.masks, layout.counts
+
+
+@lru_cache(maxsize=64)
+def encode_masks(num_values: int, joint_offset: int = 0, chunk_size: int = CLASSIC_CHUNK_SIZE):
+    """Request payloads of a joint read: one 2-byte mask per frame. The
+    result only depends on the transfer shape, so it is cached."""
+    masks, _ = chunk_layout(num_values, joint_offset, chunk_size)
+    return tuple(bytes(m) for m in masks.reshape(-1, 1).view(np.uint8))
+
+
+def quantize(values) -> np.ndarray:
+    """The int16 wire values encode_values puts on the bus."""
+    raw = np.asarray(values)
+    if raw.dtype.kind == 'f':
+        if not np.isfinite(raw).all():
+            # int(v) used to raise here; a NaN cast would silently become 0.
+            raise ValueError('cannot encode non-finite joint values')
+        raw = raw.astype(np.int64)
+    return raw.astype(_INT16, casting='unsafe')
+
+
+def fd_frame_len(n: int) -> int:
+    """Smallest CAN FD payload size holding n bytes."""
+    for size in FD_FRAME_LENS:
+        if size >= n:
+            return size
+    raise ValueError(f'{n} bytes do not fit in a CAN FD frame')
+
+
+def encode_values(values, joint_offset: int = 0, chunk_size: int = CLASSIC_CHUNK_SIZE):
+    """Request payloads of a joint write. Float values are truncated toward
+    zero and wrapped to 16 bits, exactly like int(v) & 0xFFFF."""
+    raw = quantize(values)
+    layout = _layout(len(raw), joint_offset, chunk_size)
+    words = layout.template.copy()
+    words[layout.value_idx] = raw.view(_WORD)
+    buf = words.tobytes()
+    return [buf[s:e] for s, e in layout.byte_bounds]
+
+
+def changed_chunks(values, previous, joint_offset: int = 0, chunk_size: int = CLASSIC_CHUNK_SIZE) -> np.ndarray:
+    """Per-frame flags: does any quantized value in the frame differ from
+    previous (both int16 arrays of the same length)?"""
+    layout = _layout(len(values), joint_offset, chunk_size)
+    return np.logical_or.reduceat(values != previous, layout.value_starts)
+
+
+def decode_values(resps, num_values: int, joint_offset: int = 0, chunk_size: int = CLASSIC_CHUNK_SIZE,
+                  out=None) -> np.ndarray:
+    """Parse the JointParamResp payloads of a joint read into an int16 array
+    (or into out, which may be any numeric dtype).
+
+    Every response is validated before raising, and the FIRST bad chunk's
+    error wins — callers rely on all responses having been collected."""
+    layout = _layout(num_values, joint_offset, chunk_size)
+    if out is None:
+        out = np.empty(num_values, dtype=_INT16)
+    if len(resps) == len(layout.frame_lens) and all(len(r) >= n for r, n in zip(resps, layout.frame_lens)):
+        # Fast path: every frame well-formed — one buffer, two gathers.
+        # (CAN FD responses may carry padding past the last value.)
+        words = np.frombuffer(b''.join(bytes(r[:n]) for r, n in zip(resps, layout.frame_lens)), dtype=_INT16)
+        if np.count_nonzero(words.take(layout.head_idx)):
+            raise Exception('error reading joint params')
+        out[:] = words.take(layout.value_idx)
+        return out
+
+    error = None
+    pos = 0
+    for resp, count in zip(resps, layout.counts):
+        count = int(count)
+        if len(resp) < 2 + 2 * count:
+            # Truncated frame (CAN error / misbehaving node): a raw
+            # IndexError here would mask the real problem.
+            error = error or Exception(
+                f'Short joint response ({len(resp)} bytes for {count} joints)')
+        elif resp[0] != 0 or resp[1] != 0:
+            error = error or Exception('error reading joint params')
+        elif error is None:
+            out[pos:pos + count] = np.frombuffer(resp, dtype=_INT16, count=count, offset=2)
+        pos += count
+    if error is not None:
+        raise error
+    return out
+
+
+def check_write_acks(resps):
+    """Validate the JointParamResp payloads of a joint write."""
+    error = None
+    for resp in resps:
+        if len(resp) < 2:
+            error = error or Exception(f'Short write response ({len(resp)} bytes)')
+        elif resp[0] != 0 or resp[1] != 0:
+            error = error or Exception('Error writing joint params')
+    if error is not None:
+        raise error
+
+
+@lru_cache(maxsize=256)
+def mask_joints(mask: int, num_joints: int) -> np.ndarray:
+    """Indices of the joints set in mask, ascending (read-only, cached)."""
+    joints = np.flatnonzero((mask >> np.arange(num_joints)) & 1)
+    joints.flags.writeable = False
+    return joints
+
+
+def decode_masked(data, num_joints: int):
+    """Parse a mask-prefixed frame (stream snapshot chunk) into (joint
+    indices, int16 values). A frame shorter than its mask claims yields
+    only the values actually present."""
+    mask = data[0] | (data[1] << 8)
+    joints = mask_joints(mask, num_joints)
+    count = min(len(joints), (len(data) - 2) // 2)
+    return joints[:count], np.frombuffer(data, dtype=_INT16, count=count, offset=2)
+
+
+def positions_to_wire(positions, scale: int = HIRES_SCALE) -> np.ndarray:
+    """Radians → clipped wire units (still float; encode_values truncates)."""
+    return np.clip(np.asarray(positions) * scale, -WIRE_MAX, WIRE_MAX)
+
+
+def wire_to_positions(raw, scale: int = HIRES_SCALE, out=None) -> np.ndarray:
+    """Wire units → radians (into out, which may be raw itself, if given)."""
+    return np.divide(raw, scale, out=out)
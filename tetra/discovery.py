@@ -0,0 +1,118 @@
+"""Finding the hands on a bus.
+
+Probing one CAN ID at a time costs a full timeout for every ID nobody
+answers, so scanning the whole ID space serially takes most of a minute.
+discover_hands sends a HandType read to every candidate ID in one paced
+burst and collects whatever answers within a single timeout window, so a
+full scan takes about as long as one probe:
+
+    for found in tetra.discover_hands(bus):
+        print(found.can_id, found.side)
+
+The burst is sent in groups of `burst` frames with a short pause between
+them, reading responses as they come in, so neither the interface's TX
+queue nor the hands' RX buffers overflow. Works on a raw can.BusABC, a
+tetra.shared_bus.SharedBus (frames for attached hands are still routed to
+them) and a bus with a running tetra.reactor.CANReactor.
+"""
+import time
+from dataclasses import dataclass
+
+import can
+
+from .can_protocol import MessageType, ParamType
+from .reactor import CANReactor
+from .shared_bus import SharedBus
+
+
+@dataclass(frozen=True)
+class DiscoveredHand:
+    can_id: int
+    hand_type: int
+
+    @property
+    def side(self) -> str:
+        return 'right' if self.hand_type & 1 else 'left'
+
+
+def _arb_id(message_type: MessageType, target_can_id: int, source_can_id: int, priority: int = 3) -> int:
+    # Same layout as CANProtocol._param_arb_id, for ParamType.HandType.
+    return (source_can_id | (target_can_id << 8) | (ParamType.HandType.value << 16)
+            | (message_type.value << 23) | (priority << 27))
+
+
+def discover_hands(bus: can.BusABC | SharedBus, host_can_id: int = 0xaa, can_ids=None, timeout: float = 0.1,
+                   burst: int = 16, pause: float = 0.002) -> list[DiscoveredHand]:
+    """Every hand among can_ids (default: the whole 1-253 range except the
+    host's own ID) that answers a HandType read within timeout of the last
+    request, sorted by CAN ID."""
+    if can_ids is None:
+        can_ids = range(1, 254)
+    can_ids = [can_id for can_id in can_ids if can_id != host_can_id]
+    requests = [(can_id,
+                 _arb_id(MessageType.ReadParam, can_id, host_can_id),
+                 _arb_id(MessageType.ParamResp, host_can_id, can_id)) for can_id in can_ids]
+    reactor = CANReactor.running_for(bus) if not isinstance(bus, SharedBus) else None
+    if reactor is not None:
+        answers = _discover_via_reactor(reactor, bus, requests, timeout, burst, pause)
+    elif isinstance(bus, SharedBus):
+        with bus._take_reader() as raw:
+            answers = _discover_direct(raw, bus, requests, timeout, burst, pause)
+    else:
+        answers = _discover_direct(bus, None, requests, timeout, burst, pause)
+    found = []
+    for can_id in sorted(answers):
+        data = answers[can_id]
+        if len(data) >= 3 and data[0] == 0:
+            found.append(DiscoveredHand(can_id, data[1] | (data[2] << 8)))
+    return found
+
+
+def _request_msg(arb_id: int) -> can.Message:
+    return can.Message(arbitration_id=arb_id, data=b'', is_extended_id=True)
+
+
+def _discover_direct(bus, shared: SharedBus | None, requests, timeout, burst, pause) -> dict:
+    expected = {resp_arb_id: can_id for can_id, _, resp_arb_id in requests}
+    answers = {}
+
+    def take(msg):
+        can_id = expected.get(msg.arbitration_id)
+        if can_id is not None and can_id not in answers:
+            answers[can_id] = bytes(msg.data)
+        elif shared is not None:
+            shared._route(msg, None)
+
+    def read_until(deadline):
+        while len(answers) < len(expected):
+            remaining = deadline - time.monotonic()
+            msg = bus.recv(max(0.0, remaining))
+            if msg is None:
+                if remaining <= 0:
+                    return
+                continue
+            take(msg)
+
+    for start in range(0, len(requests), burst):
+        for _, arb_id, _ in requests[start:start + burst]:
+            bus.send(_request_msg(arb_id))
+        read_until(time.monotonic() + pause)
+    read_until(time.monotonic() + timeout)
+    return answers
+
+
+def _discover_via_reactor(reactor: CANReactor, bus, requests, timeout, burst, pause) -> dict:
+    waiters = []
+    for start in range(0, len(requests), burst):
+        for can_id, arb_id, resp_arb_id in requests[start:start + burst]:
+            msg = _request_msg(arb_id)
+            waiters.append((can_id, reactor.request(lambda msg=msg: bus.send(msg), resp_arb_id)))
+        time.sleep(pause)
+    deadline = time.monotonic() + timeout
+    answers = {}
+    for can_id, waiter in waiters:
+        try:
+            answers[can_id] = bytes(reactor.wait(waiter, max(0.0, deadline - time.monotonic())))
+        except TimeoutError:
+            pass
+    return answers
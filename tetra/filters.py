@@ -0,0 +1,42 @@
+"""Kernel/interface acceptance filters for hand traffic.
+
+Without filters every frame on the bus wakes the host and is thrown away in
+Python (CANProtocol._recv, _maybe_ingest_stream) unless it is ours — with
+several hands streaming at 1-10 ms that is most wakeups. The filters built
+here let SocketCAN (or the adapter) pass only the frames a host can use:
+responses and stream snapshots sent from the given hands to the host.
+
+Filters apply to the whole bus, so every hand read through it has to be
+covered: install_can_filters merges with the bus's current filter set
+instead of replacing it, and a bus without filters (accept everything) is
+narrowed to the hands given.
+"""
+import can
+
+# Frame layout: source | target << 8 | param << 16 | message type << 23.
+_ADDRESS_MASK = 0xFFFF
+_TYPE_SHIFT = 23
+_TYPE_MASK = 0xF << _TYPE_SHIFT
+
+# Message types a hand sends to a host (MessageType.ParamResp,
+# JointParamResp and StreamPositions).
+_HAND_TO_HOST_TYPES = (3, 6, 8)
+
+
+def can_filters(host_can_id: int, hand_can_ids) -> list[dict]:
+    """python-can filters matching responses and stream frames from any of
+    hand_can_ids to host_can_id."""
+    return [{'can_id': hand_can_id | (host_can_id << 8) | (message_type << _TYPE_SHIFT),
+             'can_mask': _ADDRESS_MASK | _TYPE_MASK,
+             'extended': True}
+            for hand_can_id in hand_can_ids
+            for message_type in _HAND_TO_HOST_TYPES]
+
+
+def install_can_filters(bus: can.BusABC, host_can_id: int, hand_can_ids):
+    """Add can_filters(host_can_id, hand_can_ids) to bus's filter set."""
+    filters = list(bus.filters or [])
+    for hand_filter in can_filters(host_can_id, hand_can_ids):
+        if hand_filter not in filters:
+            filters.append(hand_filter)
+    bus.set_filters(filters)
@@ -0,0 +1,187 @@
+"""Several hands driven as one.
+
+Calling set_joint_positions on each hand in turn serializes their
+pipelines: the second hand's targets only go out once the first hand has
+acknowledged all of its chunks. A HandGroup sends every hand's chunks in
+one interleaved burst (chunk 0 of each hand, then chunk 1, ...) and then
+collects each hand's acks, so all hands get their targets at about the
+same time and the group costs roughly one round trip instead of N.
+
+    group = HandGroup([left_hand, right_hand])
+    group.enable()
+    group.set_joint_positions([left_targets, right_targets])
+
+Hands created directly on the same raw can.BusABC would discard each
+other's responses while collecting, so the group moves them onto a shared
+tetra.shared_bus.SharedBus. Hands that use a CANReactor or are already on a
+SharedBus are left as they are.
+"""
+import numpy as np
+
+from . import codec
+from .can_protocol import MessageType, ParamType
+from .hand import Hand
+from .shared_bus import SharedBus, SharedBusEndpoint
+
+
+class HandGroup:
+    def __init__(self, hands: list[Hand]):
+        if not hands:
+            raise ValueError('a HandGroup needs at least one hand')
+        self.hands = list(hands)
+        self._share_buses()
+
+    def __len__(self):
+        return len(self.hands)
+
+    def __iter__(self):
+        return iter(self.hands)
+
+    def __getitem__(self, i) -> Hand:
+        return self.hands[i]
+
+    @property
+    def protocols(self):
+        return [hand.protocol for hand in self.hands]
+
+    def _share_buses(self):
+        by_bus = {}
+        for protocol in self.protocols:
+            if protocol.reactor is None and not isinstance(protocol.bus, SharedBusEndpoint):
+                by_bus.setdefault(id(protocol.bus), []).append(protocol)
+        for protocols in by_bus.values():
+            if len(protocols) > 1:
+                shared = SharedBus(protocols[0].bus)
+                for protocol in protocols:
+                    protocol.bus = shared.attach(protocol.hand_can_id, protocol)
+
+    def enable(self):
+        """Enable the joint motors of every hand"""
+        self._write_param(ParamType.TorqueEnabled, 1)
+
+    def disable(self):
+        """Disable the joint motors of every hand"""
+        self._write_param(ParamType.TorqueEnabled, 0)
+
+    def set_joint_positions(self, positions, wait: bool = True):
+        """Set the joint targets of every hand (one array per hand, in group
+        order) in one interleaved burst. With wait=False the frames are
+        sent without waiting for acks — see CANProtocol.set_joint_positions."""
+        if len(positions) != len(self.hands):
+            raise ValueError(f'expected {len(self.hands)} position arrays, got {len(positions)}')
+        protocols = self.protocols
+        for protocol in protocols:
+            protocol._settle_acks()
+            protocol._raise_ack_error()
+        frames = []
+        for protocol, values in zip(protocols, positions):
+            protocol._ensure_transport()
+            bodies, shadow = protocol._target_frames(codec.positions_to_wire(values))
+            arb_id, resp_arb_id = protocol._arb_ids[MessageType.WriteJointParam, ParamType.TargetPosition]
+            frames.append(([(arb_id, body, resp_arb_id) for body in bodies], shadow))
+        if not wait:
+            for protocol, (arb_id, body, resp_arb_id) in self._interleave([requests for requests, _ in frames]):
+                protocol._send_unacked(arb_id, resp_arb_id, [body])
+            for protocol, (_, shadow) in zip(protocols, frames):
+                protocol._target_shadow = shadow
+            return
+        resps = self._burst([requests for requests, _ in frames])
+        error = None
+        for protocol, hand_resps, (_, shadow) in zip(protocols, resps, frames):
+            try:
+                codec.check_write_acks(hand_resps)
+                protocol._target_shadow = shadow
+            except Exception as e:
+                protocol._target_shadow = None
+                error = error or e
+        if error is not None:
+            raise error
+
+    def get_joint_positions(self) -> np.ndarray:
+        """Present joint positions of every hand, one row per hand"""
+        return np.array([hand.get_joint_positions() for hand in self.hands])
+
+    def drain_stream(self) -> int:
+        return sum(protocol.drain_stream() for protocol in self.protocols)
+
+    def get_stream_positions(self):
+        """Latest streamed snapshot of every hand as (radians, one row per
+        hand; ages in seconds, one per hand), or None until every hand has
+        streamed a complete snapshot."""
+        snaps = [protocol.get_stream_positions() for protocol in self.protocols]
+        if any(snap is None for snap in snaps):
+            return None
+        return np.array([rad for rad, _ in snaps]), np.array([age for _, age in snaps])
+
+    def _write_param(self, param_type: ParamType, value: int):
+        requests = []
+        for protocol in self.protocols:
+            arb_id, resp_arb_id = protocol._arb_ids[MessageType.WriteParam, param_type]
+            requests.append([(arb_id, (value & 0xFF, (value >> 8) & 0xFF), resp_arb_id)])
+        error = None
+        for hand_resps in self._burst(requests):
+            data = hand_resps[0]
+            if len(data) < 1:
+                error = error or Exception('Short param-write response (0 bytes)')
+            elif data[0] != 0:
+                error = error or Exception(f'Error writing param {data[0]}')
+        if error is not None:
+            raise error
+
+    def _interleave(self, requests):
+        """(protocol, request) pairs, chunk-major across hands."""
+        protocols = self.protocols
+        for k in range(max(len(r) for r in requests)):
+            for protocol, hand_requests in zip(protocols, requests):
+                if k < len(hand_requests):
+                    yield protocol, hand_requests[k]
+
+    def _burst(self, requests):
+        """Send every hand's requests interleaved, then collect each hand's
+        responses; returns one list of payloads per hand. If a hand's
+        requests don't fit its pipeline window, or one of its responses goes
+        missing (which shrinks the window), it is (re)done on its own."""
+        protocols = self.protocols
+        if not all(len(hand_requests) <= protocol._window for protocol, hand_requests in zip(protocols, requests)):
+            return [protocol._exchange_pipelined(hand_requests)
+                    for protocol, hand_requests in zip(protocols, requests)]
+        # Same-ID bursts through a reactor are serialized per protocol (see
+        # CANProtocol._transfer_chunks); lock order is fixed to avoid
+        # deadlocking against another group.
+        locks = sorted({id(lock): lock for protocol, hand_requests in zip(protocols, requests)
+                        if protocol.reactor is not None
+                        for lock in (protocol._burst_locks[r] for _, _, r in hand_requests)}.items())
+        for _, lock in locks:
+            lock.acquire()
+        try:
+            waiters = {id(protocol): [] for protocol in protocols}
+            for protocol, (arb_id, body, resp_arb_id) in self._interleave(requests):
+                waiters[id(protocol)].append(protocol._request(arb_id, body, resp_arb_id))
+            resps = []
+            failed = []
+            for i, protocol in enumerate(protocols):
+                hand_waiters = waiters[id(protocol)]
+                got = [None] * len(hand_waiters)
+                try:
+                    if protocol.reactor is None:
+                        protocol._collect(hand_waiters, out=got)
+                    else:
+                        for k, waiter in enumerate(hand_waiters):
+                            got[k] = protocol._await(waiter, len(hand_waiters) - k)
+                    protocol._window_ok(len(hand_waiters))
+                    resps.append(got)
+                except TimeoutError:
+                    # Keep collecting the other hands so their responses
+                    # aren't left behind to confuse the next transfer.
+                    received = sum(resp is not None for resp in got)
+                    protocol._abandon(hand_waiters[received + 1:])
+                    if len(hand_waiters) > 1 and received:
+                        protocol._window_drop(len(hand_waiters), received)
+                    resps.append(None)
+                    failed.append(i)
+        finally:
+            for _, lock in reversed(locks):
+                lock.release()
+        for i in failed:
+            resps[i] = protocols[i]._exchange_pipelined(requests[i])
+        return resps
@@ -5,6 +5,9 @@ import can
 import numpy as np
 
 from .can_protocol import CANProtocol
+from .discovery import discover_hands
+from .reactor import CANReactor
+from .shared_bus import SharedBus
 
 @dataclass
 class JointConfig:
@@ -36,33 +39,28 @@ class DeviceNotFoundError(Exception):
     pass
 
 class Hand:
-    def __init__(self, can_bus: can.BusABC, can_id: int = None, side: Literal["left", "right"] | None = None):
-        if isinstance(can_bus, can.BusABC):
+    def __init__(self, can_bus: can.BusABC | SharedBus, can_id: int = None, side: Literal["left", "right"] | None = None,
+                 reactor: bool | None = None, install_filters: bool = False, fd: bool | None = None,
+                 capability_cache: bool = False):
+        if isinstance(can_bus, (can.BusABC, SharedBus)):
+            if reactor and isinstance(can_bus, SharedBus):
+                raise ValueError('a SharedBus and a reactor both own the bus receive side; use one')
+            if reactor:
+                # Start it before discovery so the probes go through it too.
+                CANReactor.for_bus(can_bus)
             if can_id is None:
-                wrong_side_found = False
-                for i in range(2): # previously 252, working around limitations of CAN
-                    id_guess = 1 + ((i + 49) % 252)
-                    protocol = CANProtocol(can_bus, id_guess)
-                    protocol.can_timeout = 0.1
-                    is_right = None
-                    try:
-                        is_right = protocol.get_hand_type() & 1
-                    except TimeoutError:
-                        pass
-
-                    if is_right is not None:
-                        if side is None or is_right == (side == 'right'):
-                            can_id = id_guess
-                            break
-                        else:
-                            wrong_side_found = True
-                if can_id is None:
+                found = discover_hands(can_bus)
+                matches = [hand for hand in found if side is None or hand.side == side]
+                if not matches:
                     message = 'No hand found on the CAN bus'
-                    if wrong_side_found:
+                    if found:
                         message = f'No {side} hands found on the CAN bus'
                     raise DeviceNotFoundError(message)
+                can_id = matches[0].can_id
 
-            self.protocol = CANProtocol(can_bus, can_id, num_joints=num_joints)
+            self.protocol = CANProtocol(can_bus, can_id, num_joints=num_joints, reactor=reactor,
+                                        install_filters=install_filters, fd=fd,
+                                        capability_cache=capability_cache)
         else:
             self.protocol = can_bus
 
@@ -101,13 +99,22 @@ class Hand:
         '''Set the max power of the joint motors, between 0 and 1'''
         self.protocol.set_torque_limit(torque_limit)
 
-    def get_joint_positions(self):
-        '''Get the current positions of all the joints'''
-        return self.protocol.get_joint_positions()
-
-    def set_joint_positions(self, positions):
-        '''Set the target positions of all joints'''
-        self.protocol.set_joint_positions(positions)
+    def get_joint_positions(self, out=None):
+        '''Get the current positions of all the joints. With out (a float
+        array with one entry per joint), they are written into it instead of
+        a new array'''
+        return self.protocol.get_joint_positions(out)
+
+    def get_stream_positions(self, out=None):
+        '''Latest streamed joint positions and their age in seconds, or None
+        until streaming is on (see CANProtocol.set_stream_period_ms). out
+        works as for get_joint_positions'''
+        return self.protocol.get_stream_positions(out)
+
+    def set_joint_positions(self, positions, wait=True):
+        '''Set the target positions of all joints. With wait=False, return
+        without waiting for the hand to acknowledge (see CANProtocol.set_joint_positions)'''
+        self.protocol.set_joint_positions(positions, wait=wait)
     
     def set_single_joint_position(self, joint_id, pos):
         '''Set the target position of a single joint'''
@@ -0,0 +1,88 @@
+"""Fixed-capacity history of streamed position snapshots.
+
+CANProtocol's stream cache only holds the latest snapshot, so a consumer
+polling slower than StreamPeriodMs misses samples. StreamHistory keeps the
+last `capacity` completed snapshots as (time, raw encoder counts) in
+preallocated NumPy arrays — memory stays constant however long the session
+runs.
+
+Every sample is written twice, at i and i + capacity, so the most recent
+`capacity` samples are always one contiguous slice of the buffers: every
+query returns views, never copies. A view aliases the ring, so it is only
+valid until `capacity` further samples have been pushed — copy it if it has
+to outlive that.
+
+    hist = hand.protocol.stream_history
+    times, counts = hist.since(time.monotonic() - 0.5)   # last 500 ms
+    radians = counts * COUNTS_TO_RAD
+"""
+import threading
+
+import numpy as np
+
+
+class StreamHistory:
+    def __init__(self, num_joints: int, capacity: int = 4096):
+        if capacity <= 0:
+            raise ValueError('capacity must be positive')
+        self.num_joints = num_joints
+        self.capacity = capacity
+        self._times = np.zeros(2 * capacity)
+        self._counts = np.zeros((2 * capacity, num_joints), dtype=np.int16)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._total, self.capacity)
+
+    @property
+    def total(self) -> int:
+        """Samples pushed since creation (or the last clear)."""
+        return self._total
+
+    @property
+    def dropped(self) -> int:
+        """Samples overwritten by newer ones."""
+        return max(0, self._total - self.capacity)
+
+    def push(self, timestamp: float, counts):
+        with self._lock:
+            i = self._total % self.capacity
+            self._times[i] = self._times[i + self.capacity] = timestamp
+            self._counts[i] = self._counts[i + self.capacity] = counts
+            self._total += 1
+
+    def clear(self):
+        with self._lock:
+            self._total = 0
+
+    def _window(self, start: int, stop: int):
+        # Retained samples, oldest first, are [end - len, end) of the buffers.
+        end = self._total % self.capacity + self.capacity
+        base = end - len(self)
+        return self._times[base + start:base + stop], self._counts[base + start:base + stop]
+
+    def view(self, start: int = 0, stop: int = None):
+        """(times, counts) of retained samples [start, stop), indexed from
+        the oldest; negative indices count from the newest, like a slice."""
+        with self._lock:
+            start, stop, _ = slice(start, stop).indices(len(self))
+            return self._window(start, max(start, stop))
+
+    def last(self, n: int):
+        """(times, counts) of the newest n samples (fewer if not retained)."""
+        with self._lock:
+            size = len(self)
+            return self._window(size - min(max(n, 0), size), size)
+
+    def since(self, t: float):
+        """(times, counts) of the samples with time >= t."""
+        with self._lock:
+            size = len(self)
+            times, _ = self._window(0, size)
+            return self._window(int(np.searchsorted(times, t, side='left')), size)
+
+    def latest(self):
+        """(time, counts) of the newest sample, or None."""
+        times, counts = self.last(1)
+        return (float(times[0]), counts[0]) if len(times) else None
@@ -0,0 +1,194 @@
+"""Background receive reactor for a shared can.BusABC.
+
+Without a reactor every CANProtocol transaction reads the bus itself, so
+only one caller can use a bus at a time: a thread waiting for its response
+consumes (and discards) whatever another thread is waiting for. A
+CANReactor owns the bus's receive side instead — one thread per bus reads
+every frame once and routes it:
+
+  * responses go to the oldest pending request for their arbitration ID
+    (a per-request Future), so callers only ever see their own responses;
+  * StreamPositions frames go straight into the owning protocol's stream
+    cache;
+  * anything else is counted in `skipped` and dropped.
+
+Requests are registered BEFORE their frame is sent, under one lock, so the
+FIFO of waiters for an arbitration ID is always in send order. The
+firmware answers strictly in order and CAN preserves frame order, so the
+k-th response for an ID completes the k-th waiter — the same guarantee
+CANProtocol's pipelined transfers rely on without a reactor.
+
+    reactor = CANReactor.for_bus(bus)        # or CANProtocol(bus, reactor=True)
+    ...
+    reactor.stop()
+"""
+import collections
+import concurrent.futures
+import threading
+import weakref
+
+import can
+
+_reactors = {}
+_reactors_lock = threading.Lock()
+
+
+class CANReactor:
+    def __init__(self, bus: can.BusABC, poll_interval: float = 0.1):
+        self.bus = bus
+        self.poll_interval = poll_interval
+        # Frames nobody was waiting for (late/stale responses, other
+        # nodes' traffic, streams for unregistered protocols).
+        self.skipped = 0
+        # Frames whose routing raised (e.g. a malformed stream frame). The
+        # frame is dropped; the receiver keeps running.
+        self.dispatch_errors = 0
+
+        self._lock = threading.Lock()
+        self._waiters = {}                       # resp arb ID -> deque of Futures
+        self._protocols = weakref.WeakSet()      # stream-ingest targets
+        self._error = None
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def for_bus(cls, bus: can.BusABC) -> 'CANReactor':
+        """The running reactor for bus, started on first use."""
+        with _reactors_lock:
+            reactor = _reactors.get(id(bus))
+            if reactor is not None and reactor.bus is bus:
+                return reactor
+            reactor = cls(bus)
+            _reactors[id(bus)] = reactor
+        reactor._start_thread()
+        return reactor
+
+    @classmethod
+    def running_for(cls, bus: can.BusABC) -> 'CANReactor | None':
+        """The running reactor for bus, or None (never starts one)."""
+        with _reactors_lock:
+            reactor = _reactors.get(id(bus))
+        return reactor if reactor is not None and reactor.bus is bus else None
+
+    def start(self):
+        with _reactors_lock:
+            other = _reactors.get(id(self.bus))
+            if other is not None and other is not self and other.bus is self.bus:
+                raise RuntimeError('a CANReactor is already running for this bus')
+            _reactors[id(self.bus)] = self
+        self._start_thread()
+
+    def _start_thread(self):
+        # Called WITHOUT _reactors_lock held (it isn't reentrant).
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='tetra-can-reactor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the receiver thread. Pending and later requests fail at once
+        with RuntimeError; protocols that joined this reactor notice it has
+        stopped and go back to reading the bus directly."""
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._shutdown(RuntimeError('CAN reactor stopped'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def register(self, protocol):
+        """Route protocol's StreamPositions frames into its stream cache."""
+        with self._lock:
+            self._protocols.add(protocol)
+
+    def unregister(self, protocol):
+        with self._lock:
+            self._protocols.discard(protocol)
+
+    def request(self, send, resp_arb_id: int) -> concurrent.futures.Future:
+        """Register a waiter for the next response on resp_arb_id, then call
+        send() to put the request on the bus. Both happen under the
+        reactor lock, so waiter order always matches send order."""
+        fut = concurrent.futures.Future()
+        fut.arb_id = resp_arb_id
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            if not self._running:
+                raise RuntimeError('CAN reactor is not running')
+            self._waiters.setdefault(resp_arb_id, collections.deque()).append(fut)
+            try:
+                send()
+            except BaseException:
+                self._waiters[resp_arb_id].pop()
+                raise
+        return fut
+
+    def wait(self, fut: concurrent.futures.Future, timeout: float):
+        """Response payload of a request, or TimeoutError. A timed-out
+        waiter is withdrawn so it can't swallow a later response."""
+        try:
+            return fut.result(timeout)
+        except concurrent.futures.TimeoutError:
+            self.cancel(fut)
+            if fut.done():   # answered between the timeout and the withdrawal
+                return fut.result()
+            raise TimeoutError('No CAN response received')
+
+    def cancel(self, fut: concurrent.futures.Future):
+        with self._lock:
+            waiters = self._waiters.get(fut.arb_id)
+            if waiters is not None and fut in waiters:
+                waiters.remove(fut)
+
+    def _run(self):
+        while self._running:
+            try:
+                msg = self.bus.recv(self.poll_interval)
+            except Exception as e:
+                # A receive error is fatal for the bus (closed socket,
+                # unplugged adapter): fail everyone instead of hanging them.
+                self._running = False
+                self._shutdown(e)
+                break
+            if msg is None:
+                continue
+            try:
+                self._dispatch(msg)
+            except Exception:
+                self.dispatch_errors += 1
+
+    def _dispatch(self, msg):
+        fut = None
+        with self._lock:
+            waiters = self._waiters.get(msg.arbitration_id)
+            if waiters:
+                fut = waiters.popleft()
+            else:
+                protocols = list(self._protocols)
+        if fut is not None:
+            fut.set_result(msg.data)
+            return
+        for protocol in protocols:
+            if protocol._maybe_ingest_stream(msg):
+                return
+        self.skipped += 1
+
+    def _shutdown(self, error):
+        with _reactors_lock:
+            if _reactors.get(id(self.bus)) is self:
+                del _reactors[id(self.bus)]
+        with self._lock:
+            self._error = error
+            waiters, self._waiters = self._waiters, {}
+        for queue in waiters.values():
+            for fut in queue:
+                if not fut.done():
+                    fut.set_exception(error)
@@ -0,0 +1,318 @@
+"""Recording CAN traffic to disk and replaying it.
+
+RecordingBus wraps a bus and logs every frame sent through it and received
+from it, so a field issue can be looked at as the exact frame sequence the
+protocol saw:
+
+    with RecordingBus(can.Bus(), 'session.tcan') as bus:
+        hand = tetra.Hand(bus, can_id=50)
+        ...
+
+    rec = Recording('session.tcan')
+    frames = rec.between(60, 65)          # structured array, a memmap view
+    for t, sent, msg in rec.messages(60, 65):
+        ...
+
+    hand = tetra.Hand(ReplayBus(rec, speed=4), can_id=50)
+
+The file is a 64-byte header followed by fixed 80-byte records (RECORD_DTYPE:
+seconds since the start, arbitration ID, flags, length, 64 data bytes), so
+it can be memory-mapped as one NumPy array. Records are in time order,
+which makes the time axis its own index: slicing by time is a binary
+search over a memmap, and only the pages touched are read — a multi-hour
+capture opens instantly. A capture cut short (a crash, a full disk) loses
+at most its last partial record.
+
+Frames are timestamped and queued on the send/recv path; a background
+thread does the file writes in batches. If the writer falls more than
+max_pending frames behind, newer frames are counted in dropped instead of
+growing memory.
+
+ReplayBus feeds the received frames of a recording back with the original
+timing (or speed times faster; speed=None for no waiting at all). By
+default a frame is also held back until as many frames have been sent as
+preceded it in the recording, and its recorded delay counts from that
+send, so responses never overtake the requests they answer however fast
+or slow the host replays — the protocol sees the same frame sequence every
+run. Sent frames that differ from the recorded ones are counted in
+mismatches.
+"""
+import os
+import struct
+import threading
+import time
+
+import can
+import numpy as np
+
+MAGIC = b'TETRACAN'
+FORMAT_VERSION = 1
+HEADER_SIZE = 64
+# magic, format version, record size, wall-clock start (time.time()), CAN FD
+_HEADER = struct.Struct('<8sHHd?')
+
+RECORD_DTYPE = np.dtype([
+    ('t', '<f8'),          # seconds since the recording started
+    ('arb_id', '<u4'),
+    ('flags', 'u1'),       # FLAG_* bits
+    ('dlc', 'u1'),         # data length in bytes (not the DLC code)
+    ('_pad', 'u1', 2),
+    ('data', 'u1', 64),
+])
+
+FLAG_TX = 1          # sent by this host (else received)
+FLAG_EXTENDED = 2
+FLAG_FD = 4
+FLAG_BRS = 8
+
+
+def _flags(msg, tx: bool) -> int:
+    return ((FLAG_TX if tx else 0) | (FLAG_EXTENDED if getattr(msg, 'is_extended_id', True) else 0)
+            | (FLAG_FD if getattr(msg, 'is_fd', False) else 0)
+            | (FLAG_BRS if getattr(msg, 'bitrate_switch', False) else 0))
+
+
+def _message(record, timestamp: float = 0.0) -> can.Message:
+    flags = int(record['flags'])
+    return can.Message(timestamp=timestamp, arbitration_id=int(record['arb_id']),
+                       data=bytes(record['data'][:record['dlc']]), is_extended_id=bool(flags & FLAG_EXTENDED),
+                       is_fd=bool(flags & FLAG_FD), bitrate_switch=bool(flags & FLAG_BRS), is_rx=not flags & FLAG_TX)
+
+
+class RecordingBus(can.BusABC):
+    def __init__(self, bus, path, flush_interval: float = 0.05, max_pending: int = 1 << 20):
+        self.bus = bus
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.recorded = 0   # frames written
+        self.dropped = 0    # frames not recorded (writer behind, or failed)
+        self.error = None   # what stopped the writer, if anything
+        super().__init__(getattr(bus, 'channel_info', 'recording'))
+        self.channel_info = f'recording of {getattr(bus, "channel_info", bus)!r}'
+        fd = getattr(bus, 'protocol', None) == can.CanProtocol.CAN_FD
+        self._can_protocol = can.CanProtocol.CAN_FD if fd else can.CanProtocol.CAN_20
+
+        self._file = open(path, 'wb')
+        self._start_wall = time.time()
+        self._start = time.monotonic()
+        self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_DTYPE.itemsize, self._start_wall, fd)
+                         .ljust(HEADER_SIZE, b'\0'))
+        self._file.flush()
+        self._cond = threading.Condition()
+        self._pending = []
+        self._closing = False
+        self._writer = threading.Thread(target=self._write_loop, name='tetra-recorder', daemon=True)
+        self._writer.start()
+
+    def _record(self, msg, tx: bool):
+        # Timestamped under the lock, so records are queued in time order.
+        with self._cond:
+            if self._closing or self.error is not None or len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append((time.monotonic() - self._start, msg.arbitration_id, _flags(msg, tx),
+                                  bytes(msg.data)))
+
+    def send(self, msg: can.Message, timeout: float | None = None):
+        if timeout is None:
+            self.bus.send(msg)
+        else:
+            self.bus.send(msg, timeout)
+        self._record(msg, True)
+
+    def _recv_internal(self, timeout: float | None):
+        msg = self.bus.recv(timeout)
+        if msg is not None:
+            self._record(msg, False)
+        return msg, True   # the wrapped bus filtered it
+
+    def _apply_filters(self, filters):
+        if hasattr(self, 'bus'):
+            self.bus.set_filters(filters)
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._closing:
+                    self._cond.wait(self.flush_interval)
+                batch, self._pending = self._pending, []
+                closing = self._closing
+            if batch:
+                try:
+                    self._write(batch)
+                except (OSError, ValueError) as e:
+                    with self._cond:
+                        self.error = e
+                        self.dropped += len(batch) + len(self._pending)
+                        self._pending = []
+                    return
+            if closing:
+                return
+
+    def _write(self, batch):
+        block = np.zeros(len(batch), dtype=RECORD_DTYPE)
+        t, arb_ids, flags, datas = zip(*batch)
+        block['t'] = t
+        block['arb_id'] = arb_ids
+        block['flags'] = flags
+        block['dlc'] = [len(data) for data in datas]
+        for row, data in zip(block['data'], datas):
+            row[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+        self._file.write(block.tobytes())
+        self._file.flush()
+        self.recorded += len(batch)
+
+    def close(self):
+        """Write out what is queued and close the file (the wrapped bus
+        stays open)."""
+        with self._cond:
+            if self._closing:
+                return
+            self._closing = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._file.close()
+
+    def shutdown(self):
+        self.close()
+        super().shutdown()
+        self.bus.shutdown()
+
+
+class Recording:
+    """A recording file, memory-mapped read-only."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < _HEADER.size:
+            raise ValueError(f'{path}: not a CAN recording (too short)')
+        magic, version, record_size, self.start_time, self.fd = _HEADER.unpack_from(header)
+        if magic != MAGIC:
+            raise ValueError(f'{path}: not a CAN recording')
+        if version != FORMAT_VERSION or record_size != RECORD_DTYPE.itemsize:
+            raise ValueError(f'{path}: unsupported recording format {version}')
+        # Whole records only: a capture cut short ends in a partial one.
+        count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        if count > 0:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def duration(self) -> float:
+        return float(self.records['t'][-1]) if len(self.records) else 0.0
+
+    def index(self, t: float) -> int:
+        """Index of the first record at or after t seconds."""
+        return int(np.searchsorted(self.records['t'], t, side='left'))
+
+    def between(self, start: float = 0.0, end: float | None = None) -> np.ndarray:
+        """Records from start up to (not including) end seconds, as a view
+        of the memmap."""
+        stop = len(self.records) if end is None else self.index(end)
+        return self.records[self.index(start):stop]
+
+    def messages(self, start: float = 0.0, end: float | None = None):
+        """(seconds, sent by the host, can.Message) for the records between
+        start and end. Message timestamps are wall-clock (time.time())."""
+        for record in self.between(start, end):
+            t = float(record['t'])
+            yield t, bool(record['flags'] & FLAG_TX), _message(record, self.start_time + t)
+
+
+class ReplayBus(can.BusABC):
+    def __init__(self, recording: Recording | str, speed: float | None = 1.0, start: float = 0.0,
+                 end: float | None = None, follow_sends: bool = True, **kwargs):
+        if speed is not None and speed <= 0:
+            raise ValueError('speed must be positive (or None)')
+        if not isinstance(recording, Recording):
+            recording = Recording(recording)
+        super().__init__('replay', **kwargs)
+        self.recording = recording
+        self.channel_info = f'replay of {recording.path}'
+        self._can_protocol = can.CanProtocol.CAN_FD if recording.fd else can.CanProtocol.CAN_20
+        self.speed = speed
+        self.follow_sends = follow_sends
+        self.mismatches = 0   # sent frames that differ from the recorded ones
+
+        records = recording.between(start, end)
+        tx = (records['flags'] & FLAG_TX) != 0
+        # Per received frame: how many frames the host had sent before it.
+        self._rx_index = np.flatnonzero(~tx)
+        self._rx_after_sends = np.cumsum(tx)[self._rx_index] if len(records) else self._rx_index
+        self._tx_index = np.flatnonzero(tx)
+        self._records = records
+        self._times = records['t']
+        self._t0 = float(self._times[0]) if len(records) else 0.0
+        self._send_times = np.zeros(len(self._tx_index))   # when each recorded send was replayed
+        self._anchor = None   # (replayed at, recorded at) of the last event frames are timed from
+        self._next = 0
+        self._sent = 0
+        self._cond = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        """Whether every received frame has been replayed."""
+        return self._next >= len(self._rx_index)
+
+    def send(self, msg: can.Message, timeout: float | None = None):
+        with self._cond:
+            now = time.monotonic()
+            self._start(now)
+            if self._sent < len(self._tx_index):
+                self._send_times[self._sent] = now
+                record = self._records[self._tx_index[self._sent]]
+                if int(record['arb_id']) != msg.arbitration_id or bytes(record['data'][:record['dlc']]) != bytes(msg.data):
+                    self.mismatches += 1
+            else:
+                self.mismatches += 1
+            self._sent += 1
+            self._cond.notify_all()
+
+    def _start(self, now: float):
+        if self._anchor is None:
+            self._anchor = (now, self._t0)
+
+    def _due(self, i: int) -> float:
+        """Monotonic time the i-th received frame is due: its recorded gap
+        (over speed) after whichever came last in the recording, the frame
+        before it or the send it waits for. The host's own pace shifts the
+        timeline instead of being measured against it."""
+        if self.speed is None:
+            return float('-inf')
+        t = float(self._times[self._rx_index[i]])
+        replayed, recorded = self._anchor
+        gate = self._rx_after_sends[i] - 1
+        if self.follow_sends and gate >= 0:
+            sent_at = float(self._times[self._tx_index[gate]])
+            if sent_at >= recorded:
+                replayed, recorded = self._send_times[gate], sent_at
+        return replayed + (t - recorded) / self.speed
+
+    def _recv_internal(self, timeout: float | None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._start(time.monotonic())
+            while True:
+                now = time.monotonic()
+                wake = deadline
+                if self._next < len(self._rx_index):
+                    if not self.follow_sends or self._sent >= self._rx_after_sends[self._next]:
+                        due = self._due(self._next)
+                        if due <= now:
+                            record = self._records[self._rx_index[self._next]]
+                            if self.speed is not None:
+                                self._anchor = (due, float(record['t']))
+                            self._next += 1
+                            return _message(record, time.time()), False
+                        wake = due if wake is None else min(wake, due)
+                if deadline is not None and now >= deadline:
+                    return None, False
+                # A send wakes us early: it may release the next frame.
+                self._cond.wait(None if wake is None else max(0.0, wake - now))
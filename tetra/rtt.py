@@ -0,0 +1,95 @@
+"""Adaptive response timeouts from measured round-trip times.
+
+A fixed can_timeout has to be generous enough for a busy bus, so an
+unplugged hand stalls every call for the full 0.5 s. CANProtocol instead
+keeps a smoothed RTT and RTT variance per transaction type (response
+arbitration ID) the way TCP does (RFC 6298), and waits
+
+    srtt + 4 * rttvar        per outstanding request
+
+clamped to [floor, ceiling]. Until a transaction type has been measured
+the ceiling applies; each timeout doubles that type's timeout (up to the
+ceiling) until it is measured again, so a briefly busy bus does not cause
+a string of false timeouts. After fail_fast_after timeouts in a row with
+no response of any kind in between, the hand is taken to be gone and
+every wait drops to the floor until it answers again.
+
+Samples follow Karn's rule: a transaction that had to be retried is not
+measured, since its response may belong to the earlier attempt.
+
+    hand.protocol.rtt.floor = 0.005
+    hand.protocol.can_timeout = 1.0          # the ceiling
+    hand.protocol.rtt.timeout(resp_arb_id)   # what the next wait would be
+"""
+
+# Smoothing gains and variance weight from RFC 6298.
+_ALPHA = 1 / 8
+_BETA = 1 / 4
+_K = 4
+
+
+class RTTEstimator:
+    __slots__ = ('srtt', 'rttvar', 'backoff')
+
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.backoff = 1
+
+    def sample(self, rtt: float):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - _BETA) * self.rttvar + _BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - _ALPHA) * self.srtt + _ALPHA * rtt
+        self.backoff = 1
+
+    def rto(self) -> float | None:
+        if self.srtt is None:
+            return None
+        return (self.srtt + _K * self.rttvar) * self.backoff
+
+
+class AdaptiveTimeout:
+    def __init__(self, floor: float = 0.02, ceiling: float = 0.5, fail_fast_after: int = 3):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.fail_fast_after = fail_fast_after
+        self.misses = 0          # timeouts in a row, any transaction type
+        self._estimators = {}    # response arbitration ID -> RTTEstimator
+
+    def estimator(self, key: int) -> RTTEstimator:
+        est = self._estimators.get(key)
+        if est is None:
+            est = self._estimators[key] = RTTEstimator()
+        return est
+
+    def timeout(self, key: int, outstanding: int = 1) -> float:
+        """How long to wait for the first of outstanding responses of type
+        key (and, when collecting, for each one after it)."""
+        if self.fail_fast_after and self.misses >= self.fail_fast_after:
+            return min(self.floor, self.ceiling)
+        est = self._estimators.get(key)
+        rto = est.rto() if est is not None else None
+        if rto is None:
+            return self.ceiling
+        return min(self.ceiling, max(self.floor, rto * max(outstanding, 1)))
+
+    def sample(self, key: int, seconds: float, outstanding: int = 1):
+        """A first-attempt transaction of outstanding requests on key took
+        seconds from the first send to the last response."""
+        self.estimator(key).sample(seconds / max(outstanding, 1))
+
+    def answered(self):
+        self.misses = 0
+
+    def missed(self, key: int):
+        self.misses += 1
+        est = self._estimators.get(key)
+        if est is not None and est.srtt is not None:
+            est.backoff = min(2 * est.backoff, 64)
+
+    def reset(self):
+        self.misses = 0
+        self._estimators.clear()
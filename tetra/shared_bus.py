@@ -0,0 +1,155 @@
+"""Pull-based demultiplexer for several hands on one can.BusABC.
+
+Two CANProtocols reading the same bus directly steal each other's frames:
+whichever one calls bus.recv() gets the next frame, and _recv drops
+anything that isn't its own response — the other hand's responses (a
+spurious timeout) and stream frames (lost telemetry) included.
+
+A SharedBus is owned once per bus and hands each hand ID an endpoint that
+looks like a bus. Whoever is reading reads for everyone: each frame is
+routed by its source byte (the sending hand's ID) into that hand's bounded
+queue, or — for StreamPositions — straight into the owning protocol's
+stream cache, so idle hands keep their telemetry current.
+
+    shared = SharedBus(bus)
+    left = Hand(shared, can_id=50)
+    right = Hand(shared, can_id=51)
+
+Unlike tetra.reactor.CANReactor no thread is involved: frames are only
+read while some caller waits for one. Use a reactor instead when hands are
+driven from several threads that should not take turns reading, or when
+stream frames must be ingested while nobody is waiting on the bus.
+"""
+import collections
+import contextlib
+import threading
+import time
+import weakref
+
+import can
+
+_STREAM_POSITIONS = 8   # MessageType.StreamPositions (no import cycle)
+
+
+class SharedBus:
+    def __init__(self, bus: can.BusABC, queue_size: int = 256):
+        self.bus = bus
+        self.queue_size = queue_size
+        # Frames from nodes without an endpoint.
+        self.skipped = 0
+        # Frames pushed out of a full per-hand queue (oldest first).
+        self.dropped = 0
+
+        self._cond = threading.Condition()
+        self._reading = False
+        self._endpoints = {}   # hand ID -> SharedBusEndpoint
+
+    def attach(self, hand_can_id: int, protocol=None) -> 'SharedBusEndpoint':
+        """The endpoint for hand_can_id (one per ID, shared by every
+        protocol talking to that hand). With protocol, that hand's stream
+        frames go straight into protocol's stream cache."""
+        with self._cond:
+            endpoint = self._endpoints.get(hand_can_id)
+            if endpoint is None:
+                endpoint = SharedBusEndpoint(self, hand_can_id)
+                self._endpoints[hand_can_id] = endpoint
+            if protocol is not None:
+                endpoint._protocol = weakref.ref(protocol)
+        return endpoint
+
+    def send(self, msg, timeout=None):
+        if timeout is None:
+            self.bus.send(msg)
+        else:
+            self.bus.send(msg, timeout)
+
+    def _recv_for(self, endpoint: 'SharedBusEndpoint', timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if endpoint._queue:
+                    return endpoint._queue.popleft()
+                if not self._reading:
+                    # Even with no time left: a recv(0) still polls once.
+                    self._reading = True
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                # Someone else is reading; they route our frames to us.
+                self._cond.wait(remaining)
+        try:
+            # Past the deadline, keep routing what is already queued (a
+            # recv(0) drain must see frames behind other hands' ones), but
+            # only so much of it.
+            overdue = 0
+            while overdue < 256:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                msg = self.bus.recv(remaining)
+                if msg is None:
+                    return None
+                if self._route(msg, endpoint):
+                    return msg
+                if remaining == 0:
+                    overdue += 1
+            return None
+        finally:
+            with self._cond:
+                self._reading = False
+                self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def _take_reader(self):
+        """Become the reader and get the raw bus, for a caller that reads
+        it directly (see tetra.discovery); frames it doesn't consume must be
+        passed to _route so attached hands still get them."""
+        with self._cond:
+            while self._reading:
+                self._cond.wait()
+            self._reading = True
+        try:
+            yield self.bus
+        finally:
+            with self._cond:
+                self._reading = False
+                self._cond.notify_all()
+
+    def _route(self, msg, reader: 'SharedBusEndpoint | None') -> bool:
+        """Deliver msg; True if it is the reader's own frame to return."""
+        endpoint = self._endpoints.get(msg.arbitration_id & 0xFF)
+        if endpoint is None:
+            self.skipped += 1
+            return False
+        if (msg.arbitration_id >> 23) & 0xF == _STREAM_POSITIONS:
+            protocol = endpoint._protocol()
+            if protocol is not None and protocol._maybe_ingest_stream(msg):
+                return False
+        if endpoint is reader:
+            return True
+        with self._cond:
+            if len(endpoint._queue) == endpoint._queue.maxlen:
+                self.dropped += 1
+            endpoint._queue.append(msg)
+            self._cond.notify_all()
+        return False
+
+
+class SharedBusEndpoint:
+    """One hand's view of a SharedBus: sends go to the bus, recv returns
+    only frames from this hand. Other attributes (channel_info, protocol,
+    filters, ...) are the underlying bus's."""
+
+    def __init__(self, shared: SharedBus, hand_can_id: int):
+        self.shared = shared
+        self.hand_can_id = hand_can_id
+        self._queue = collections.deque(maxlen=shared.queue_size)
+        self._protocol = lambda: None
+
+    def send(self, msg, timeout=None):
+        self.shared.send(msg, timeout)
+
+    def recv(self, timeout=None):
+        return self.shared._recv_for(self, timeout)
+
+    def __getattr__(self, name):
+        return getattr(self.shared.bus, name)
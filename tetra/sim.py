@@ -0,0 +1,425 @@
+"""A virtual Tetra hand on a virtual CAN bus.
+
+VirtualHandBus is a can.BusABC with one simulated hand on it, so control
+code can be developed, tested and benchmarked without hardware:
+
+    from tetra.sim import VirtualHandBus
+
+    bus = VirtualHandBus(side='right')
+    hand = tetra.Hand(bus)
+    hand.enable()
+    hand.set_joint_positions([0.5] * 12)
+    time.sleep(0.2)
+    hand.get_joint_positions()        # ~0.49: first-order toward the target
+
+The firmware side answers what the hand firmware answers: the hand-level
+params (HandType, Version, TorqueEnabled, CANID, StreamPeriodMs,
+TargetDeadmanMs, ...), every stored joint param, EncoderValue and both
+position formats with the firmware's own rounding. Params the firmware
+doesn't have get no answer, and hires=False / streaming=False leave out
+PresentPositionHiRes / StreamPeriodMs the way older firmware does.
+StreamPeriodMs broadcasts snapshots to the host that set it, and
+TargetDeadmanMs makes the hand go limp when targets stop arriving.
+
+Timing is modeled rather than instant:
+
+  * every frame occupies the bus for its length in bits at bitrate (CAN FD
+    frames switch to data_bitrate after arbitration; bit stuffing is
+    ignored). Frames queue for the bus and the lowest arbitration ID wins
+    it, so a burst of requests goes out ahead of the responses to it, as
+    on a real bus;
+  * the firmware handles each request latency seconds after receiving it;
+  * with tx_depth=3 the hand's TX FIFO holds three frames and drops
+    whatever doesn't fit, like firmware without the TX queue (see
+    CANProtocol._transfer_chunks). dropped counts the lost frames.
+
+With torque enabled each joint moves toward its target as a first-order
+system with time_constant seconds. Nothing runs in the background: the
+simulation catches up to time.monotonic() on every send and recv.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+
+import can
+import numpy as np
+
+from . import codec
+from .can_protocol import COUNTS_TO_RAD, MessageType, ParamType, response_types, single_byte_params
+
+# Extended-ID classic frame: SOF, ID, control, CRC, ACK, EOF and interframe
+# space around the data.
+_CLASSIC_OVERHEAD_BITS = 67
+# Extended-ID CAN FD frame: arbitration up to BRS plus ACK, EOF and
+# interframe space at the nominal rate; ESI, DLC, stuff count and CRC
+# (17 or 21 bits) at the data rate.
+_FD_NOMINAL_BITS = 48
+_FD_DATA_OVERHEAD_BITS = 27
+
+# Frames the host hasn't read yet that the socket buffers hold.
+_RX_QUEUE_LEN = 4096
+
+_HAND_TYPES = {'left': 0, 'right': 1}
+
+# Joint params the firmware stores, with their boot defaults.
+_JOINT_DEFAULTS = {
+    ParamType.TorqueLimit: 1000,
+    ParamType.TargetPosition: 0,
+    ParamType.Proportional: 0,
+    ParamType.PWM: 0,
+    ParamType.MotorDirSign: 1,
+    ParamType.DerivLpfN: 4,
+    ParamType.TargetLpfAlpha: 32,
+}
+
+# Joint params measured from the encoders (reads only).
+_MEASURED = (ParamType.EncoderValue, ParamType.PresentPosition, ParamType.PresentPositionHiRes)
+
+_READ_ONLY = (ParamType.Version, ParamType.Time, ParamType.DeadmanTripCount)
+
+_ENCODER_MIN = -8192
+_ENCODER_MAX = 8191
+
+
+def _arb_id(message_type: MessageType, param: int, target: int, source: int, priority: int) -> int:
+    return source | (target << 8) | (param << 16) | (message_type.value << 23) | (priority << 27)
+
+
+class VirtualHandBus(can.BusABC):
+    def __init__(self, channel='tetra-sim', hand_can_id: int = 50, side: str = 'left', version: int = 7,
+                 num_joints: int = 12, bitrate: float | None = 1_000_000, fd: bool = False,
+                 data_bitrate: float = 5_000_000, latency: float = 100e-6, tx_depth: int | None = None,
+                 hires: bool = True, streaming: bool = True, time_constant: float = 0.05, positions=None,
+                 **kwargs):
+        if side not in _HAND_TYPES:
+            raise ValueError('side must be either "left" or "right"')
+        super().__init__(channel, **kwargs)
+        self.channel_info = f'virtual Tetra hand {hand_can_id}'
+        self._can_protocol = can.CanProtocol.CAN_FD if fd else can.CanProtocol.CAN_20
+        self.bitrate = bitrate
+        self.data_bitrate = data_bitrate
+        self.latency = latency
+        self.tx_depth = tx_depth
+        self.hires = hires
+        self.streaming = streaming
+        self.time_constant = time_constant
+        self.num_joints = num_joints
+        self.dropped = 0        # hand frames lost to a full TX FIFO
+        self.rx_overflows = 0   # frames lost because the host wasn't reading
+
+        self.hand_can_id = hand_can_id
+        self.params = {
+            ParamType.HandType: _HAND_TYPES[side],
+            ParamType.Version: version,
+            ParamType.TorqueEnabled: 0,
+            ParamType.StreamPeriodMs: 0,
+            ParamType.TargetDeadmanMs: 0,
+            ParamType.DeadmanTripCount: 0,
+        }
+        self.joint_params = {param: np.full(num_joints, value, dtype=np.int64)
+                             for param, value in _JOINT_DEFAULTS.items()}
+        self._positions = np.zeros(num_joints)
+        if positions is not None:
+            self._positions[:] = positions
+        self._targets = self._positions.copy()
+        self._limp = False      # deadman tripped, until the next target write
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._boot = time.monotonic()
+        self._dyn_time = self._boot     # dynamics settled up to here
+        self._last_target = self._boot
+        self._stream_host = None
+        self._next_stream = None
+        self._host_tx = deque()         # (ready, msg) host frames waiting for the bus
+        self._hand_tx = deque()         # (ready, msg) the hand's TX FIFO
+        self._jobs = []                 # heap of (due, seq, msg) received requests
+        self._rx = deque()              # (arrival, msg) frames for the host
+        self._bus_free = self._boot
+        self._hand_busy_until = self._boot
+
+    # ── state ─────────────────────────────────────────────────────────────
+    @property
+    def positions(self) -> np.ndarray:
+        """Joint positions (radians) right now."""
+        with self._cond:
+            self._advance(time.monotonic())
+            return self._positions.copy()
+
+    @property
+    def limp(self) -> bool:
+        """Whether the target deadman has tripped (until the next target
+        write)."""
+        with self._cond:
+            self._advance(time.monotonic())
+            return self._limp
+
+    @property
+    def targets(self) -> np.ndarray:
+        """Joint targets (radians) the hand has received by now."""
+        with self._cond:
+            self._advance(time.monotonic())
+            return self._targets.copy()
+
+    def frame_time(self, msg: can.Message) -> float:
+        """Seconds msg occupies the bus."""
+        if self.bitrate is None:
+            return 0.0
+        n = len(msg.data)
+        if msg.is_fd:
+            data_rate = self.data_bitrate if msg.bitrate_switch else self.bitrate
+            data_bits = 8 * n + _FD_DATA_OVERHEAD_BITS + (4 if n > 16 else 0)
+            return _FD_NOMINAL_BITS / self.bitrate + data_bits / data_rate
+        return (_CLASSIC_OVERHEAD_BITS + 8 * n) / self.bitrate
+
+    # ── BusABC interface ──────────────────────────────────────────────────
+    def send(self, msg: can.Message, timeout: float | None = None):
+        if msg.is_fd and self._can_protocol is not can.CanProtocol.CAN_FD:
+            raise can.CanOperationError('CAN FD frame sent on a classic CAN bus')
+        # Callers may reuse msg (CANProtocol does): queue a copy.
+        frame = can.Message(arbitration_id=msg.arbitration_id, data=bytes(msg.data),
+                            is_extended_id=msg.is_extended_id, is_fd=msg.is_fd,
+                            bitrate_switch=msg.bitrate_switch)
+        with self._cond:
+            now = time.monotonic()
+            self._advance(now)
+            self._host_tx.append((now, frame))
+            self._cond.notify_all()
+
+    def _recv_internal(self, timeout: float | None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._advance(now)
+                if self._rx and self._rx[0][0] <= now:
+                    arrival, msg = self._rx.popleft()
+                    msg.timestamp = time.time() - (now - arrival)
+                    return msg, False
+                if deadline is not None and now >= deadline:
+                    return None, False
+                wake = self._next_wake()
+                if deadline is not None:
+                    wake = deadline if wake is None else min(wake, deadline)
+                # A send wakes us early: it can schedule something sooner.
+                self._cond.wait(None if wake is None else max(0.0, wake - now))
+
+    # ── simulation ────────────────────────────────────────────────────────
+    def _next_event(self):
+        """(time, handler) of the earliest pending event, or (None, None)."""
+        best, handler = None, None
+        if self._jobs:
+            best, handler = self._jobs[0][0], self._run_job
+        heads = [queue[0][0] for queue in (self._host_tx, self._hand_tx) if queue]
+        if heads:
+            start = max(self._bus_free, min(heads))
+            if best is None or start < best:
+                best, handler = start, self._start_frame
+        if self._next_stream is not None and (best is None or self._next_stream < best):
+            best, handler = self._next_stream, self._stream
+        deadman = self._deadman_due()
+        if deadman is not None and (best is None or deadman < best):
+            best, handler = deadman, self._trip_deadman
+        return best, handler
+
+    def _next_wake(self):
+        t, _ = self._next_event()
+        if self._rx:
+            t = self._rx[0][0] if t is None else min(t, self._rx[0][0])
+        return t
+
+    def _advance(self, now: float):
+        while True:
+            t, handler = self._next_event()
+            if t is None or t > now:
+                return
+            handler(t)
+
+    def _settle(self, t: float):
+        """Run the joint dynamics up to t."""
+        dt = t - self._dyn_time
+        if dt <= 0:
+            return
+        self._dyn_time = t
+        if not self.params[ParamType.TorqueEnabled] or self._limp:
+            return
+        step = 1.0 if self.time_constant <= 0 else -math.expm1(-dt / self.time_constant)
+        self._positions += (self._targets - self._positions) * step
+
+    def _start_frame(self, t: float):
+        # Bus arbitration: of the frames ready now, the lowest ID goes first.
+        ready = [queue for queue in (self._host_tx, self._hand_tx) if queue and queue[0][0] <= t]
+        queue = min(ready, key=lambda q: q[0][1].arbitration_id)
+        _, msg = queue.popleft()
+        end = t + self.frame_time(msg)
+        self._bus_free = end
+        if queue is self._host_tx:
+            heapq.heappush(self._jobs, (end + self.latency, next(self._seq), msg))
+        else:
+            self._hand_busy_until = end
+            if len(self._rx) >= _RX_QUEUE_LEN:
+                self.rx_overflows += 1
+            else:
+                self._rx.append((end, msg))
+
+    def _transmit(self, t: float, arb_id: int, data, is_fd: bool = False):
+        """Put a frame into the hand's TX FIFO (or drop it when full)."""
+        if self.tx_depth is not None and len(self._hand_tx) + (self._hand_busy_until > t) >= self.tx_depth:
+            self.dropped += 1
+            return
+        data = bytes(data)
+        if is_fd:
+            data += bytes(codec.fd_frame_len(len(data)) - len(data))
+        self._hand_tx.append((t, can.Message(arbitration_id=arb_id, data=data, is_extended_id=True,
+                                             is_fd=is_fd, bitrate_switch=is_fd)))
+
+    def _run_job(self, t: float):
+        _, _, msg = heapq.heappop(self._jobs)
+        self._settle(t)
+        arb = msg.arbitration_id
+        if not msg.is_extended_id or (arb >> 8) & 0xFF != self.hand_can_id:
+            return   # addressed to another node
+        host = arb & 0xFF
+        param = (arb >> 16) & 0x7F
+        priority = (arb >> 27) & 0x1F
+        try:
+            message_type = MessageType((arb >> 23) & 0xF)
+            param_type = ParamType(param)
+        except ValueError:
+            return   # unknown to the firmware: no answer
+        if message_type not in response_types:
+            return
+        reply = _arb_id(response_types[message_type], param, host, self.hand_can_id, priority)
+        data = bytes(msg.data)
+        if message_type == MessageType.ReadParam:
+            value = self._read_param(t, param_type)
+            if value is not None:
+                self._transmit(t, reply, (0, value & 0xFF, (value >> 8) & 0xFF))
+        elif message_type == MessageType.WriteParam:
+            status = self._write_param(t, param_type, data, host)
+            if status is not None:
+                if param_type == ParamType.CANID and status == 0:
+                    reply = _arb_id(MessageType.ParamResp, param, host, self.hand_can_id, priority)
+                self._transmit(t, reply, (status,))
+        else:
+            if len(data) < 2:
+                return
+            is_fd = bool(msg.is_fd)
+            joints = self._masked_joints(data[0] | (data[1] << 8), is_fd)
+            if message_type == MessageType.ReadJointParam:
+                values = self._read_joint_param(param_type, joints)
+                if values is not None:
+                    self._transmit(t, reply, b'\0\0' + values.astype('<i2').tobytes(), is_fd)
+            else:
+                status = self._write_joint_param(t, param_type, joints, data[2:])
+                if status is not None:
+                    self._transmit(t, reply, status.to_bytes(2, 'little'), is_fd)
+
+    def _masked_joints(self, mask: int, is_fd: bool) -> list:
+        cap = codec.FD_CHUNK_SIZE if is_fd else codec.CLASSIC_CHUNK_SIZE
+        return [j for j in range(self.num_joints) if mask & (1 << j)][:cap]
+
+    def _encoder_counts(self) -> np.ndarray:
+        counts = np.rint(self._positions / COUNTS_TO_RAD)
+        return np.clip(counts, _ENCODER_MIN, _ENCODER_MAX).astype(np.int64)
+
+    def _read_param(self, t: float, param_type: ParamType):
+        if param_type == ParamType.StreamPeriodMs and not self.streaming:
+            return None
+        if param_type == ParamType.CANID:
+            return self.hand_can_id
+        if param_type == ParamType.Time:
+            return int(t - self._boot) & 0x7FFF
+        return self.params.get(param_type)
+
+    def _write_param(self, t: float, param_type: ParamType, data: bytes, host: int):
+        if param_type == ParamType.StreamPeriodMs and not self.streaming:
+            return None
+        if param_type != ParamType.CANID and param_type not in self.params and param_type not in _READ_ONLY:
+            return None
+        if param_type in _READ_ONLY or len(data) < 1:
+            return 1
+        if param_type in single_byte_params:
+            value = data[0]
+        else:
+            value = int.from_bytes(data[:2].ljust(2, b'\0'), 'little', signed=True)
+        if param_type == ParamType.CANID:
+            if value >= 254:
+                return 1
+            self.hand_can_id = value
+            return 0
+        if param_type == ParamType.TorqueEnabled and value and not self.params[param_type]:
+            self._last_target = t   # the deadman counts from enable
+        if param_type == ParamType.StreamPeriodMs:
+            if not 0 <= value <= 1000:
+                return 1
+            self._stream_host = host
+            self._next_stream = t + value / 1000 if value else None
+        if param_type == ParamType.TargetDeadmanMs and not 0 <= value <= 10000:
+            return 1
+        self.params[param_type] = value
+        return 0
+
+    def _read_joint_param(self, param_type: ParamType, joints: list):
+        if param_type in _JOINT_DEFAULTS:
+            return self.joint_params[param_type][joints]
+        if param_type not in _MEASURED or (param_type == ParamType.PresentPositionHiRes and not self.hires):
+            return None
+        counts = self._encoder_counts()[joints]
+        if param_type == ParamType.EncoderValue:
+            return counts
+        if param_type == ParamType.PresentPosition:
+            # float rad → mrad, truncated toward zero (hand.c).
+            return np.trunc(counts * COUNTS_TO_RAD * 1000).astype(np.int64)
+        # counts × 2π·10000 / 16384, rounded half away from zero (hand.c).
+        num = counts * 62832
+        return np.sign(num) * ((np.abs(num) + 8192) // 16384)
+
+    def _write_joint_param(self, t: float, param_type: ParamType, joints: list, data: bytes):
+        if param_type not in _JOINT_DEFAULTS and param_type not in _MEASURED:
+            return None
+        joints = joints[:len(data) // 2]
+        if param_type in _MEASURED:
+            return sum(1 << j for j in joints)   # read-only: every joint fails
+        values = np.frombuffer(data[:2 * len(joints)], dtype='<i2')
+        self.joint_params[param_type][joints] = values
+        if param_type == ParamType.TargetPosition:
+            self._targets[joints] = values / codec.HIRES_SCALE
+            self._last_target = t
+            self._limp = False
+        return 0
+
+    def _stream(self, t: float):
+        self._settle(t)
+        period = self.params[ParamType.StreamPeriodMs] / 1000
+        self._next_stream += period
+        if self._next_stream <= t:
+            # Fell a whole period behind (nobody advanced the clock): skip
+            # the missed broadcasts rather than bursting them.
+            self._next_stream = t + period
+        counts = self._encoder_counts()
+        is_fd = self._can_protocol is can.CanProtocol.CAN_FD
+        if is_fd:
+            chunks = [range(self.num_joints)]
+        else:
+            chunks = [range(start, min(start + codec.CLASSIC_CHUNK_SIZE, self.num_joints))
+                      for start in range(0, self.num_joints, codec.CLASSIC_CHUNK_SIZE)]
+        for index, joints in enumerate(chunks):
+            mask = sum(1 << j for j in joints)
+            arb = _arb_id(MessageType.StreamPositions, index, self._stream_host, self.hand_can_id, 3)
+            data = mask.to_bytes(2, 'little') + counts[list(joints)].astype('<i2').tobytes()
+            self._transmit(t, arb, data, is_fd)
+
+    def _deadman_due(self):
+        deadman_ms = self.params[ParamType.TargetDeadmanMs]
+        if not deadman_ms or self._limp or not self.params[ParamType.TorqueEnabled]:
+            return None
+        return self._last_target + deadman_ms / 1000
+
+    def _trip_deadman(self, t: float):
+        self._settle(t)
+        self._limp = True
+        self.params[ParamType.DeadmanTripCount] += 1
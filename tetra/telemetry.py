@@ -0,0 +1,232 @@
+"""Session telemetry: targets and streamed positions, logged to disk.
+
+A TelemetryLogger attached to a protocol records every target written by
+set_joint_positions and every streamed position snapshot, without growing
+memory or blocking the control loop on disk writes:
+
+    logger = TelemetryLogger('runs/session-1', num_joints=12)
+    hand.protocol.telemetry = logger
+    ...
+    logger.close()
+
+    session = TelemetrySession('runs/session-1')
+    for chunk in session['positions'].chunks(start, end):   # memmap views
+        chunk['time'], chunk['counts']
+
+Each channel ('targets': time + radians, 'positions': time + raw encoder
+counts) fills one of a few preallocated column blocks. A full block is
+handed to a writer thread, which saves each column as its own .npy chunk
+file (<channel>/<chunk>.<column>.npy) and gives the block back. If the
+writer falls so far behind that no block is free, samples are counted in
+dropped rather than allocating more. Times are time.monotonic() seconds;
+session.json holds the offset to wall-clock time.
+
+TelemetrySession memory-maps the chunk files, so opening a long session
+reads nothing but session.json; chunks() slices by time without copying
+and read() concatenates just the rows asked for.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+_FORMAT = 1
+
+
+def _channel_columns(num_joints: int) -> dict:
+    return {
+        'targets': {'time': ('<f8', ()), 'radians': ('<f4', (num_joints,))},
+        'positions': {'time': ('<f8', ()), 'counts': ('<i2', (num_joints,))},
+    }
+
+
+class _Channel:
+    def __init__(self, name: str, columns: dict, block_size: int, blocks: int):
+        self.name = name
+        self.columns = columns
+        self.block_size = block_size
+        self.dropped = 0
+        self.written = 0
+        self.chunks = 0
+        self._free = [self._new_block() for _ in range(blocks)]
+        self._block = None
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def _new_block(self) -> dict:
+        return {column: np.empty((self.block_size,) + shape, dtype=dtype)
+                for column, (dtype, shape) in self.columns.items()}
+
+    def append(self, t: float, values, pending: queue.Queue):
+        with self._lock:
+            if self._block is None:
+                if not self._free:
+                    self.dropped += 1
+                    return
+                self._block = self._free.pop()
+                self._rows = 0
+            block = self._block
+            i = self._rows
+            time_column, value_column = block.values()
+            time_column[i] = t
+            value_column[i] = values
+            self._rows = i + 1
+            if self._rows == self.block_size:
+                self._hand_off(pending)
+
+    def _hand_off(self, pending: queue.Queue):
+        pending.put((self, self._block, self._rows, self.chunks))
+        self.chunks += 1
+        self._block = None
+
+    def flush(self, pending: queue.Queue):
+        with self._lock:
+            if self._block is not None and self._rows:
+                self._hand_off(pending)
+
+    def recycle(self, block: dict, lost: int = 0):
+        with self._lock:
+            self._free.append(block)
+            self.dropped += lost
+
+
+class TelemetryLogger:
+    def __init__(self, directory, num_joints: int = 12, block_size: int = 8192, blocks: int = 4):
+        if block_size <= 0 or blocks <= 0:
+            raise ValueError('block_size and blocks must be positive')
+        self.directory = os.fspath(directory)
+        self.num_joints = num_joints
+        self.error = None   # what stopped the writer, if anything
+        columns = _channel_columns(num_joints)
+        self._channels = {name: _Channel(name, cols, block_size, blocks) for name, cols in columns.items()}
+        for name in self._channels:
+            os.makedirs(os.path.join(self.directory, name), exist_ok=True)
+        meta = {
+            'format': _FORMAT,
+            'num_joints': num_joints,
+            'block_size': block_size,
+            'wall_offset': time.time() - time.monotonic(),
+            'channels': {name: {column: [dtype, list(shape)] for column, (dtype, shape) in cols.items()}
+                         for name, cols in columns.items()},
+        }
+        with open(os.path.join(self.directory, 'session.json'), 'w') as f:
+            json.dump(meta, f, indent=1)
+        self._pending = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name='tetra-telemetry', daemon=True)
+        self._writer.start()
+
+    def log_target(self, t: float, radians):
+        """A target write at t (time.monotonic())."""
+        self._channels['targets'].append(t, radians, self._pending)
+
+    def log_positions(self, t: float, counts):
+        """A streamed snapshot received at t (time.monotonic())."""
+        self._channels['positions'].append(t, counts, self._pending)
+
+    @property
+    def dropped(self) -> dict:
+        """Samples lost per channel because every block was still queued
+        for writing."""
+        return {name: channel.dropped for name, channel in self._channels.items()}
+
+    def _write_loop(self):
+        while True:
+            item = self._pending.get()
+            try:
+                if item is None:
+                    return
+                channel, block, rows, index = item
+                if self.error is None:
+                    try:
+                        for column, data in block.items():
+                            path = os.path.join(self.directory, channel.name, f'{index:06d}.{column}.npy')
+                            # Write-then-rename: a session being loaded
+                            # while it is written never shows half a chunk.
+                            with open(path + '.tmp', 'wb') as f:
+                                np.save(f, data[:rows])
+                            os.replace(path + '.tmp', path)
+                        channel.written += rows
+                    except OSError as e:
+                        self.error = e
+                channel.recycle(block, lost=rows if self.error is not None else 0)
+            finally:
+                self._pending.task_done()
+
+    def flush(self):
+        """Write out the partly filled blocks too, and wait until every
+        block handed over so far is on disk."""
+        for channel in self._channels.values():
+            channel.flush(self._pending)
+        self._pending.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        self._pending.put(None)
+        self._writer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TelemetryChannel:
+    """One channel of a session: its chunk files, memory-mapped."""
+
+    def __init__(self, directory: str, columns):
+        self.columns = tuple(columns)
+        self._chunks = []
+        names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        for index in sorted({name.split('.')[0] for name in names if name.endswith('.npy')}):
+            paths = {column: os.path.join(directory, f'{index}.{column}.npy') for column in self.columns}
+            if all(os.path.exists(path) for path in paths.values()):
+                self._chunks.append({column: np.load(path, mmap_mode='r') for column, path in paths.items()})
+
+    def __len__(self) -> int:
+        return sum(len(chunk['time']) for chunk in self._chunks)
+
+    def chunks(self, start: float | None = None, end: float | None = None):
+        """{column: memmap view} per chunk, for the samples from start up to
+        (not including) end."""
+        for chunk in self._chunks:
+            times = chunk['time']
+            if not len(times) or (end is not None and times[0] >= end) or (start is not None and times[-1] < start):
+                continue
+            lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+            hi = len(times) if end is None else int(np.searchsorted(times, end, side='left'))
+            yield {column: data[lo:hi] for column, data in chunk.items()}
+
+    def read(self, start: float | None = None, end: float | None = None) -> dict:
+        """The samples from start to end as one array per column (a copy of
+        just those rows)."""
+        parts = list(self.chunks(start, end))
+        if not parts:
+            return {column: np.empty((0,) + self._shape(column)) for column in self.columns}
+        return {column: np.concatenate([part[column] for part in parts]) for column in self.columns}
+
+    def _shape(self, column):
+        return self._chunks[0][column].shape[1:] if self._chunks else ()
+
+
+class TelemetrySession:
+    def __init__(self, directory):
+        self.directory = os.fspath(directory)
+        with open(os.path.join(self.directory, 'session.json')) as f:
+            meta = json.load(f)
+        if meta.get('format') != _FORMAT:
+            raise ValueError(f'{self.directory}: unsupported telemetry format {meta.get("format")}')
+        self.num_joints = meta['num_joints']
+        self.wall_offset = meta['wall_offset']   # add to a time for time.time()
+        self.channels = {name: TelemetryChannel(os.path.join(self.directory, name), columns)
+                         for name, columns in meta['channels'].items()}
+
+    def __getitem__(self, name: str) -> TelemetryChannel:
+        return self.channels[name]
@@ -0,0 +1,321 @@
+"""Timed joint trajectories, executed on their own thread.
+
+A Trajectory is a smooth, time-parameterized path through joint positions
+— waypoints to pass through, or a densely sampled trajectory to follow.
+Between points it is a piecewise cubic (or, with method='quintic', quintic)
+Hermite curve: at rest at both ends, and through interior points with the
+average of the neighbouring slopes, limited so the curve never overshoots
+a point (it is zero where the path turns). With max_velocity (rad/s, one
+value or one per joint) segments that would move a joint faster are
+stretched until none does.
+
+    traj = Trajectory.from_waypoints([open_pose, pinch_pose, open_pose], max_velocity=2.0)
+    runner = TrajectoryRunner(hand, rate_hz=200)
+    runner.start(traj)
+    ...
+    runner.preempt(Trajectory.from_waypoints([grasp], start=runner.commanded, max_velocity=2.0))
+    runner.wait()
+
+TrajectoryRunner samples the running trajectory on a fixed tick grid and
+sends each target with set_joint_positions(wait=False), clamped to the
+hand's joint_configs. Ticks are scheduled from the start time (tick k is
+due at start + k / rate_hz), so timing errors never accumulate. A tick
+that finishes after the next one was due is an overrun: the ticks already
+missed are skipped rather than sent in a burst, and counted in stats.
+start, preempt and stop only hand the thread a command and return.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+# Points per segment at which the velocity is checked against max_velocity.
+_VELOCITY_CHECK_POINTS = 17
+_RETIME_ROUNDS = 8
+
+
+def _hermite(s, method: str):
+    """Basis weights (for p0, h·v0, h·v1, p1) and their derivatives with
+    respect to s, at s in [0, 1]. The quintic has zero acceleration at both
+    ends."""
+    s2 = s * s
+    s3 = s2 * s
+    if method == 'cubic':
+        weights = (2 * s3 - 3 * s2 + 1, s3 - 2 * s2 + s, s3 - s2, -2 * s3 + 3 * s2)
+        slopes = (6 * s2 - 6 * s, 3 * s2 - 4 * s + 1, 3 * s2 - 2 * s, -6 * s2 + 6 * s)
+        return weights, slopes
+    s4 = s3 * s
+    s5 = s4 * s
+    weights = (1 - 10 * s3 + 15 * s4 - 6 * s5, s - 6 * s3 + 8 * s4 - 3 * s5,
+               -4 * s3 + 7 * s4 - 3 * s5, 10 * s3 - 15 * s4 + 6 * s5)
+    slopes = (-30 * s2 + 60 * s3 - 30 * s4, 1 - 18 * s2 + 32 * s3 - 15 * s4,
+              -12 * s2 + 28 * s3 - 15 * s4, 30 * s2 - 60 * s3 + 30 * s4)
+    return weights, slopes
+
+
+def _waypoint_velocities(times, positions):
+    """Velocity at every point: zero at the ends and where the path turns,
+    else the mean of the adjacent slopes, limited to 3× the smaller one so
+    a cubic segment stays between its end points."""
+    velocities = np.zeros_like(positions)
+    if len(times) < 3:
+        return velocities
+    slopes = np.diff(positions, axis=0) / np.diff(times)[:, None]
+    before, after = slopes[:-1], slopes[1:]
+    mean = (before + after) / 2
+    limit = 3 * np.minimum(np.abs(before), np.abs(after))
+    velocities[1:-1] = np.where(before * after > 0, np.clip(mean, -limit, limit), 0.0)
+    return velocities
+
+
+class Trajectory:
+    def __init__(self, times, positions, method: str = 'cubic', max_velocity=None):
+        """A trajectory through positions (one row per point) at times
+        (seconds, increasing; shifted to start at 0)."""
+        if method not in ('cubic', 'quintic'):
+            raise ValueError('method must be "cubic" or "quintic"')
+        times = np.asarray(times, dtype=float)
+        positions = np.atleast_2d(np.asarray(positions, dtype=float))
+        if times.ndim != 1 or len(times) != len(positions) or not len(times):
+            raise ValueError('need one time per position row')
+        if np.any(np.diff(times) <= 0):
+            raise ValueError('times must be strictly increasing')
+        if not np.all(np.isfinite(positions)):
+            raise ValueError('positions must be finite')
+        self.method = method
+        self.times = times - times[0]
+        self.positions = positions
+        self.velocities = _waypoint_velocities(self.times, positions)
+        if max_velocity is not None:
+            self._retime(max_velocity)
+
+    @classmethod
+    def from_waypoints(cls, waypoints, durations=None, start=None, method: str = 'cubic',
+                       max_velocity=None) -> 'Trajectory':
+        """A trajectory through waypoints, optionally from start first (e.g.
+        TrajectoryRunner.commanded). Segment durations (seconds, one value
+        or one per segment) default to the shortest that max_velocity
+        allows."""
+        waypoints = np.atleast_2d(np.asarray(waypoints, dtype=float))
+        if start is not None:
+            waypoints = np.vstack([np.asarray(start, dtype=float)[:waypoints.shape[1]], waypoints])
+        segments = len(waypoints) - 1
+        if durations is None:
+            if max_velocity is None:
+                raise ValueError('give durations or max_velocity')
+            # Rest-to-rest peak speed is 1.5 (cubic) / 1.875 (quintic) × the
+            # mean; retiming fixes up segments that don't stop.
+            peak = 1.5 if method == 'cubic' else 1.875
+            distance = np.abs(np.diff(waypoints, axis=0)) / np.asarray(max_velocity, dtype=float)
+            durations = np.maximum(peak * distance.max(axis=1, initial=0.0), 1e-3)
+        durations = np.broadcast_to(np.asarray(durations, dtype=float), (segments,))
+        times = np.concatenate([[0.0], np.cumsum(durations)])
+        return cls(times, waypoints, method=method, max_velocity=max_velocity)
+
+    @property
+    def duration(self) -> float:
+        return float(self.times[-1])
+
+    @property
+    def num_joints(self) -> int:
+        return self.positions.shape[1]
+
+    def _segments(self, t):
+        t = np.clip(np.asarray(t, dtype=float), 0.0, self.duration)
+        k = np.clip(np.searchsorted(self.times, t, side='right') - 1, 0, len(self.times) - 2)
+        h = self.times[k + 1] - self.times[k]
+        return k, h, (t - self.times[k]) / h
+
+    def sample(self, t) -> np.ndarray:
+        """Positions at t seconds (a scalar → one row, an array → one row
+        per time). Times outside [0, duration] hold the end points."""
+        if len(self.times) == 1:
+            return np.broadcast_to(self.positions[0], np.shape(t) + (self.num_joints,)).copy()
+        k, h, s = self._segments(t)
+        (w0, w1, w2, w3), _ = _hermite(s, self.method)
+        p, v = self.positions, self.velocities
+        h = h[..., None]
+        return (w0[..., None] * p[k] + w1[..., None] * h * v[k]
+                + w2[..., None] * h * v[k + 1] + w3[..., None] * p[k + 1])
+
+    def velocity(self, t) -> np.ndarray:
+        """Joint velocities (rad/s) at t seconds; see sample."""
+        if len(self.times) == 1:
+            return np.zeros(np.shape(t) + (self.num_joints,))
+        k, h, s = self._segments(t)
+        _, (d0, d1, d2, d3) = _hermite(s, self.method)
+        p, v = self.positions, self.velocities
+        h = h[..., None]
+        return (d0[..., None] * p[k] + d1[..., None] * h * v[k]
+                + d2[..., None] * h * v[k + 1] + d3[..., None] * p[k + 1]) / h
+
+    def _retime(self, max_velocity):
+        limit = np.broadcast_to(np.asarray(max_velocity, dtype=float), (self.num_joints,))
+        if np.any(limit <= 0):
+            raise ValueError('max_velocity must be positive')
+        if len(self.times) < 2:
+            return
+        s = np.linspace(0.0, 1.0, _VELOCITY_CHECK_POINTS)
+        _, slopes = _hermite(s, self.method)
+        p, v = self.positions, self.velocities
+        for _ in range(_RETIME_ROUNDS):
+            h = np.diff(self.times)
+            # Velocity at every check point of every segment: (points, segments, joints).
+            velocity = sum(d[:, None, None] * term for d, term in
+                           zip(slopes, (p[:-1], h[:, None] * v[:-1], h[:, None] * v[1:], p[1:]))) / h[:, None]
+            ratio = (np.abs(velocity) / limit).max(axis=(0, 2))
+            if ratio.max() <= 1.0 + 1e-9:
+                return
+            # Stretching a segment by r slows it by r; its end velocities
+            # change with its neighbours', hence a few rounds.
+            h = h * np.maximum(ratio, 1.0) * (1.0 + 1e-6)
+            self.times = np.concatenate([[0.0], np.cumsum(h)])
+            self.velocities = v = _waypoint_velocities(self.times, p)
+
+
+@dataclass
+class TimingStats:
+    """TrajectoryRunner timing: ticks sent, ticks that ran past the next
+    tick's due time (overruns), ticks skipped to catch up after one, and
+    the worst lateness of a tick in seconds."""
+    ticks: int = 0
+    overruns: int = 0
+    skipped: int = 0
+    max_late: float = 0.0
+
+
+class TrajectoryRunner:
+    def __init__(self, hand, rate_hz: float = 200.0, spin: float = 0.0002):
+        """Runs trajectories on hand at rate_hz. The last spin seconds before
+        each tick are busy-waited instead of slept, for punctual ticks."""
+        if rate_hz <= 0:
+            raise ValueError('rate_hz must be positive')
+        self.hand = hand
+        self.period = 1.0 / rate_hz
+        self.spin = spin
+        self.stats = TimingStats()
+        self.commanded = None   # last target sent
+        self.error = None       # what stopped the last trajectory, if anything
+        limits = np.array([(config.min, config.max) for config in hand.joint_configs], dtype=float)
+        self._low, self._high = limits[:, 0], limits[:, 1]
+
+        self._cond = threading.Condition()
+        self._pending = None    # trajectory to switch to at the next tick
+        self._active = None
+        self._stop = False
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name='tetra-trajectory', daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        with self._cond:
+            return self._active is not None or self._pending is not None
+
+    def start(self, trajectory: Trajectory):
+        """Start trajectory now. Raises RuntimeError if one is running (see
+        preempt)."""
+        with self._cond:
+            if self._active is not None or self._pending is not None:
+                raise RuntimeError('a trajectory is already running; use preempt')
+            self._command(trajectory)
+
+    def preempt(self, trajectory: Trajectory):
+        """Switch to trajectory at the next tick, whatever is running."""
+        with self._cond:
+            self._command(trajectory)
+
+    def _command(self, trajectory: Trajectory):
+        if self._closing:
+            raise RuntimeError('runner is closed')
+        if trajectory.num_joints > len(self._low):
+            raise ValueError(f'trajectory has {trajectory.num_joints} joints, the hand {len(self._low)}')
+        self._pending = trajectory
+        self._stop = False
+        self.error = None
+        self._cond.notify_all()
+
+    def stop(self):
+        """Stop sending targets; the hand holds the last one."""
+        with self._cond:
+            self._pending = None
+            self._stop = True
+            self._cond.notify_all()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait until no trajectory is running; False on timeout. Raises
+        what stopped the trajectory, if it failed."""
+        with self._cond:
+            done = self._cond.wait_for(lambda: self._active is None and self._pending is None, timeout)
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+        return done
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._pending = None
+            self._stop = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._closing)
+                if self._closing:
+                    return
+                trajectory, self._pending = self._pending, None
+                self._active = trajectory
+            try:
+                self._execute(trajectory)
+            except Exception as e:
+                self.error = e
+            with self._cond:
+                self._active = None
+                self._cond.notify_all()
+
+    def _execute(self, trajectory: Trajectory):
+        period = self.period
+        start = time.monotonic()
+        k = 0
+        while True:
+            due = start + k * period
+            with self._cond:
+                while not self._stop and self._pending is None:
+                    remaining = due - time.monotonic() - self.spin
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stop or self._pending is not None:
+                    return   # stopped, or preempted: _run picks it up
+            while time.monotonic() < due:
+                pass
+            late = time.monotonic() - due
+            if late > self.stats.max_late:
+                self.stats.max_late = late
+
+            t = k * period
+            n = trajectory.num_joints
+            target = np.clip(trajectory.sample(min(t, trajectory.duration)), self._low[:n], self._high[:n])
+            self.hand.set_joint_positions(target, wait=False)
+            self.commanded = target
+            self.stats.ticks += 1
+            if t >= trajectory.duration:
+                return
+
+            k += 1
+            now = time.monotonic()
+            if now > start + k * period:
+                self.stats.overruns += 1
+                caught_up = int((now - start) / period) + 1
+                self.stats.skipped += caught_up - k
+                k = caught_up